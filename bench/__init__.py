@@ -0,0 +1 @@
+"""Benchmark harnesses (OCR, extraction, load). Not imported by the bot at runtime."""
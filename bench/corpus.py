@@ -0,0 +1,85 @@
+"""
+Labelled receipt corpus loader.
+
+Corpus layout:
+
+    corpus/
+        labels.csv      # file,amount,date,receiver
+        r001.jpg
+        r001.txt        # optional OCR transcript (used by text-only benches)
+        r002.pdf
+
+`amount` is a decimal with '.' separator, `date` is YYYY-MM-DD.
+Empty cells mean "field not present on the receipt".
+"""
+import csv
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Optional
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+PDF_SUFFIXES = {".pdf"}
+
+
+@dataclass
+class CorpusItem:
+    """One labelled receipt"""
+    path: Path
+    amount: Optional[float]
+    date: Optional[date]
+    receiver: Optional[str]
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.path.suffix.lower() in PDF_SUFFIXES
+
+    @property
+    def is_binary(self) -> bool:
+        """Image or PDF (something an OCRProvider can consume)"""
+        suffix = self.path.suffix.lower()
+        return suffix in IMAGE_SUFFIXES or suffix in PDF_SUFFIXES
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+    def read_text(self) -> Optional[str]:
+        """OCR transcript: the item itself if it is .txt, else a sidecar .txt"""
+        if self.path.suffix.lower() == ".txt":
+            return self.path.read_text(encoding="utf-8")
+        sidecar = self.path.with_suffix(".txt")
+        if sidecar.exists():
+            return sidecar.read_text(encoding="utf-8")
+        return None
+
+
+def _parse_amount(raw: str) -> Optional[float]:
+    raw = (raw or "").strip().replace(" ", "").replace(",", ".")
+    return float(raw) if raw else None
+
+
+def _parse_date(raw: str) -> Optional[date]:
+    raw = (raw or "").strip()
+    return datetime.strptime(raw, "%Y-%m-%d").date() if raw else None
+
+
+def load_corpus(corpus_dir: str | Path, labels_name: str = "labels.csv") -> List[CorpusItem]:
+    """Load labelled items; rows pointing to missing files are skipped."""
+    corpus_dir = Path(corpus_dir)
+    labels_path = corpus_dir / labels_name
+    if not labels_path.exists():
+        raise FileNotFoundError(f"Labels file not found: {labels_path}")
+
+    items: List[CorpusItem] = []
+    with labels_path.open(encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            path = corpus_dir / row["file"].strip()
+            if not path.exists():
+                continue
+            items.append(CorpusItem(
+                path=path,
+                amount=_parse_amount(row.get("amount", "")),
+                date=_parse_date(row.get("date", "")),
+                receiver=(row.get("receiver") or "").strip() or None,
+            ))
+    return items
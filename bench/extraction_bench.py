@@ -0,0 +1,150 @@
+"""
+Micro-benchmark for receipt field extraction from OCR text.
+
+Compares the legacy "first matching regex" extraction (kept here verbatim
+as a baseline) with bot.services.ocr.extraction on a text corpus and
+reports throughput and per-field precision/recall.
+
+    python -m bench.extraction_bench
+    python -m bench.extraction_bench --corpus ./receipts --repeat 2000
+"""
+import argparse
+import json
+import re
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bench.corpus import CorpusItem, load_corpus
+from bench.stats import FieldScore, Stopwatch, amounts_match, format_table, receivers_match
+from bot.services.ocr import extraction
+
+DEFAULT_CORPUS = Path(__file__).parent / "corpus" / "receipts"
+
+Extractor = Callable[[str], Tuple[Optional[float], Optional[date], str]]
+
+
+# --- Legacy baseline (billing_service before the extraction module) ---
+
+def legacy_amount(text: str) -> Optional[float]:
+    patterns = [
+        r'(?:итого|сумма|к оплате|всего)[:\s]*(\d[\d\s]*[.,]?\d*)\s*(?:руб|₽|р\.?)?',
+        r'(\d{1,3}(?:[\s,]\d{3})*(?:[.,]\d{2})?)\s*(?:руб|₽|р\.)',
+        r'(?:amount|sum)[:\s]*(\d+[.,]?\d*)',
+        r'(\d{4,})[.,](\d{2})',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, text.lower(), re.IGNORECASE)
+        if match:
+            amount_str = match.group(1).replace(' ', '').replace(',', '.')
+            try:
+                return float(amount_str)
+            except ValueError:
+                continue
+    return None
+
+
+def legacy_date(text: str) -> Optional[date]:
+    patterns = [
+        (r'(\d{2})[./](\d{2})[./](\d{4})', '%d.%m.%Y'),
+        (r'(\d{2})[./](\d{2})[./](\d{2})', '%d.%m.%y'),
+        (r'(\d{4})-(\d{2})-(\d{2})', '%Y-%m-%d'),
+    ]
+    for pattern, fmt in patterns:
+        match = re.search(pattern, text)
+        if match:
+            try:
+                return datetime.strptime(match.group(0), fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def legacy_receiver(text: str) -> str:
+    patterns = [
+        r'(?:получатель|payee|кому)[:\s]*([А-ЯЁа-яёA-Za-z\s\.]+)',
+        r'(?:ИП|ООО|АО)\s+[«"]?([^»"\n]+)[»"]?',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return match.group(1).strip()[:100]
+    return ""
+
+
+def legacy_extract(text: str):
+    return legacy_amount(text), legacy_date(text), legacy_receiver(text)
+
+
+def engine_extract(text: str):
+    fields = extraction.extract_fields(text)
+    return fields.amount, fields.date, fields.receiver
+
+
+EXTRACTORS: Dict[str, Extractor] = {"legacy": legacy_extract, "engine": engine_extract}
+
+
+def evaluate(name: str, extract: Extractor, samples: List[Tuple[CorpusItem, str]], repeat: int) -> dict:
+    scores = {"amount": FieldScore(), "date": FieldScore(), "receiver": FieldScore()}
+    misses = []
+    for item, text in samples:
+        amount, parsed_date, receiver = extract(text)
+        scores["amount"].add(item.amount, amount, amounts_match(item.amount, amount))
+        scores["date"].add(item.date, parsed_date, item.date is not None and item.date == parsed_date)
+        scores["receiver"].add(item.receiver, receiver or None, receivers_match(item.receiver, receiver))
+        if not (amount is None and item.amount is None) and not amounts_match(item.amount, amount):
+            misses.append(f"{item.path.name}: amount {amount} != {item.amount}")
+
+    texts = [text for _, text in samples]
+    with Stopwatch() as sw:
+        for _ in range(repeat):
+            for text in texts:
+                extract(text)
+    calls = repeat * len(texts)
+
+    return {
+        "extractor": name,
+        "texts": len(texts),
+        "calls_per_s": round(calls / sw.wall) if sw.wall else 0,
+        "us_per_call": round(sw.wall / calls * 1e6, 1) if calls else 0.0,
+        "fields": {k: v.as_dict() for k, v in scores.items()},
+        "amount_misses": misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark receipt field extraction")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--repeat", type=int, default=500, help="Passes over the corpus for timing")
+    parser.add_argument("--json", dest="json_path", default=None)
+    parser.add_argument("--show-misses", action="store_true")
+    args = parser.parse_args()
+
+    samples = [(item, item.read_text()) for item in load_corpus(args.corpus)]
+    samples = [(item, text) for item, text in samples if text is not None]
+    if not samples:
+        raise SystemExit(f"No text transcripts in {args.corpus}")
+
+    results = [evaluate(name, fn, samples, args.repeat) for name, fn in EXTRACTORS.items()]
+
+    rows = []
+    for r in results:
+        row = {"extractor": r["extractor"], "texts": r["texts"],
+               "calls_per_s": r["calls_per_s"], "us_per_call": r["us_per_call"]}
+        for fname, fscore in r["fields"].items():
+            row[f"{fname} P/R"] = f"{fscore['precision']:.2f}/{fscore['recall']:.2f}"
+        rows.append(row)
+    print(format_table(rows, list(rows[0].keys())))
+
+    if args.show_misses:
+        for r in results:
+            for miss in r["amount_misses"]:
+                print(f"[{r['extractor']}] {miss}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Offline aiogram Bot for benchmarks: no network, every API call is recorded.
+
+    bot = make_bot()
+    await handler(make_message(bot, "/status", user_id=1), ...)
+    bot.session.calls   # [("SendMessage", {...}), ...]
+"""
+import itertools
+import types
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+FAKE_TOKEN = "42:FAKE-benchmark-token"
+
+
+class RecordingSession(BaseSession):
+    """Answers every method locally: Message where the API returns one, else True"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self._ids = itertools.count(1000)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        params = method.model_dump(exclude_none=True)
+        self.calls.append((type(method).__name__, params))
+        if not _returns_message(method):
+            return True
+        chat_id = params.get("chat_id") or 0
+        message = Message(
+            message_id=params.get("message_id") or next(self._ids),
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=chat_id, type="private"),
+            text=params.get("text") or params.get("caption"),
+        )
+        return message.as_(bot)
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self):
+        pass
+
+    def methods(self) -> List[str]:
+        return [name for name, _ in self.calls]
+
+
+def _returns_message(method: TelegramMethod) -> bool:
+    returning = method.__returning__
+    if isinstance(returning, types.UnionType):
+        return Message in returning.__args__
+    return returning is Message
+
+
+def make_bot() -> Bot:
+    return Bot(token=FAKE_TOKEN, session=RecordingSession())
+
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name=f"user{user_id}")
+
+
+def make_message(bot: Bot, text: str, user_id: int) -> Message:
+    return Message(
+        message_id=next(bot.session._ids),
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=user_id, type="private"),
+        from_user=_user(user_id),
+        text=text,
+    ).as_(bot)
+
+
+def make_callback(bot: Bot, data: str, user_id: int) -> CallbackQuery:
+    return CallbackQuery(
+        id=str(next(bot.session._ids)),
+        from_user=_user(user_id),
+        chat_instance="bench",
+        data=data,
+        message=make_message(bot, "…", user_id),
+    ).as_(bot)
@@ -0,0 +1,556 @@
+"""
+End-to-end load test: simulated users -> the bot's Dispatcher -> a fake Bot API.
+
+    python -m bench.load_test
+    python -m bench.load_test --objects 3000 --sessions 20000 --concurrency 300
+    python -m bench.load_test --rate-429 0.02 --api-latency-ms 40 --ocr-latency-ms 800 --json load.json
+
+Seeds a scratch database with a portfolio (bench.portfolio), builds the
+Dispatcher exactly as the bot does (bot.main.setup_dispatcher: middlewares,
+routers, roles) and feeds it Telegram update JSON from simulated users. The
+Bot talks HTTP to FakeTelegramAPI, a local server that answers every method,
+serves generated receipt photos for getFile/download and, with --rate-429,
+answers a share of requests with "429 Too Many Requests".
+
+Sessions (``--mix`` weights):
+  menu     tenant taps a main-menu button (payments, flat, settings, charges)
+  status   tenant sends /status
+  receipt  tenant sends a photo and confirms it as a receipt
+           (download, phash duplicate check, OCR stub, payment + receipt rows)
+  approve  admin presses pay_ok_ on a pending payment (allocate_payment)
+
+``--concurrency`` sessions run at once (closed loop: a user sends the next
+update after the previous one was handled). Report: updates/s, latency
+percentiles per step, SQL statements per update (per step from a short
+sequential pass before the load), updates that reached a handler, handler
+errors, failed Bot API calls and injected 429s.
+
+The fake API shares the event loop with the bot unless started separately
+(``python -m bench.load_test --serve-api --port 8081``) and passed as
+``--api-url``. Bot settings come from the environment as usual
+(UPDATE_CONCURRENCY, FSM_STORAGE, ...); DATABASE_URL, BOT_TOKEN, OWNER_IDS,
+ADMIN_IDS and RECEIPT_STORAGE are set by the script.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+FAKE_TOKEN = "42:FAKE-load-test-token"
+OWNER_ID = 1
+
+MENU_BUTTONS = ("💰 Мои платежи", "🏠 Моя квартира", "⚙️ Настройки", "📋 Начисления", "/menu")
+DEFAULT_MIX = "menu=0.5,status=0.25,receipt=0.15,approve=0.1"
+
+TOO_MANY_REQUESTS = {
+    "ok": False,
+    "error_code": 429,
+    "description": "Too Many Requests: retry after 1",
+    "parameters": {"retry_after": 1},
+}
+
+
+def _api_methods() -> Dict[str, type]:
+    """Lower-case API method name -> aiogram method class"""
+    from aiogram import methods
+    from aiogram.methods import TelegramMethod
+
+    found = {}
+    for value in vars(methods).values():
+        if isinstance(value, type) and issubclass(value, TelegramMethod):
+            name = getattr(value, "__api_method__", None)
+            if isinstance(name, str):
+                found[name.lower()] = value
+    return found
+
+
+def _receipt_png(seed: str) -> bytes:
+    """Small noise image, different per file so the phash duplicate check passes"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    image = Image.new("L", (32, 32))
+    image.putdata([rng.randrange(256) for _ in range(32 * 32)])
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+class FakeTelegramAPI:
+    """aiohttp app answering Bot API methods and file downloads locally"""
+
+    def __init__(self, rate_429: float = 0.0, latency_ms: float = 0.0, seed: int = 0):
+        self.rate_429 = rate_429
+        self.latency_ms = latency_ms
+        self.calls: Counter = Counter()
+        self.injected_429 = 0
+        self.downloads = 0
+        self._rng = random.Random(seed)
+        self._methods = _api_methods()
+        self._message_ids = itertools.count(1_000_000)
+        self._runner: Optional[web.AppRunner] = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.handle_file)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000.0)
+        if self.rate_429 > 0 and self._rng.random() < self.rate_429:
+            self.injected_429 += 1
+            return web.json_response(TOO_MANY_REQUESTS, status=429)
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        from bench.fake_bot import _returns_message
+
+        name = method.lower()
+        if name == "getme":
+            return {"id": int(FAKE_TOKEN.split(":")[0]), "is_bot": True, "first_name": "Load test"}
+        if name == "getfile":
+            file_id = params.get("file_id", "")
+            return {"file_id": file_id, "file_unique_id": file_id[-16:], "file_path": f"photos/{file_id}.png"}
+        cls = self._methods.get(name)
+        if cls is None or not _returns_message(cls):
+            return True
+        chat_id = str(params.get("chat_id") or "0")
+        return {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else 0, "type": "private"},
+            "text": params.get("text") or params.get("caption") or "",
+        }
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        self.downloads += 1
+        body = await asyncio.to_thread(_receipt_png, request.match_info["path"])
+        return web.Response(body=body, content_type="image/png")
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_stats())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"calls": dict(self.calls), "injected_429": self.injected_429, "downloads": self.downloads}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving in the current loop; returns base URL"""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{bound_port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def _stub_ocr_provider(latency_ms: float, seed: int):
+    from bot.services.ocr.base import OCRProvider, OCRResult
+
+    class StubOCRProvider(OCRProvider):
+        """Answers after latency_ms with a plausible amount (OCR itself is measured by ocr_bench)"""
+
+        def __init__(self):
+            self._rng = random.Random(seed)
+
+        async def recognize_image(self, file_bytes: bytes) -> OCRResult:
+            if latency_ms > 0:
+                await asyncio.sleep(latency_ms / 1000.0)
+            amount = float(self._rng.randrange(1000, 80000, 100))
+            return OCRResult(text="", amount=amount, date=date.today(), confidence=0.9, metadata={"provider": self.name})
+
+        async def recognize_pdf(self, file_bytes: bytes) -> OCRResult:
+            return await self.recognize_image(file_bytes)
+
+        def is_available(self) -> bool:
+            return True
+
+        @property
+        def name(self) -> str:
+            return "stub"
+
+    return StubOCRProvider()
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in SCRIPTS:
+            raise ValueError(f"Unknown session kind {kind!r} (known: {', '.join(SCRIPTS)})")
+        mix[kind] = float(weight)
+    return mix
+
+
+class Simulator:
+    """Builds Telegram update JSON for scripted sessions and feeds it to the Dispatcher"""
+
+    def __init__(self, dp, bot, tenants: List[int], admins: List[int], payment_ids: List[int], seed: int = 0):
+        self.dp = dp
+        self.bot = bot
+        self.tenants = tenants
+        self.admins = admins
+        self.payment_ids = list(payment_ids)
+        self.rng = random.Random(seed)
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statements: Dict[str, List[int]] = defaultdict(list)
+        self.profiling = False
+
+    def _message(self, user_id: int, **content) -> Dict[str, Any]:
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            **content,
+        }
+
+    def text(self, user_id: int, text: str) -> Dict[str, Any]:
+        return {"update_id": next(self.update_ids), "message": self._message(user_id, text=text)}
+
+    def photo(self, user_id: int) -> Dict[str, Any]:
+        file_id = hashlib.sha1(f"{user_id}:{next(self.message_ids)}".encode()).hexdigest()
+        photo = [{"file_id": file_id, "file_unique_id": file_id[:16], "width": 32, "height": 32}]
+        return {"update_id": next(self.update_ids), "message": self._message(user_id, photo=photo)}
+
+    def callback(self, user_id: int, data: str) -> Dict[str, Any]:
+        bot_message = self._message(user_id, text="…")
+        bot_message["from"] = {"id": self.bot.id, "is_bot": True, "first_name": "bot"}
+        return {
+            "update_id": next(self.update_ids),
+            "callback_query": {
+                "id": str(next(self.message_ids)),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                "chat_instance": "load",
+                "data": data,
+                "message": bot_message,
+            },
+        }
+
+    def plan(self, mix: Dict[str, float], sessions: int) -> List[Tuple[str, int]]:
+        """(kind, user) per session; approvals are capped by the pending payments"""
+        kinds, weights = zip(*mix.items())
+        planned = []
+        approvals = 0
+        for kind in self.rng.choices(kinds, weights, k=sessions):
+            if kind == "approve":
+                if approvals >= len(self.payment_ids):
+                    kind = "status"
+                else:
+                    approvals += 1
+            users = self.admins if kind == "approve" else self.tenants
+            planned.append((kind, self.rng.choice(users)))
+        return planned
+
+    async def feed(self, step: str, payload: Dict[str, Any]):
+        from aiogram.types import Update
+        from bot.database import instrumentation
+
+        update = Update.model_validate(payload, context={"bot": self.bot})
+        statements = instrumentation.totals["statements"]
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        if self.profiling:
+            # Sequential pass: every statement since the start belongs to this update
+            self.statements[step].append(instrumentation.totals["statements"] - statements)
+        else:
+            self.latencies[step].append(time.perf_counter() - started)
+
+    async def run_session(self, kind: str, user_id: int):
+        await SCRIPTS[kind](self, user_id)
+
+    async def run(self, planned: List[Tuple[str, int]], concurrency: int):
+        queue = iter(planned)
+
+        async def worker():
+            for kind, user_id in queue:
+                await self.run_session(kind, user_id)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+
+async def _menu(sim: Simulator, user_id: int):
+    await sim.feed("menu", sim.text(user_id, sim.rng.choice(MENU_BUTTONS)))
+
+
+async def _status(sim: Simulator, user_id: int):
+    await sim.feed("status", sim.text(user_id, "/status"))
+
+
+async def _receipt(sim: Simulator, user_id: int):
+    await sim.feed("receipt.photo", sim.photo(user_id))
+    await sim.feed("receipt.confirm", sim.callback(user_id, "confirm_type_receipt"))
+
+
+async def _approve(sim: Simulator, user_id: int):
+    await sim.feed("approve", sim.callback(user_id, f"pay_ok_{sim.payment_ids.pop()}"))
+
+
+SCRIPTS = {"menu": _menu, "status": _status, "receipt": _receipt, "approve": _approve}
+
+
+def _configure_environment(args, db_url: str):
+    """Before any bot import: bot.config and the engine read these at import time"""
+    os.environ["DATABASE_URL"] = db_url
+    os.environ["BOT_TOKEN"] = FAKE_TOKEN
+    os.environ["OWNER_IDS"] = str(OWNER_ID)
+    os.environ["ADMIN_IDS"] = ",".join(str(OWNER_ID + 1 + i) for i in range(args.admins))
+    os.environ["RECEIPT_STORAGE"] = "off"
+    os.environ["BOT_MODE"] = "polling"
+    for name in ("REPLICA_DATABASE_URL", "SENTRY_DSN"):
+        os.environ[name] = ""
+
+
+async def _seed(args):
+    from sqlalchemy import update
+
+    from bench.portfolio import seed_portfolio
+    from bot.database.core import AsyncSessionLocal, engine
+    from bot.database.models import Base, Payment, PaymentStatus, PaymentType, Tenant
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        portfolio = await seed_portfolio(session, objects=args.objects, months=args.months,
+                                         debtor_share=0.3, seed=args.seed)
+        # Everyone has accepted the privacy policy, so updates reach the handlers
+        await session.execute(update(Tenant).values(personal_data_consent=True))
+        # Receipts waiting for an admin: one per planned pay_ok_
+        payments = [
+            Payment(stay_id=stay_id, type=PaymentType.rent, amount=10000, total_amount=10000,
+                    status=PaymentStatus.pending_manual)
+            for stay_id in itertools.islice(itertools.cycle(portfolio.debtor_stay_ids or portfolio.stay_ids),
+                                            args.sessions + args.profile_sessions * 2)
+        ]
+        session.add_all(payments)
+        await session.commit()
+    return portfolio, [p.id for p in payments]
+
+
+def _counter_rows(counter, names: List[str]) -> List[Dict[str, Any]]:
+    return [dict(zip(names, labels), count=int(value)) for labels, value in sorted(counter.values.items())]
+
+
+def _handled(histogram) -> int:
+    return sum(sum(counts) for counts, _ in histogram.values.values())
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _api_stats(api: Optional[FakeTelegramAPI], base_url: str) -> Dict[str, Any]:
+    if api is not None:
+        return api.get_stats()
+    import aiohttp
+    async with aiohttp.ClientSession() as client:
+        async with client.get(f"{base_url}/stats") as response:
+            return await response.json()
+
+
+async def _main(args) -> dict:
+    db_url = args.db_url
+    if db_url is None:
+        tmp = tempfile.mkdtemp(prefix="load_test_")
+        db_url = f"sqlite+aiosqlite:///{Path(tmp) / 'load.sqlite'}"
+    _configure_environment(args, db_url)
+
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+
+    from bench.stats import latency_summary
+    from bot import metrics
+    from bot.database import instrumentation
+    from bot.database.core import engine
+    from bot.main import setup_dispatcher
+    from bot.services import ocr
+    from bot.services.ocr.manager import OCRManager
+
+    portfolio, payment_ids = await _seed(args)
+    ocr.ocr_manager = OCRManager(primary_provider=_stub_ocr_provider(args.ocr_latency_ms, args.seed))
+
+    api = None
+    base_url = args.api_url
+    if base_url is None:
+        api = FakeTelegramAPI(rate_429=args.rate_429, latency_ms=args.api_latency_ms, seed=args.seed)
+        base_url = await api.start()
+    bot = Bot(
+        token=FAKE_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    dp, cache_backend = await setup_dispatcher(bot)
+    admins = [OWNER_ID] + [OWNER_ID + 1 + i for i in range(args.admins)]
+    sim = Simulator(dp, bot, portfolio.tenant_tg_ids, admins, payment_ids, seed=args.seed)
+    mix = parse_mix(args.mix)
+
+    try:
+        # Statements per step: a few sessions one at a time (also warms caches)
+        sim.profiling = True
+        for kind in mix:
+            for user_id in (sim.admins if kind == "approve" else sim.tenants)[:args.profile_sessions]:
+                await sim.run_session(kind, user_id)
+        sim.profiling = False
+
+        planned = sim.plan(mix, args.sessions)
+        statements = instrumentation.totals["statements"]
+        handled = _handled(metrics.handler_duration)
+        updates = sum(metrics.updates_total.values.values())
+        errors_before = dict(metrics.handler_errors.values)
+        api_errors_before = dict(metrics.telegram_errors.values)
+        api_before = await _api_stats(api, base_url)
+
+        started = time.perf_counter()
+        await sim.run(planned, args.concurrency)
+        wall = time.perf_counter() - started
+
+        updates = int(sum(metrics.updates_total.values.values()) - updates)
+        handled = _handled(metrics.handler_duration) - handled
+        statements = instrumentation.totals["statements"] - statements
+        api_after = await _api_stats(api, base_url)
+    finally:
+        await dp.storage.close()
+        await dp.fsm.events_isolation.close()
+        await bot.session.close()
+        await cache_backend.close()
+        if api is not None:
+            await api.stop()
+        await engine.dispose()
+
+    for labels, value in errors_before.items():
+        metrics.handler_errors.values[labels] -= value
+    for labels, value in api_errors_before.items():
+        metrics.telegram_errors.values[labels] -= value
+    steps = []
+    for step, latencies in sim.latencies.items():
+        profile = sim.statements.get(step) or [0]
+        steps.append({
+            "step": step,
+            "updates": len(latencies),
+            **latency_summary(latencies),
+            "statements": round(sum(profile) / len(profile), 1),
+        })
+    calls = Counter(api_after["calls"])
+    calls.subtract(api_before["calls"])
+    handler_errors = [row for row in _counter_rows(metrics.handler_errors, ["router", "handler", "error"]) if row["count"]]
+    telegram_errors = [row for row in _counter_rows(metrics.telegram_errors, ["method", "error"]) if row["count"]]
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "dialect": engine.dialect.name,
+        "objects": portfolio.objects,
+        "users": len(portfolio.tenant_tg_ids),
+        "admins": len(admins),
+        "sessions": len(planned),
+        "concurrency": args.concurrency,
+        "mix": mix,
+        "updates": updates,
+        "wall_s": round(wall, 3),
+        "updates_per_s": round(updates / wall, 1) if wall else 0.0,
+        "reached_handler": handled,
+        "statements_per_update": round(statements / updates, 2) if updates else 0.0,
+        "handler_errors": handler_errors,
+        "handler_error_rate": round(sum(r["count"] for r in handler_errors) / updates, 4) if updates else 0.0,
+        "telegram_errors": telegram_errors,
+        "api_calls": {method: n for method, n in sorted(calls.items()) if n},
+        "injected_429": api_after["injected_429"] - api_before["injected_429"],
+        "steps": sorted(steps, key=lambda s: s["step"]),
+    }
+
+
+async def _serve_api(args):
+    api = FakeTelegramAPI(rate_429=args.rate_429, latency_ms=args.api_latency_ms, seed=args.seed)
+    print(f"Fake Bot API on {await api.start(args.host, args.port)} (stats at /stats)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the bot's Dispatcher with simulated users against a fake Bot API")
+    parser.add_argument("--db-url", default=None, help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--objects", type=int, default=2000, help="Portfolio size; about 0.9 tenants per object")
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--admins", type=int, default=3, help="Admins besides the owner (approve sessions)")
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200, help="Sessions in flight")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Session weights (default {DEFAULT_MIX})")
+    parser.add_argument("--profile-sessions", type=int, default=3, help="Sequential sessions per kind for statement counts")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of Bot API calls answered with 429")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0)
+    parser.add_argument("--ocr-latency-ms", type=float, default=0.0)
+    parser.add_argument("--api-url", default=None, help="Use a FakeTelegramAPI started with --serve-api")
+    parser.add_argument("--serve-api", action="store_true", help="Only run the fake Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="ERROR")
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    if args.serve_api:
+        asyncio.run(_serve_api(args))
+        return
+
+    from bench.stats import format_table
+
+    report = asyncio.run(_main(args))
+    print(
+        f"{report['dialect']}: {report['users']} users, {report['sessions']} sessions, "
+        f"concurrency {report['concurrency']}"
+    )
+    print(
+        f"{report['updates']} updates in {report['wall_s']} s: {report['updates_per_s']} updates/s, "
+        f"{report['reached_handler']} reached a handler, {report['statements_per_update']} SQL statements/update"
+    )
+    print(format_table(report["steps"], ["step", "updates", "p50_ms", "p95_ms", "p99_ms", "max_ms", "statements"]))
+    print(f"Handler error rate {report['handler_error_rate']:.2%}, injected 429s {report['injected_429']}")
+    if report["handler_errors"]:
+        print(format_table(report["handler_errors"], ["router", "handler", "error", "count"]))
+    if report["telegram_errors"]:
+        print(format_table(report["telegram_errors"], ["method", "error", "count"]))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
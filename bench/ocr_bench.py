@@ -0,0 +1,211 @@
+"""
+Receipt OCR benchmark.
+
+Runs every OCRProvider and the OCRManager fallback strategy over a
+labelled corpus and reports latency percentiles, throughput at the
+requested concurrency levels, CPU time and per-field precision/recall.
+
+    python -m bench.ocr_bench --corpus ./receipts --concurrency 1,4,8
+    python -m bench.ocr_bench --corpus ./receipts --stub-ollama --stub-latency-ms 800
+    python -m bench.ocr_bench --corpus ./receipts --ollama-host http://localhost:11434 --json out.json
+
+Without --ollama-host/--stub-ollama only pytesseract (if installed) is measured.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bench.corpus import CorpusItem, load_corpus
+from bench.stats import (
+    FieldScore, Stopwatch, amounts_match, format_table, latency_summary, receivers_match
+)
+from bot.services.ocr.ai_provider import AIModelProvider
+from bot.services.ocr.base import OCRProvider, OCRResult
+from bot.services.ocr.manager import OCRManager
+from bot.services.ocr.pytesseract_provider import PytesseractProvider
+
+Recognizer = Callable[[bytes, bool], Awaitable[OCRResult]]
+
+
+@dataclass
+class TargetReport:
+    """Measurements for one (target, concurrency) run"""
+    target: str
+    concurrency: int
+    items: int = 0
+    errors: int = 0
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    scores: Dict[str, FieldScore] = field(default_factory=lambda: {
+        "amount": FieldScore(), "date": FieldScore(), "receiver": FieldScore()
+    })
+
+    def as_dict(self) -> dict:
+        return {
+            "target": self.target,
+            "concurrency": self.concurrency,
+            "items": self.items,
+            "errors": self.errors,
+            "wall_s": round(self.wall_s, 3),
+            "throughput_per_s": round(self.items / self.wall_s, 2) if self.wall_s else 0.0,
+            "cpu_s": round(self.cpu_s, 3),
+            "cpu_ms_per_item": round(self.cpu_s / self.items * 1000, 2) if self.items else 0.0,
+            **latency_summary(self.latencies),
+            "fields": {name: score.as_dict() for name, score in self.scores.items()},
+        }
+
+
+def provider_recognizer(provider: OCRProvider) -> Recognizer:
+    async def recognize(file_bytes: bytes, is_pdf: bool) -> OCRResult:
+        if is_pdf:
+            return await provider.recognize_pdf(file_bytes)
+        return await provider.recognize_image(file_bytes)
+    return recognize
+
+
+def manager_recognizer(manager: OCRManager) -> Recognizer:
+    async def recognize(file_bytes: bytes, is_pdf: bool) -> OCRResult:
+        return await manager.recognize(file_bytes, is_pdf=is_pdf)
+    return recognize
+
+
+def score_result(report: TargetReport, item: CorpusItem, result: OCRResult):
+    report.scores["amount"].add(item.amount, result.amount, amounts_match(item.amount, result.amount))
+    report.scores["date"].add(item.date, result.date, item.date is not None and item.date == result.date)
+    receiver = (result.metadata or {}).get("receiver") or None
+    report.scores["receiver"].add(item.receiver, receiver, receivers_match(item.receiver, receiver))
+
+
+async def run_target(name: str, recognize: Recognizer, items: List[CorpusItem],
+                     payloads: Dict[str, bytes], concurrency: int) -> TargetReport:
+    """Run all items through one recognizer with bounded concurrency"""
+    report = TargetReport(target=name, concurrency=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item: CorpusItem):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await recognize(payloads[str(item.path)], item.is_pdf)
+            except Exception as e:
+                logging.warning(f"{name}: {item.path.name} failed: {e}")
+                report.errors += 1
+                return
+            finally:
+                report.latencies.append(time.perf_counter() - started)
+            if (result.metadata or {}).get("error"):
+                report.errors += 1
+            score_result(report, item, result)
+
+    with Stopwatch() as sw:
+        await asyncio.gather(*(one(item) for item in items))
+
+    report.items = len(items)
+    report.wall_s = sw.wall
+    report.cpu_s = sw.cpu
+    return report
+
+
+async def build_targets(args, items: List[CorpusItem]) -> tuple[Dict[str, Recognizer], Optional[object]]:
+    """Instantiate providers that are reachable in this environment"""
+    targets: Dict[str, Recognizer] = {}
+    stub = None
+
+    tesseract = PytesseractProvider()
+    if tesseract.is_available():
+        targets[tesseract.name] = provider_recognizer(tesseract)
+
+    ollama_host = args.ollama_host
+    if args.stub_ollama:
+        from bench.stub_ollama import StubOllama
+        stub = StubOllama(items, latency_ms=args.stub_latency_ms, jitter_ms=args.stub_jitter_ms)
+        ollama_host = await stub.start()
+
+    ai = None
+    if ollama_host:
+        ai = AIModelProvider(ollama_host, args.ollama_model)
+        if await ai.check_availability():
+            targets[f"{ai.name}{'_stub' if stub else ''}"] = provider_recognizer(ai)
+        else:
+            logging.warning(f"Ollama at {ollama_host} is not reachable, skipping")
+            ai = None
+
+    primary = ai or (tesseract if tesseract.is_available() else None)
+    fallback = tesseract if ai and tesseract.is_available() else None
+    if primary:
+        targets["manager"] = manager_recognizer(OCRManager(primary, fallback))
+
+    return targets, stub
+
+
+async def run(args) -> List[dict]:
+    items = [i for i in load_corpus(args.corpus) if i.is_binary]
+    if args.limit:
+        items = items[:args.limit]
+    if not items:
+        raise SystemExit(f"No images/PDFs with labels in {args.corpus}")
+
+    # Read files up front so disk I/O is not part of OCR latency
+    payloads = {str(i.path): i.read_bytes() for i in items}
+
+    targets, stub = await build_targets(args, items)
+    if not targets:
+        raise SystemExit("No OCR provider available (install tesseract or pass --stub-ollama)")
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    reports = []
+    try:
+        for name, recognize in targets.items():
+            for level in levels:
+                report = await run_target(name, recognize, items, payloads, level)
+                reports.append(report.as_dict())
+    finally:
+        if stub:
+            await stub.stop()
+    return reports
+
+
+def print_report(reports: List[dict]):
+    rows = []
+    for r in reports:
+        row = {k: r[k] for k in (
+            "target", "concurrency", "items", "errors", "throughput_per_s",
+            "p50_ms", "p95_ms", "cpu_ms_per_item"
+        )}
+        for fname, fscore in r["fields"].items():
+            row[f"{fname} P/R"] = f"{fscore['precision']:.2f}/{fscore['recall']:.2f}"
+        rows.append(row)
+    if rows:
+        print(format_table(rows, list(rows[0].keys())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark receipt OCR providers")
+    parser.add_argument("--corpus", required=True, help="Directory with receipts and labels.csv")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated concurrency levels")
+    parser.add_argument("--limit", type=int, default=0, help="Use only the first N items")
+    parser.add_argument("--ollama-host", default=None, help="Real Ollama base URL")
+    parser.add_argument("--ollama-model", default="llava")
+    parser.add_argument("--stub-ollama", action="store_true", help="Start local stub instead of Ollama")
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--json", dest="json_path", default=None, help="Write raw results to file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+
+    reports = asyncio.run(run(args))
+    print_report(reports)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+Synthetic rental portfolio generator for benchmarks and scale testing.
+
+Populates the schema with objects, stays (current and archived) with
+occupants, monthly rent and comm charges, payments with FIFO allocations
+(full, partial or missing depending on the tenant's payment profile),
+receipts and support messages. Rows are written with executemany bulk
+inserts and explicit primary keys, a batch of objects per transaction.
+
+    python -m bench.portfolio --db-url sqlite+aiosqlite:///data/scale.sqlite --create-schema --objects 20000
+    python -m bench.portfolio --db-url postgresql+asyncpg://bench@localhost/bench_scratch \\
+        --objects 100000 --months 36 --profiles good=0.6,late=0.25,debtor=0.15 --receipt-share 0.8
+
+Generated ids continue after the existing maximum, so the generator can be
+run against a scratch copy of real data. Never point it at production.
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Table, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.database.models import (
+    Base, ChargeStatus, CommCharge, CommProvider, ObjectStatus, Payment, PaymentAllocation,
+    PaymentReceipt, PaymentStatus, ReceiptDecision, RentalObject, RentCharge, Role, StayOccupant,
+    StayStatus, SupportMessage, Tenant, TenantStay,
+)
+
+OWNER_ID = 1
+TG_ID_BASE = 10_000
+
+# Insert order respects foreign keys
+TABLES: List[Table] = [
+    Tenant.__table__, RentalObject.__table__, CommProvider.__table__, TenantStay.__table__,
+    StayOccupant.__table__, RentCharge.__table__, CommCharge.__table__, Payment.__table__,
+    PaymentAllocation.__table__, PaymentReceipt.__table__, SupportMessage.__table__,
+]
+
+# service type -> (provider name, monthly amount range)
+SERVICES: Dict[str, Tuple[str, Tuple[float, float]]] = {
+    "electric": ("Энергосбыт", (800, 4500)),
+    "water": ("Водоканал", (600, 2500)),
+    "heating": ("Теплосеть", (1500, 6000)),
+    "garbage": ("Региональный оператор ТКО", (150, 450)),
+    "internet": ("Интернет-провайдер", (500, 900)),
+}
+
+SUPPORT_TEXTS = (
+    "Добрый день! Подскажите, пожалуйста, реквизиты для оплаты.",
+    "Течёт кран на кухне, можно прислать мастера?",
+    "Оплатил, чек прикрепил.",
+    "Когда будут показания за свет?",
+    "Спасибо, получили.",
+)
+
+
+@dataclass
+class PortfolioSpec:
+    objects: int = 1000
+    months: int = 24                    # charge history, current month included
+    vacancy: float = 0.08               # share of objects without an active stay
+    turnover: float = 0.3               # occupied objects that also had an earlier (archived) stay
+    # Payment behaviour of active stays: good = pays in full, late = latest month
+    # partially paid, debtor = 1..debt_months latest months unpaid. Months whose
+    # pay day is still ahead are unpaid for everybody.
+    profiles: Dict[str, float] = field(default_factory=lambda: {"good": 0.7, "late": 0.2, "debtor": 0.1})
+    debt_months: int = 3
+    occupants: Dict[int, float] = field(default_factory=lambda: {1: 0.6, 2: 0.3, 3: 0.1})
+    providers: Dict[int, float] = field(default_factory=lambda: {1: 0.2, 2: 0.3, 3: 0.3, 4: 0.2})
+    rent_min: int = 20000
+    rent_max: int = 80000
+    receipt_share: float = 0.6          # payments confirmed from a receipt photo
+    messages_per_stay: float = 1.5      # mean (Poisson)
+    seed: int = 0
+    today: Optional[date] = None
+
+
+@dataclass
+class Portfolio:
+    objects: int = 0
+    stay_ids: List[int] = field(default_factory=list)           # active stays
+    debtor_stay_ids: List[int] = field(default_factory=list)    # active stays with pending charges
+    tenant_tg_ids: List[int] = field(default_factory=list)      # primary tenants of active stays
+    rows: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+def month_starts(months: int, today: date) -> List[date]:
+    """First days of the last `months` months, oldest first, current month included"""
+    result = []
+    y, m = today.year, today.month
+    for _ in range(months):
+        result.append(date(y, m, 1))
+        y, m = (y, m - 1) if m > 1 else (y - 1, 12)
+    return result[::-1]
+
+
+def parse_weights(value: str, key=str) -> Dict:
+    """'good=0.7,late=0.2' -> {'good': 0.7, 'late': 0.2}"""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        weights[key(name.strip())] = float(weight)
+    return weights
+
+
+class _Generator:
+    def __init__(self, spec: PortfolioSpec, next_ids: Dict[str, int]):
+        self.spec = spec
+        self.rnd = random.Random(spec.seed)
+        self.today = spec.today or date.today()
+        self.months = month_starts(spec.months, self.today)
+        self.next_ids = next_ids
+        self.buffer: Dict[str, List[dict]] = defaultdict(list)
+        self.portfolio = Portfolio(objects=spec.objects)
+
+    def add(self, table: Table, **row) -> int:
+        return self.add_row(table, **row)["id"]
+
+    def add_row(self, table: Table, **row) -> dict:
+        row = {"id": self.next_ids[table.name], **row}
+        self.next_ids[table.name] += 1
+        self.buffer[table.name].append(row)
+        return row
+
+    def pick(self, weights: Dict):
+        return self.rnd.choices(list(weights), weights=list(weights.values()))[0]
+
+    def poisson(self, mean: float) -> int:
+        limit, k, p = math.exp(-mean), 0, 1.0
+        while True:
+            p *= self.rnd.random()
+            if p <= limit:
+                return k
+            k += 1
+
+    def tenant(self, with_tg: bool = True) -> int:
+        tenant_id = self.next_ids[Tenant.__table__.name]
+        return self.add(
+            Tenant.__table__, full_name=f"Арендатор {tenant_id}", phone=f"+79{tenant_id:09d}",
+            tg_id=TG_ID_BASE + tenant_id if with_tg else None, status="active",
+        )
+
+    def object(self, index: int):
+        spec = self.spec
+        obj = self.add_row(
+            RentalObject.__table__, owner_id=OWNER_ID,
+            address=f"г. Бенчмарк, ул. Тестовая, д. {index // 50 + 1}, кв. {index % 50 + 1}",
+            status=ObjectStatus.free.value,
+        )
+        object_id = obj["id"]
+        services = self.rnd.sample(list(SERVICES), min(self.pick(spec.providers), len(SERVICES)))
+        providers = [
+            (self.add(CommProvider.__table__, object_id=object_id, service_type=s, name=SERVICES[s][0], active=True), s)
+            for s in services
+        ]
+        if self.rnd.random() < spec.vacancy:
+            # Vacant now, possibly rented out earlier
+            if len(self.months) > 1 and self.rnd.random() < spec.turnover:
+                self.stay(object_id, providers, 0, self.rnd.randint(1, len(self.months) - 1), "good")
+            return
+        obj["status"] = ObjectStatus.occupied.value
+
+        start = 0
+        if len(self.months) > 1 and self.rnd.random() < spec.turnover:
+            start = self.rnd.randint(1, len(self.months) - 1)
+            self.stay(object_id, providers, 0, start, "good")
+        self.stay(object_id, providers, start, None, self.pick(spec.profiles))
+
+    def stay(self, object_id: int, providers, start: int, end: Optional[int], profile: str):
+        """end=None: active stay up to the current month; otherwise archived before months[end]"""
+        spec, rnd = self.spec, self.rnd
+        months = self.months[start:end]
+        active = end is None
+        occupants = self.pick(spec.occupants) if active else 1
+        tenant_ids = [self.tenant()] + [self.tenant(with_tg=rnd.random() < 0.7) for _ in range(occupants - 1)]
+
+        rent = rnd.randrange(spec.rent_min, spec.rent_max + 1, 1000)
+        rent_day = rnd.randint(1, 28)
+        date_to = None if active else self.months[end] - timedelta(days=1)
+        stay_id = self.add(
+            TenantStay.__table__, tenant_id=tenant_ids[0], object_id=object_id, date_from=months[0],
+            date_to=date_to, rent_amount=rent, rent_day=rent_day, comm_day=rnd.randint(1, 28),
+            status=StayStatus.active.value if active else StayStatus.archived.value,
+        )
+        for i, tenant_id in enumerate(tenant_ids):
+            self.add(
+                StayOccupant.__table__, stay_id=stay_id, tenant_id=tenant_id,
+                role="primary" if i == 0 else "co-tenant", joined_date=months[0], left_date=date_to,
+            )
+
+        unpaid_months = rnd.randint(1, spec.debt_months) if active and profile == "debtor" else 0
+        has_debt = False
+        for n, month in enumerate(months):
+            charges = [("rent", self.add_row(
+                RentCharge.__table__, stay_id=stay_id, month=month, amount=float(rent), base_amount=rent,
+                tax_amount=0, status=ChargeStatus.pending.value,
+            ))]
+            for provider_id, service in providers:
+                low, high = SERVICES[service][1]
+                charges.append(("comm", self.add_row(
+                    CommCharge.__table__, stay_id=stay_id, provider_id=provider_id, service_type=service,
+                    month=month, amount=round(rnd.uniform(low, high), 2), status=ChargeStatus.pending.value,
+                    source="manual",
+                )))
+
+            remaining_months = len(months) - n
+            if remaining_months <= unpaid_months:
+                share = 0.0
+            elif active and profile == "late" and remaining_months == 1:
+                share = round(rnd.uniform(0.3, 0.9), 2)
+            else:
+                share = 1.0
+            paid_on = month.replace(day=min(max(rent_day + rnd.randint(-3, 5), 1), 28))
+            if paid_on > self.today:
+                share = 0.0     # not due / not paid yet this month
+            has_debt |= share < 1.0
+            if share > 0:
+                self.payment(stay_id, paid_on, charges, share)
+
+        for _ in range(self.poisson(spec.messages_per_stay)):
+            self.add(
+                SupportMessage.__table__, stay_id=stay_id,
+                from_role=rnd.choice((Role.tenant.value, Role.admin.value)), text=rnd.choice(SUPPORT_TEXTS),
+                is_read_by_admin=True, is_read_by_tenant=True, is_archived=not active,
+            )
+
+        if active:
+            self.portfolio.stay_ids.append(stay_id)
+            self.portfolio.tenant_tg_ids.append(TG_ID_BASE + tenant_ids[0])
+            if has_debt:
+                self.portfolio.debtor_stay_ids.append(stay_id)
+
+    def payment(self, stay_id: int, paid_on: date, charges, share: float):
+        """One payment for the month, allocated FIFO (rent first); fully covered charges become paid"""
+        rnd = self.rnd
+        due = sum(row["amount"] for _, row in charges)
+        total = round(due * share, 2)
+        confirmed_at = datetime(paid_on.year, paid_on.month, paid_on.day, 10, tzinfo=timezone.utc)
+        with_receipt = rnd.random() < self.spec.receipt_share
+        payment_id = self.add(
+            Payment.__table__, stay_id=stay_id, type="rent", amount=total, total_amount=total,
+            allocated_amount=total, unallocated_amount=0, status=PaymentStatus.confirmed.value,
+            method="online", source="photo" if with_receipt else "manual", is_manual=not with_receipt,
+            confirmed_at=confirmed_at,
+        )
+
+        left = total
+        for charge_type, charge in charges:
+            if left <= 0.01:
+                break
+            allocated = round(min(left, charge["amount"]), 2)
+            self.add(PaymentAllocation.__table__, payment_id=payment_id, charge_id=charge["id"],
+                     charge_type=charge_type, amount=allocated)
+            left -= allocated
+            if allocated >= charge["amount"] - 0.01:
+                charge["status"] = ChargeStatus.paid.value
+
+        if with_receipt:
+            self.add(
+                PaymentReceipt.__table__, payment_id=payment_id, stay_id=stay_id,
+                file_id=f"bench-{payment_id}", file_type="photo",
+                ocr_text=f"Перевод {total:.2f} ₽", ocr_conf=round(rnd.uniform(0.7, 0.99), 3),
+                parsed_amount=total, parsed_date=confirmed_at.date(),
+                decision=ReceiptDecision.accepted.value,
+            )
+
+
+async def _next_ids(session: AsyncSession) -> Dict[str, int]:
+    ids = {}
+    for table in TABLES:
+        ids[table.name] = (await session.scalar(select(func.max(table.c.id))) or 0) + 1
+    return ids
+
+
+async def _write(session: AsyncSession, gen: _Generator, chunk: int):
+    for table in TABLES:
+        rows = gen.buffer.pop(table.name, [])
+        for i in range(0, len(rows), chunk):
+            await session.execute(insert(table), rows[i:i + chunk])
+        gen.portfolio.rows[table.name] += len(rows)
+    await session.commit()
+
+
+async def _sync_sequences(session: AsyncSession):
+    """Explicit ids bypass PostgreSQL sequences; move them past the generated rows"""
+    if session.bind.dialect.name != "postgresql":
+        return
+    for table in TABLES:
+        await session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 1) FROM {table.name}))"
+        ))
+    await session.commit()
+
+
+async def generate_portfolio(
+    session: AsyncSession,
+    spec: PortfolioSpec,
+    batch_objects: int = 500,
+    chunk: int = 5000,
+    progress=None,
+) -> Portfolio:
+    """Generate and insert the portfolio; commits every batch_objects objects"""
+    gen = _Generator(spec, await _next_ids(session))
+    for index in range(spec.objects):
+        gen.object(index)
+        if (index + 1) % batch_objects == 0 or index + 1 == spec.objects:
+            await _write(session, gen, chunk)
+            if progress:
+                progress(index + 1, gen.portfolio)
+    await _sync_sequences(session)
+    return gen.portfolio
+
+
+async def seed_portfolio(
+    session: AsyncSession,
+    objects: int = 20,
+    months: int = 6,
+    vacant_share: float = 0.1,
+    debtor_share: float = 0.3,
+    seed: int = 0,
+    today: Optional[date] = None,
+) -> Portfolio:
+    """Small portfolio for tests: one stay per object, debtors owe the current month"""
+    spec = PortfolioSpec(
+        objects=objects, months=months, vacancy=vacant_share, turnover=0.0,
+        profiles={"good": 1 - debtor_share, "debtor": debtor_share}, debt_months=1,
+        occupants={1: 1.0}, providers={1: 1.0}, receipt_share=0.0, messages_per_stay=0.0,
+        seed=seed, today=today,
+    )
+    return await generate_portfolio(session, spec)
+
+
+async def load_portfolio(session: AsyncSession) -> Portfolio:
+    """Portfolio summary of an already populated database (e.g. generated earlier)"""
+    stays = (await session.execute(
+        select(TenantStay.id, Tenant.tg_id)
+        .join(Tenant, Tenant.id == TenantStay.tenant_id)
+        .where(TenantStay.status == StayStatus.active.value)
+        .order_by(TenantStay.id)
+    )).all()
+    debtors = set((await session.execute(
+        select(RentCharge.stay_id).where(RentCharge.status == ChargeStatus.pending.value).distinct()
+    )).scalars().all())
+    return Portfolio(
+        objects=await session.scalar(select(func.count(RentalObject.id))),
+        stay_ids=[stay_id for stay_id, _ in stays],
+        debtor_stay_ids=[stay_id for stay_id, _ in stays if stay_id in debtors],
+        tenant_tg_ids=[tg_id for _, tg_id in stays if tg_id is not None],
+    )
+
+
+async def _main(args):
+    spec = PortfolioSpec(
+        objects=args.objects, months=args.months, vacancy=args.vacancy, turnover=args.turnover,
+        profiles=parse_weights(args.profiles), debt_months=args.debt_months,
+        occupants=parse_weights(args.occupants, int), providers=parse_weights(args.providers, int),
+        rent_min=args.rent_min, rent_max=args.rent_max, receipt_share=args.receipt_share,
+        messages_per_stay=args.messages_per_stay, seed=args.seed,
+    )
+    engine = create_async_engine(args.db_url)
+    started = time.perf_counter()
+
+    def progress(done: int, portfolio: Portfolio):
+        rows = sum(portfolio.rows.values())
+        elapsed = time.perf_counter() - started
+        print(f"{done}/{spec.objects} objects, {rows} rows, {rows / elapsed:.0f} rows/s", flush=True)
+
+    try:
+        if args.create_schema:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with factory() as session:
+            portfolio = await generate_portfolio(
+                session, spec, batch_objects=args.batch_objects, chunk=args.chunk, progress=progress,
+            )
+    finally:
+        await engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    print(f"Done in {elapsed:.1f}s: {len(portfolio.stay_ids)} active stays, "
+          f"{len(portfolio.debtor_stay_ids)} with debt")
+    for table in TABLES:
+        print(f"  {table.name:<20} {portfolio.rows[table.name]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Populate a scratch database with a synthetic portfolio")
+    parser.add_argument("--db-url", required=True, help="Scratch database URL (never production)")
+    parser.add_argument("--create-schema", action="store_true", help="create_all before inserting (instead of alembic)")
+    parser.add_argument("--objects", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--vacancy", type=float, default=0.08)
+    parser.add_argument("--turnover", type=float, default=0.3)
+    parser.add_argument("--profiles", default="good=0.7,late=0.2,debtor=0.1")
+    parser.add_argument("--debt-months", type=int, default=3)
+    parser.add_argument("--occupants", default="1=0.6,2=0.3,3=0.1", help="occupants per active stay")
+    parser.add_argument("--providers", default="1=0.2,2=0.3,3=0.3,4=0.2", help="comm providers per object")
+    parser.add_argument("--rent-min", type=int, default=20000)
+    parser.add_argument("--rent-max", type=int, default=80000)
+    parser.add_argument("--receipt-share", type=float, default=0.6)
+    parser.add_argument("--messages-per-stay", type=float, default=1.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-objects", type=int, default=500, help="objects per transaction")
+    parser.add_argument("--chunk", type=int, default=5000, help="rows per executemany")
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Query-budget regression suite.
+
+Seeds a synthetic portfolio, runs key services and handlers (handlers get
+events bound to an offline Bot) and checks every scenario against an upper
+bound on SQL statements and wall time. Statement budgets are
+``base + per_stay * active stays``: a scenario that is meant to be constant
+has per_stay = 0, so an N+1 regression fails it at any portfolio size.
+
+    python -m bench.query_budget
+    python -m bench.query_budget --objects 500 --months 24 --json budget.json
+    python -m bench.query_budget --db-url postgresql+asyncpg://bench@localhost/bench_scratch
+    python -m bench.query_budget --db-url sqlite+aiosqlite:///data/scale.sqlite --existing
+
+The database must be a scratch one: the schema is created and seeded, or
+with --existing a portfolio made by bench.portfolio is used as is.
+Exit status is 1 if any budget is exceeded. tests/test_query_budget.py runs
+the same scenarios on a small SQLite portfolio.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from aiogram import Bot
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bench.fake_bot import make_bot, make_callback, make_message
+from bench.portfolio import OWNER_ID, Portfolio, load_portfolio, seed_portfolio
+from bench.stats import Stopwatch, format_table
+from bot.database import instrumentation
+from bot.database.instrumentation import QueryStats
+from bot.database.models import Base, Payment, PaymentStatus, Tenant
+
+
+@dataclass
+class Context:
+    session_factory: async_sessionmaker
+    portfolio: Portfolio
+    bot: Bot
+    stats: Optional[QueryStats] = None
+    wall: float = 0.0
+
+    @contextmanager
+    def measure(self):
+        """Count statements and wall time of the block (setup stays outside)"""
+        self.stats = QueryStats()
+        token = instrumentation.start(self.stats)
+        try:
+            with Stopwatch() as sw:
+                yield self.stats
+        finally:
+            instrumentation.stop(token)
+        self.wall = sw.wall
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[Context], Awaitable[None]]
+    base: int                   # statements allowed regardless of size
+    per_stay: float = 0.0       # extra statements allowed per active stay
+    max_ms: float = 500.0
+    per_stay_ms: float = 0.0
+
+    def max_statements(self, stays: int) -> int:
+        return int(self.base + self.per_stay * stays)
+
+    def max_wall_ms(self, stays: int) -> float:
+        return self.max_ms + self.per_stay_ms * stays
+
+
+@dataclass
+class Result:
+    name: str
+    statements: int
+    max_statements: int
+    top_repeats: int
+    wall_ms: float
+    max_wall_ms: float
+    ok: bool
+
+
+# --- Scenarios ---
+
+async def _get_stay_balance(ctx: Context):
+    from bot.services.balance_service import get_stay_balance
+    async with ctx.session_factory() as session:
+        with ctx.measure():
+            await get_stay_balance(session, ctx.portfolio.debtor_stay_ids[0])
+
+
+async def _allocate_payment(ctx: Context):
+    from bot.services.payment_service import allocate_payment
+    stay_id = ctx.portfolio.debtor_stay_ids[0]
+    async with ctx.session_factory() as session:
+        payment = Payment(stay_id=stay_id, type="rent", amount=100000, total_amount=100000,
+                          status=PaymentStatus.confirmed.value, confirmed_at=datetime.now(timezone.utc))
+        session.add(payment)
+        await session.flush()
+        with ctx.measure():
+            await allocate_payment(session, payment.id)
+        await session.rollback()
+
+
+async def _daily_billing_job(ctx: Context):
+    import bot.cron as cron
+    from bot.services.notification_service import NotificationService
+
+    # cron holds its own reference to the notification service
+    saved = cron.notification_service
+    cron.notification_service = NotificationService(ctx.bot)
+    try:
+        with ctx.measure():
+            await cron.daily_billing_job(ctx.session_factory)
+    finally:
+        cron.notification_service = saved
+
+
+async def _report_debtors(ctx: Context):
+    from bot.handlers.admin import report_debtors
+    call = make_callback(ctx.bot, "report_debtors", OWNER_ID)
+    async with ctx.session_factory() as session:
+        with ctx.measure():
+            await report_debtors(call, session)
+
+
+async def _list_objects_msg(ctx: Context):
+    from bot.handlers.admin import list_objects_msg
+    message = make_message(ctx.bot, "🏠 Адреса", OWNER_ID)
+    async with ctx.session_factory() as session:
+        with ctx.measure():
+            await list_objects_msg(message, session)
+
+
+async def _status_command(ctx: Context):
+    from bot.handlers.tenant import status_command
+    tg_id = ctx.portfolio.tenant_tg_ids[0]
+    message = make_message(ctx.bot, "/status", tg_id)
+    async with ctx.session_factory() as session:
+        tenant = await session.scalar(select(Tenant).where(Tenant.tg_id == tg_id))
+        with ctx.measure():
+            await status_command(message, tenant, session)
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("get_stay_balance", _get_stay_balance, base=12),
+    # SQLite inserts allocations one per statement (RETURNING); Postgres batches them
+    Scenario("allocate_payment", _allocate_payment, base=16),
+    # Per stay: existing-charge check, plus utility/meter checks on reminder days
+    Scenario("daily_billing_job", _daily_billing_job, base=10, per_stay=5, max_ms=1000, per_stay_ms=20),
+    Scenario("report_debtors", _report_debtors, base=5),
+    # Lists every object: selectinload issues one IN query per 500 parents
+    Scenario("list_objects_msg", _list_objects_msg, base=6, per_stay=3 / 500),
+    Scenario("status_command", _status_command, base=6),
+]
+
+
+async def run_scenarios(
+    session_factory: async_sessionmaker,
+    portfolio: Portfolio,
+    scenarios: Optional[List[Scenario]] = None,
+    time_scale: float = 1.0,
+) -> List[Result]:
+    """Run scenarios in order against an already seeded database"""
+    bot = make_bot()
+    stays = len(portfolio.stay_ids)
+    results = []
+    for scenario in scenarios or SCENARIOS:
+        ctx = Context(session_factory, portfolio, bot)
+        await scenario.run(ctx)
+        max_statements = scenario.max_statements(stays)
+        max_wall_ms = scenario.max_wall_ms(stays) * time_scale
+        wall_ms = round(ctx.wall * 1000, 2)
+        results.append(Result(
+            name=scenario.name,
+            statements=ctx.stats.statements,
+            max_statements=max_statements,
+            top_repeats=ctx.stats.top_shape()[1],
+            wall_ms=wall_ms,
+            max_wall_ms=max_wall_ms,
+            ok=ctx.stats.statements <= max_statements and wall_ms <= max_wall_ms,
+        ))
+    await bot.session.close()
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _main(args) -> dict:
+    db_url = args.db_url
+    if db_url is None:
+        tmp = tempfile.mkdtemp(prefix="query_budget_")
+        db_url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.sqlite'}"
+
+    engine = create_async_engine(db_url)
+    try:
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        if args.existing:
+            async with factory() as session:
+                portfolio = await load_portfolio(session)
+        else:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with factory() as session:
+                portfolio = await seed_portfolio(session, objects=args.objects, months=args.months, seed=args.seed)
+        results = await run_scenarios(factory, portfolio, time_scale=args.time_scale)
+    finally:
+        await engine.dispose()
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "dialect": engine.dialect.name,
+        "objects": portfolio.objects,
+        "stays": len(portfolio.stay_ids),
+        "months": None if args.existing else args.months,
+        "results": [asdict(r) for r in results],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check SQL statement and time budgets of key handlers/services")
+    parser.add_argument("--db-url", default=None, help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--existing", action="store_true", help="Use the data already in --db-url (see bench.portfolio)")
+    parser.add_argument("--objects", type=int, default=50)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiply wall-time budgets (slow CI machines)")
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(_main(args))
+    columns = ["name", "statements", "max_statements", "top_repeats", "wall_ms", "max_wall_ms", "ok"]
+    print(f"{report['dialect']}: {report['objects']} objects, {report['stays']} active stays")
+    print(format_table(report["results"], columns))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if not all(r["ok"] for r in report["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
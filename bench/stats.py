@@ -0,0 +1,104 @@
+"""Small statistics helpers shared by the benchmark scripts."""
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile (pct in 0..100); 0.0 for empty input"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def latency_summary(latencies_s: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99/max in milliseconds"""
+    return {
+        "p50_ms": round(percentile(latencies_s, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies_s, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies_s, 99) * 1000, 2),
+        "max_ms": round(max(latencies_s, default=0.0) * 1000, 2),
+    }
+
+
+def cpu_seconds() -> float:
+    """CPU time of this process plus reaped children (tesseract runs as a subprocess)"""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class Stopwatch:
+    """Wall + CPU timer used as a context manager"""
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = cpu_seconds()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = cpu_seconds() - self._cpu
+        return False
+
+
+@dataclass
+class FieldScore:
+    """Precision/recall counters for one extracted field"""
+    tp: int = 0
+    fp: int = 0
+    fn: int = 0
+
+    def add(self, expected, predicted, correct: bool):
+        if predicted is None:
+            if expected is not None:
+                self.fn += 1
+            return
+        if expected is not None and correct:
+            self.tp += 1
+        else:
+            self.fp += 1
+            if expected is not None:
+                self.fn += 1
+
+    @property
+    def precision(self) -> float:
+        total = self.tp + self.fp
+        return self.tp / total if total else 0.0
+
+    @property
+    def recall(self) -> float:
+        total = self.tp + self.fn
+        return self.tp / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "tp": self.tp, "fp": self.fp, "fn": self.fn,
+            "precision": round(self.precision, 3),
+            "recall": round(self.recall, 3),
+        }
+
+
+def amounts_match(expected, predicted) -> bool:
+    return expected is not None and predicted is not None and abs(float(expected) - float(predicted)) < 0.01
+
+
+def receivers_match(expected, predicted) -> bool:
+    if not expected or not predicted:
+        return False
+    norm = lambda s: " ".join(s.replace('"', " ").replace("«", " ").replace("»", " ").casefold().split())
+    e, p = norm(expected), norm(predicted)
+    return bool(e) and bool(p) and (e in p or p in e)
+
+
+def format_table(rows: List[Dict], columns: List[str]) -> str:
+    """Plain-text table for terminal reports"""
+    widths = {c: max([len(c)] + [len(str(r.get(c, ""))) for r in rows]) for c in columns}
+    lines = ["  ".join(c.ljust(widths[c]) for c in columns)]
+    lines.append("  ".join("-" * widths[c] for c in columns))
+    for r in rows:
+        lines.append("  ".join(str(r.get(c, "")).ljust(widths[c]) for c in columns))
+    return "\n".join(lines)
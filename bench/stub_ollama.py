@@ -0,0 +1,99 @@
+"""
+Local stand-in for the Ollama HTTP API.
+
+Answers /api/tags and /api/generate the way AIModelProvider expects.
+Responses are looked up by the sha256 of the submitted image in the
+labelled corpus, so the "model" is always right and the benchmark
+measures our own overhead plus the configured artificial latency.
+
+Standalone:
+    python -m bench.stub_ollama --corpus path/to/corpus --port 11435
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+from typing import Dict, Iterable, Optional
+
+from aiohttp import web
+
+from bench.corpus import CorpusItem, load_corpus
+
+
+class StubOllama:
+    """aiohttp app emulating Ollama with deterministic answers"""
+
+    def __init__(self, items: Iterable[CorpusItem] = (), latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, model: str = "llava"):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.model = model
+        self.requests = 0
+        self.answers: Dict[str, dict] = {}
+        for item in items:
+            if item.is_binary:
+                digest = hashlib.sha256(item.read_bytes()).hexdigest()
+                self.answers[digest] = {
+                    "amount": item.amount,
+                    "date": item.date.isoformat() if item.date else None,
+                    "receiver": item.receiver,
+                }
+        self._runner: Optional[web.AppRunner] = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_get("/api/tags", self.handle_tags)
+        app.router.add_post("/api/generate", self.handle_generate)
+        return app
+
+    async def handle_tags(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": self.model}]})
+
+    async def handle_generate(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        payload = await request.json()
+        images = payload.get("images") or []
+
+        answer = {"amount": None, "date": None, "receiver": None}
+        if images:
+            digest = hashlib.sha256(base64.b64decode(images[0])).hexdigest()
+            answer = self.answers.get(digest, answer)
+
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+        return web.json_response({"model": self.model, "response": json.dumps(answer), "done": True})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving in the current loop; returns base URL"""
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{bound_port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server for OCR benchmarks")
+    parser.add_argument("--corpus", required=True, help="Corpus directory with labels.csv")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Simulated inference time")
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    stub = StubOllama(load_corpus(args.corpus), args.latency_ms, args.jitter_ms)
+    web.run_app(stub.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,13 @@ class Config:
         # Build PostgreSQL URL
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    # Read replica (OPTIONAL) for reports/list views; None = everything on primary
+    REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL") or None
+    # Fall back to primary when replica lags more than this (seconds)
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+    # How often replica lag is re-checked (seconds)
+    REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+
     # Admin IDs - loaded from .env (static) + DB (dynamic)
     # Store original env values separately for reload_admin_cache()
     _env_admin_ids = [int(x.strip()) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip() and x.strip().isdigit()]
@@ -42,15 +49,120 @@ class Config:
             "Get your Telegram ID from @userinfobot"
         )
     
-    # Runtime lists (will be updated from DB on startup and after admin changes)
-    ADMIN_IDS = _env_admin_ids.copy()
-    OWNER_IDS = _env_owner_ids.copy()
+    # Live, read-only views of the role registry (env + DB, refreshed by
+    # reload_admin_cache); check roles with role_registry.is_owner/is_admin
+    @property
+    def ADMIN_IDS(self):
+        from bot.services.role_registry import role_registry
+        return role_registry.admin_ids
+
+    @property
+    def OWNER_IDS(self):
+        from bot.services.role_registry import role_registry
+        return role_registry.owner_ids
 
     # Ollama Settings (OPTIONAL - for AI OCR)
     # If not set, bot will use Tesseract OCR as fallback
     OLLAMA_HOST = os.getenv("OLLAMA_HOST", None)  # None = disabled
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llava")
 
+    # Unit of work: only DbSessionMiddleware / jobs commit; a stray session.commit()
+    # in a handler or service raises. Enable in dev/tests to catch regressions.
+    DB_STRICT_UOW = os.getenv("DB_STRICT_UOW", "false").lower() in ("1", "true", "yes")
+
+    # SQL instrumentation budgets (per update); exceeding them logs an "N+1 suspect"
+    SQL_MAX_STATEMENTS_PER_UPDATE = int(os.getenv("SQL_MAX_STATEMENTS_PER_UPDATE", "30"))
+    SQL_MAX_REPEATED_STATEMENT = int(os.getenv("SQL_MAX_REPEATED_STATEMENT", "5"))  # same SQL shape
+    SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+
+    # Tenant identity cache (ConsentMiddleware): tg_id -> id/consent/status/name
+    IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "60"))  # seconds, 0 = off
+    IDENTITY_CACHE_NEGATIVE_TTL = float(os.getenv("IDENTITY_CACHE_NEGATIVE_TTL", "10"))  # "not a tenant"
+    IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+
+    # Update scheduling: one update at a time per user, at most UPDATE_CONCURRENCY
+    # handlers overall (keep below the DB pool: pool_size 5 + max_overflow 10)
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "10"))
+    CALLBACK_DEDUP_WINDOW = float(os.getenv("CALLBACK_DEDUP_WINDOW", "2"))  # seconds; repeated button presses are dropped
+
+    # Per-user limit on all updates (taps, messages, FSM steps) per window;
+    # 0 = off. File uploads and OCR have their own, always-on limits.
+    RATE_LIMIT_UPDATES = int(os.getenv("RATE_LIMIT_UPDATES", "0"))
+    RATE_LIMIT_WINDOW = float(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
+
+    # Redelivered updates (same update_id) are skipped. Store shared between
+    # replicas: auto (cache backend if set, else memory) | memory | db
+    UPDATE_DEDUP_STORE = os.getenv("UPDATE_DEDUP_STORE", "auto").lower()
+    UPDATE_DEDUP_WINDOW = int(os.getenv("UPDATE_DEDUP_WINDOW", "10000"))  # update_ids kept in memory
+    UPDATE_DEDUP_TTL = float(os.getenv("UPDATE_DEDUP_TTL", "86400"))  # seconds kept in the shared store
+
+    # Leader election: only the holder of the "scheduler" lease runs daily jobs
+    LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", "30"))  # seconds; failover time
+    LEADER_RENEW_INTERVAL = float(os.getenv("LEADER_RENEW_INTERVAL", "10"))  # seconds
+
+    # Startup: event loop (uvloop | asyncio) and DB pool connections opened
+    # before the first update (0 = connect on demand)
+    EVENT_LOOP = os.getenv("EVENT_LOOP", "uvloop").lower()
+    DB_WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", "2"))
+
+    # Prometheus /metrics: own server in polling mode (0 = off); in webhook
+    # mode it is served on the webhook port instead. Loopback by default:
+    # the counters are internal, and 9100 is node_exporter's usual port
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+    # Sentry error tracking and performance tracing (see bot/tracing.py); empty DSN = off
+    SENTRY_DSN = os.getenv("SENTRY_DSN", "")
+    SENTRY_ENVIRONMENT = os.getenv("SENTRY_ENVIRONMENT", "development")
+    SENTRY_TRACES_SAMPLE_RATE = float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", "0.1"))  # share of updates/jobs traced
+
+    # Update delivery: polling (development) | webhook (production, see bot/webhook.py)
+    BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # public https base URL, e.g. https://bot.example.com
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # required: X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))  # processes sharing the socket; >1 needs CACHE_BACKEND_URL
+
+    # Seconds a stopping process waits for in-flight updates and a running
+    # scheduled job before closing connections (see bot/shutdown.py)
+    SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", os.getenv("WEBHOOK_DRAIN_TIMEOUT", "25")))
+
+    # FSM storage for multi-step flows: db (survives restarts) | memory
+    # (ignored when CACHE_BACKEND_URL is set: FSM state then lives in Redis)
+    FSM_STORAGE = os.getenv("FSM_STORAGE", "db").lower()
+    FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "86400"))  # seconds; idle flows expire
+    # Seconds a process serves reads from its local copy: 5 by default for a
+    # single bot process (polling, or one webhook worker), 0 with several
+    # workers. Set 0 when replicas share the database without CACHE_BACKEND_URL
+    _single_process = BOT_MODE != "webhook" or WEBHOOK_WORKERS <= 1
+    FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL") or ("5" if _single_process else "0"))
+
+    # Shared cache backend for multi-instance deployments (rate limits, FSM,
+    # cache invalidation); empty = in-process. Requires: pip install redis
+    CACHE_BACKEND_URL = os.getenv("CACHE_BACKEND_URL", "")  # redis://host:6379/0
+    CACHE_BACKEND_PREFIX = os.getenv("CACHE_BACKEND_PREFIX", "rentbot:")
+
+    # Receipt near-duplicate detection (perceptual hash)
+    # Max Hamming distance (of 64 bits) to treat two photos as the same receipt
+    RECEIPT_DUP_MAX_DISTANCE = int(os.getenv("RECEIPT_DUP_MAX_DISTANCE", "6"))
+    # Only compare against receipts uploaded within this many days
+    RECEIPT_DUP_WINDOW_DAYS = int(os.getenv("RECEIPT_DUP_WINDOW_DAYS", "20"))
+
+    # Receipt file storage: local | s3 | off
+    RECEIPT_STORAGE = os.getenv("RECEIPT_STORAGE", "local").lower()
+    RECEIPT_STORAGE_DIR = os.getenv("RECEIPT_STORAGE_DIR", "data/receipts")
+    RECEIPT_PREVIEW_SIZE = int(os.getenv("RECEIPT_PREVIEW_SIZE", "1280"))  # px, longest side
+    # Delete stored files of receipts older than N days (0 = keep forever)
+    RECEIPT_RETENTION_DAYS = int(os.getenv("RECEIPT_RETENTION_DAYS", "0"))
+    # S3-compatible backend (RECEIPT_STORAGE=s3, requires boto3)
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # None = AWS
+    S3_BUCKET = os.getenv("S3_BUCKET", "")
+    S3_PREFIX = os.getenv("S3_PREFIX", "receipts")
+    S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
+    S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
+
     # DaData Settings (Address Normalization)
     DADATA_API_KEY = os.getenv("DADATA_API_KEY")  # Suggestions API
     DADATA_SECRET_KEY = os.getenv("DADATA_SECRET_KEY")  # Clean API (optional, can use API_KEY)
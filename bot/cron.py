@@ -1,14 +1,26 @@
 import asyncio
 import logging
+import time
 from datetime import date, timedelta
+from typing import Optional, Set
 from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 from bot.database.core import AsyncSessionLocal
-from bot.database.models import TenantStay, StayStatus, CommCharge, ChargeStatus, ObjectSettings, CommProvider, TenantSettings, Tenant
+from bot.database.models import TenantStay, StayStatus, CommCharge, ChargeStatus, ObjectSettings, CommProvider, TenantSettings, Tenant, StayOccupant, ObjectRSOLink
 from bot.utils.ui import format_date
 from bot.services.billing_service import ensure_rent_charge
 from bot.services.notification_service import notification_service
 
+# Set on shutdown: no new run starts, a running one is let finish
+_stopping = False
+# Resolved when the daily run in progress (and its mark_run) is done
+_current_run: Optional[asyncio.Future] = None
+# Jobs and billed stays finished on _done_day: a retry after a failed run
+# redoes only the rest (no second round of reminders)
+_done_day: Optional[date] = None
+_done_jobs: Set[str] = set()
+_billed_stays: Set[int] = set()
+
 async def check_utility_aggregation(session, stay: TenantStay) -> tuple[bool, int, int]:
     """
     Check if utility charges are ready for notification.
@@ -47,16 +59,22 @@ async def check_utility_aggregation(session, stay: TenantStay) -> tuple[bool, in
     
     return is_ready, collected_count, total_providers
 
-async def daily_billing_job():
+async def daily_billing_job(session_factory=None, billed: Optional[Set[int]] = None) -> bool:
+    """Charges and reminders per active stay; False if any stay failed (stays in `billed` are skipped)"""
     logging.info("Running daily billing job...")
+    failed = 0
     
-    async with AsyncSessionLocal() as session:
-        # Fetch active stays with tenant and settings
+    async with (session_factory or AsyncSessionLocal)() as session:
+        # Fetch active stays with tenant, occupants and their settings
+        # (active_occupants / primary_tenant must not lazy-load per stay)
         stmt = (
             select(TenantStay)
             .where(TenantStay.status == StayStatus.active.value)
             .options(
                 selectinload(TenantStay.tenant)
+                .selectinload(Tenant.settings),
+                selectinload(TenantStay.occupants)
+                .selectinload(StayOccupant.tenant)
                 .selectinload(Tenant.settings)
             )
         )
@@ -66,6 +84,8 @@ async def daily_billing_job():
         today = date.today()
         
         for stay in stays:
+            if billed is not None and stay.id in billed:
+                continue
             try:
                 # 1. Rent Logic - Create charge for current month
                 # Always ensure charge exists for the current calendar month
@@ -79,7 +99,8 @@ async def daily_billing_job():
                 
                 # Use primary tenant's settings as default (backward compatibility)
                 primary_tenant = stay.primary_tenant
-                settings = primary_tenant.settings if primary_tenant else None
+                # Tenant.settings is a backref list (0 or 1 row)
+                settings = primary_tenant.settings[0] if primary_tenant and primary_tenant.settings else None
                 remind_days = settings.reminder_days if settings else 3
                 
                 # 2. Rent Reminders (notify all occupants with rent_notifications enabled)
@@ -166,17 +187,109 @@ async def daily_billing_job():
                                  except Exception as e:
                                      logging.warning(f"Failed to notify occupant {occupant.id} about readings: {e}")
 
-                # Commit updates for this stay (if any)
+                # One unit of work per stay: services only flush
                 await session.commit()
+                if billed is not None:
+                    billed.add(stay.id)
                 
             except Exception as e:
+                failed += 1
                 logging.error(f"Error processing billing for stay {stay.id}: {e}")
                 await session.rollback()
             
-    logging.info("Daily billing job finished.")
+    logging.info(f"Daily billing job finished ({failed} stays failed).")
+    return failed == 0
+
+async def receipt_retention_job() -> bool:
+    """Purge stored receipt files past RECEIPT_RETENTION_DAYS."""
+    from bot.config import config
+    from bot.services.receipt_storage import apply_retention
+    
+    if config.RECEIPT_RETENTION_DAYS <= 0:
+        return True
+    
+    from bot.database.uow import transaction
+    
+    async with transaction() as session:
+        await apply_retention(session, config.RECEIPT_RETENTION_DAYS)
+    return True
+
+async def fsm_purge_job() -> bool:
+    """Delete FSM flows abandoned for longer than FSM_STATE_TTL."""
+    from bot.config import config
+    
+    if config.FSM_STORAGE != "db":
+        return True
+    
+    from bot.database.fsm_storage import purge_expired
+    from bot.database.uow import transaction
+    
+    async with transaction() as session:
+        purged = await purge_expired(session)
+    if purged:
+        logging.info(f"Purged {purged} expired FSM states")
+    return True
+
+async def update_log_purge_job() -> bool:
+    """Forget handled update_ids older than UPDATE_DEDUP_TTL."""
+    from bot.config import config
+    from bot.database.update_log import purge_processed
+    from bot.database.uow import transaction
+    
+    async with transaction() as session:
+        purged = await purge_processed(session, config.UPDATE_DEDUP_TTL)
+    if purged:
+        logging.info(f"Purged {purged} processed update ids")
+    return True
+
+async def run_daily_jobs(day: date) -> bool:
+    """
+    Run the day's jobs, each on its own; True if all of them succeeded.
+    
+    Jobs that already succeeded on `day` (and stays already billed) are
+    skipped, so retrying a failed run only redoes what failed.
+    """
+    from bot import metrics, tracing
+    
+    global _done_day
+    if _done_day != day:
+        _done_day = day
+        _done_jobs.clear()
+        _billed_stays.clear()
+    
+    jobs = (
+        ("daily_billing_job", lambda: daily_billing_job(billed=_billed_stays)),
+        ("receipt_retention_job", receipt_retention_job),
+        ("fsm_purge_job", fsm_purge_job),
+        ("update_log_purge_job", update_log_purge_job),
+    )
+    succeeded = True
+    for name, job in jobs:
+        if name in _done_jobs:
+            continue
+        started = time.perf_counter()
+        try:
+            with tracing.transaction("scheduler.job", name):
+                ok = await job()
+        except Exception as e:
+            logging.error(f"Scheduled job {name} failed: {e}")
+            ok = False
+        finally:
+            metrics.job_duration.observe(time.perf_counter() - started, name)
+        if ok:
+            _done_jobs.add(name)
+        else:
+            succeeded = False
+    return succeeded
 
-async def scheduler_loop():
-    """Run job once a day at 09:00 AM."""
+async def scheduler_loop(elector=None):
+    """
+    Run jobs once a day at 09:00 AM (UTC).
+    
+    With a LeaderElector this runs on the leader only (see run_scheduler),
+    and a new leader catches up on today's run if the previous one died
+    before doing it.
+    """
     from datetime import datetime, timezone
     
     logging.info("Scheduler started.")
@@ -196,6 +309,11 @@ async def scheduler_loop():
                 next_run = today_target
             else:
                 next_run = today_target + timedelta(days=1)
+                if elector is not None:
+                    lease = await elector.current()
+                    if lease is None or lease.last_run_on != now.date():
+                        logging.info("Today's scheduled run is missing, running it now")
+                        next_run = now
             
             wait_seconds = (next_run - now).total_seconds()
             
@@ -203,12 +321,58 @@ async def scheduler_loop():
             
             await asyncio.sleep(wait_seconds)
             
+            if elector is not None and not elector.lease_valid:
+                # Lease lapsed while waiting; the elector cancels or restarts us
+                await asyncio.sleep(elector.renew_every)
+                continue
+            
+            if _stopping:
+                return
+            
             # Run Job
-            await daily_billing_job()
+            global _current_run
+            _current_run = asyncio.get_running_loop().create_future()
+            try:
+                # Only a run whose jobs all succeeded counts: a failed or
+                # interrupted one is retried by this leader or the next
+                if await run_daily_jobs(next_run.date()):
+                    if elector is not None:
+                        await elector.mark_run(next_run.date())
+                else:
+                    logging.warning("Scheduled run incomplete, failed jobs will be retried")
+            finally:
+                if not _current_run.done():
+                    _current_run.set_result(None)
+                _current_run = None
             
             # Buffer to skip current minute
             await asyncio.sleep(60)
             
         except Exception as e:
             logging.error(f"Error in scheduler loop: {e}")
-            await asyncio.sleep(60) # Prevent tight loop on error 
+            await asyncio.sleep(60) # Prevent tight loop on error
+
+async def finish_current_run(timeout: float) -> bool:
+    """
+    Stop starting runs and wait up to timeout for the one in progress.
+    
+    False if it is still running; cancelling the scheduler task then
+    interrupts it.
+    """
+    global _stopping
+    _stopping = True
+    run = _current_run
+    if run is None:
+        return True
+    logging.info("Waiting for the scheduled run in progress...")
+    try:
+        await asyncio.wait_for(asyncio.shield(run), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+async def run_scheduler():
+    """Campaign for the scheduler lease; only the leader runs scheduler_loop."""
+    from bot.database.leader import get_leader_elector
+    
+    await get_leader_elector().run(scheduler_loop)
@@ -8,6 +8,16 @@ AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Optional read replica (reports, list views); see bot/database/replica.py
+replica_engine = (
+    create_async_engine(config.REPLICA_DATABASE_URL, echo=False)
+    if config.REPLICA_DATABASE_URL else None
+)
+ReplicaSessionLocal = (
+    async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    if replica_engine is not None else None
+)
+
 class Base(DeclarativeBase):
     pass
 
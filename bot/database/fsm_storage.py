@@ -0,0 +1,204 @@
+"""
+Persistent FSM storage.
+
+aiogram's MemoryStorage loses every multi-step flow (AddStayState,
+ManualPaymentState, ...) on restart and keeps abandoned ones forever. This
+storage keeps one row per user in ``fsm_states``: state plus compact JSON
+data, with an expiry refreshed on every write. Idle flows expire after
+FSM_STATE_TTL and are purged daily by the scheduler.
+
+Writes are coalesced: set_state/set_data only update a local entry, and an
+unchanged value is not written at all. Dirty entries are written in one
+short transaction by FSMFlushMiddleware once the update is done (so the
+write never waits on the update's own open transaction), or by a
+background flush shortly after. Reads are served from the local entry for
+cache_ttl seconds (FSM_CACHE_TTL): on for a single bot process, 0 when
+several processes share the table, since another one may have written the
+row meanwhile.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database import uow
+from bot.database.models import FSMRecord
+
+
+def dump_data(data: Mapping[str, Any]) -> Optional[str]:
+    """Compact, canonical JSON (equal dicts give equal strings); None for empty"""
+    if not data:
+        return None
+    return json.dumps(dict(data), ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+class _Entry:
+    __slots__ = ("state", "data", "loaded", "written", "dirty")
+
+    def __init__(self, state: Optional[str], data: Optional[str], loaded: float):
+        self.state = state
+        self.data = data
+        self.loaded = loaded
+        self.written = 0.0
+        self.dirty = False
+
+
+class DatabaseStorage(BaseStorage):
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        state_ttl: float = 86400.0,
+        cache_ttl: float = 0.0,
+        cache_size: int = 10000,
+        flush_delay: float = 1.0,
+        key_builder: Optional[KeyBuilder] = None,
+    ):
+        self.session_factory = session_factory
+        self.state_ttl = state_ttl
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.flush_delay = flush_delay
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.skipped = 0
+
+    # --- entries ---
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        name = self.key_builder.build(key)
+        entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is not None and (entry.dirty or now - entry.loaded < self.cache_ttl):
+            self._entries.move_to_end(name)
+            return entry
+
+        async with self.session_factory() as session:
+            row = (await session.execute(
+                select(FSMRecord.state, FSMRecord.data)
+                .where(FSMRecord.key == name, FSMRecord.expires_at > datetime.now(timezone.utc))
+            )).first()
+        self.reads += 1
+        fresh = _Entry(row.state if row else None, row.data if row else None, now)
+        if entry is not None and (entry.state, entry.data) == (fresh.state, fresh.data):
+            fresh.written = entry.written
+        self._entries[name] = fresh
+        self._entries.move_to_end(name)
+        self._trim()
+        return fresh
+
+    def _trim(self):
+        # Evict the oldest clean entries; dirty ones wait for their flush
+        for name in list(self._entries):
+            if len(self._entries) <= self.cache_size:
+                break
+            if not self._entries[name].dirty:
+                del self._entries[name]
+
+    def _update(self, entry: _Entry, state: Optional[str], data: Optional[str]):
+        unchanged = (state, data) == (entry.state, entry.data)
+        # Unchanged values still refresh the expiry now and then
+        if unchanged and time.monotonic() - entry.written < self.state_ttl / 4:
+            self.skipped += 1
+            return
+        entry.state, entry.data, entry.dirty = state, data, True
+        self._schedule_flush()
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        self._update(entry, state.state if isinstance(state, State) else state, entry.data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._entry(key)
+        self._update(entry, entry.state, dump_data(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = await self._entry(key)
+        return json.loads(entry.data) if entry.data else {}
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    # --- flushing ---
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"FSM storage flush failed: {e}")
+
+    async def flush(self) -> int:
+        """Write all dirty entries in one transaction; returns rows written"""
+        async with self._flush_lock:
+            dirty = [(name, entry, entry.state, entry.data) for name, entry in self._entries.items() if entry.dirty]
+            if not dirty:
+                return 0
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.state_ttl)
+            async with uow.transaction(self.session_factory) as session:
+                for name, _, state, data in dirty:
+                    if state is None and data is None:
+                        await session.execute(delete(FSMRecord).where(FSMRecord.key == name))
+                    else:
+                        await _upsert(session, name, state, data, expires_at)
+            now = time.monotonic()
+            for _, entry, state, data in dirty:
+                # A set_* that ran during the write keeps the entry dirty
+                if (entry.state, entry.data) == (state, data):
+                    entry.dirty = False
+                    entry.written = now
+            self.writes += len(dirty)
+            self._trim()
+            return len(dirty)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "cached": len(self._entries),
+            "dirty": sum(1 for e in self._entries.values() if e.dirty),
+            "reads": self.reads,
+            "writes": self.writes,
+            "skipped_writes": self.skipped,
+        }
+
+
+async def _upsert(session: AsyncSession, key: str, state: Optional[str], data: Optional[str], expires_at: datetime):
+    values = {"state": state, "data": data, "expires_at": expires_at}
+    dialect = session.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(FSMRecord).values(key=key, **values)
+        await session.execute(stmt.on_conflict_do_update(index_elements=[FSMRecord.key], set_=values))
+    else:
+        await session.merge(FSMRecord(key=key, **values))
+
+
+async def purge_expired(session: AsyncSession) -> int:
+    """Delete abandoned flows past their expiry"""
+    result = await session.execute(delete(FSMRecord).where(FSMRecord.expires_at <= datetime.now(timezone.utc)))
+    return result.rowcount or 0
@@ -0,0 +1,181 @@
+"""
+SQL instrumentation.
+
+Engine-wide cursor hooks collect, for the update currently being handled
+(contextvar set by DbSessionMiddleware): statement count, DB time and how
+often each statement *shape* repeats. At the end of the update finish()
+checks the budgets and logs N+1 suspects. Slow statements are logged for
+any caller (handlers, cron, scripts) as SQL text without bound parameters.
+Process-wide totals are kept in `totals` for the metrics endpoint.
+
+Writes not committed yet are counted per session (``session.info``), since
+COMMITs of other sessions in the same update must not reset them: a Core
+UPDATE leaves nothing in session.new/dirty, and DbSessionMiddleware only
+commits when it sees pending work.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("bot.sql")
+
+_WS_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"\((?:\s*(?:\?|%s|\$\d+|:\w+)\s*,)+\s*(?:\?|%s|\$\d+|:\w+)\s*\)")
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_FOR_UPDATE_RE = re.compile(r"\bFOR\s+(?:NO\s+KEY\s+)?UPDATE\b", re.IGNORECASE)
+
+# session.info key: writes executed in the session's open transaction
+UNCOMMITTED_WRITES = "uncommitted_writes"
+# connection.info key: info dict of the session whose transaction uses the connection
+_OWNER = "bot_session_info"
+
+
+@dataclass
+class QueryStats:
+    statements: int = 0
+    writes: int = 0                 # non-SELECT statements and SELECT ... FOR UPDATE
+    db_time: float = 0.0            # seconds spent in cursor.execute
+    shapes: Counter = field(default_factory=Counter)
+
+    def top_shape(self):
+        """(shape, count) of the most repeated statement, or (None, 0)"""
+        return self.shapes.most_common(1)[0] if self.shapes else (None, 0)
+
+
+@dataclass
+class Budget:
+    max_statements: int = 30        # per update
+    max_repeats: int = 5            # same statement shape per update
+    slow_ms: float = 200.0          # single statement
+
+
+def _budget_from_config() -> Budget:
+    from bot.config import config
+    return Budget(config.SQL_MAX_STATEMENTS_PER_UPDATE, config.SQL_MAX_REPEATED_STATEMENT, config.SQL_SLOW_QUERY_MS)
+
+
+budget = _budget_from_config()
+
+# Process-wide counters (exported by the metrics endpoint)
+totals: Dict[str, float] = {
+    "statements": 0,
+    "db_time_seconds": 0.0,
+    "slow_statements": 0,
+    "updates": 0,
+    "n_plus_one_updates": 0,
+}
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("sql_query_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """SQL with whitespace collapsed, IN-lists folded and literal numbers replaced"""
+    shape = _WS_RE.sub(" ", statement).strip()
+    shape = _IN_LIST_RE.sub("(?)", shape)
+    return _NUMBER_RE.sub("?", shape)
+
+
+def is_write_statement(statement: str) -> bool:
+    """Anything but a plain SELECT: SELECT ... FOR UPDATE takes row locks"""
+    if not statement.lstrip()[:6].upper().startswith("SELECT"):
+        return True
+    return _FOR_UPDATE_RE.search(statement) is not None
+
+
+def start(stats: QueryStats):
+    """Attach stats to the current context; returns a token for stop()"""
+    return _current.set(stats)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._bot_started = time.perf_counter()
+    is_write = is_write_statement(statement)
+    if is_write:
+        owner = conn.info.get(_OWNER)
+        if owner is not None:
+            owner[UNCOMMITTED_WRITES] = owner.get(UNCOMMITTED_WRITES, 0) + 1
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        if is_write:
+            stats.writes += 1
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_bot_started", None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+
+    totals["statements"] += 1
+    totals["db_time_seconds"] += elapsed
+
+    stats = _current.get()
+    if stats is not None:
+        stats.db_time += elapsed
+        stats.shapes[statement_shape(statement)] += 1
+
+    if elapsed * 1000 >= budget.slow_ms:
+        totals["slow_statements"] += 1
+        # statement is the compiled SQL with placeholders; parameters are never logged
+        logger.warning(f"Slow SQL {elapsed * 1000:.0f} ms: {_WS_RE.sub(' ', statement).strip()[:1000]}")
+
+
+@event.listens_for(Session, "after_begin")
+def _on_session_begin(session, transaction, connection):
+    session.info[UNCOMMITTED_WRITES] = 0
+    connection.info[_OWNER] = session.info
+
+
+@event.listens_for(Engine, "commit")
+@event.listens_for(Engine, "rollback")
+def _on_transaction_end(conn):
+    # connection.info outlives the checkout: drop the owner with its transaction
+    owner = conn.info.pop(_OWNER, None)
+    if owner is not None:
+        owner[UNCOMMITTED_WRITES] = 0
+
+
+def finish(stats: QueryStats, label: str = "") -> bool:
+    """Account an update; logs and returns True if it broke a budget (N+1 suspect)"""
+    totals["updates"] += 1
+    shape, repeats = stats.top_shape()
+    suspect = stats.statements > budget.max_statements or repeats > budget.max_repeats
+    if suspect:
+        totals["n_plus_one_updates"] += 1
+        logger.warning(
+            f"N+1 suspect {label}: {stats.statements} statements, "
+            f"{stats.db_time * 1000:.0f} ms in DB, top shape x{repeats}: {(shape or '')[:300]}"
+        )
+    return suspect
+
+
+def describe_update(update) -> str:
+    """Short label of an update for logs (callback data or command, never free text)"""
+    callback = getattr(update, "callback_query", None)
+    if callback is not None:
+        return f"callback {callback.data!r}"
+    message = getattr(update, "message", None)
+    if message is not None:
+        text = message.text or ""
+        if text.startswith("/"):
+            return f"command {text.split()[0][:32]!r}"
+        return f"message ({message.content_type})"
+    return type(update).__name__
@@ -0,0 +1,177 @@
+"""
+Leader election between bot replicas.
+
+Each replica runs a LeaderElector for a named lease (``leases`` table). The
+lease holder renews it every `renew_every` seconds; the others try to take
+it over at the same pace, which succeeds only once it has expired. So when
+the leader dies another replica takes over within `ttl + renew_every`.
+Acquire/renew is a single conditional UPDATE (or INSERT for a new lease),
+which works the same on PostgreSQL and SQLite.
+
+Only the leader runs the scheduler (see run_scheduler in bot/cron.py). If a
+leader can't renew in time (DB outage, long GC pause) its leader task is
+cancelled before anyone else can take the lease over.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.database import uow
+from bot.database.models import Lease
+
+
+@dataclass(frozen=True)
+class LeaseInfo:
+    name: str
+    holder: str
+    acquired_at: datetime
+    expires_at: datetime
+    last_run_on: Optional[date]
+
+
+class LeaderElector:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        name: str = "scheduler",
+        ttl: float = 30.0,
+        renew_every: float = 10.0,
+        holder: Optional[str] = None,
+    ):
+        self.session_factory = session_factory
+        self.name = name
+        self.ttl = ttl
+        self.renew_every = renew_every
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+        # Local deadline of our lease (monotonic), checked before acting as leader
+        self._valid_until = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def lease_valid(self) -> bool:
+        return self.is_leader and time.monotonic() < self._valid_until
+
+    async def try_acquire(self) -> bool:
+        """Take or renew the lease; True while we are the leader"""
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl)
+        try:
+            async with uow.transaction(self.session_factory) as session:
+                result = await session.execute(
+                    update(Lease)
+                    .where(Lease.name == self.name, or_(Lease.holder == self.holder, Lease.expires_at <= now))
+                    .values(
+                        holder=self.holder,
+                        expires_at=expires_at,
+                        # Keep acquired_at on renewal, reset it on takeover
+                        acquired_at=case((Lease.holder == self.holder, Lease.acquired_at), else_=now),
+                    )
+                )
+                acquired = result.rowcount == 1
+                if not acquired and await session.get(Lease, self.name) is None:
+                    session.add(Lease(name=self.name, holder=self.holder, acquired_at=now, expires_at=expires_at))
+                    await session.flush()
+                    acquired = True
+        except IntegrityError:
+            # Another replica inserted the lease first
+            acquired = False
+        except Exception as e:
+            self.last_error = str(e)
+            logging.warning(f"Lease {self.name}: acquire/renew failed: {e}")
+            acquired = False
+        else:
+            self.last_error = None
+
+        if acquired and not self.is_leader:
+            logging.info(f"Lease {self.name}: {self.holder} is now the leader")
+        elif not acquired and self.is_leader:
+            logging.warning(f"Lease {self.name}: {self.holder} lost leadership")
+        self.is_leader = acquired
+        # Measured from before the UPDATE, so our view never outlives the row's expiry
+        self._valid_until = started + self.ttl if acquired else 0.0
+        return acquired
+
+    async def release(self):
+        """Give the lease up (graceful shutdown) so a standby takes over at once"""
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        self._valid_until = 0.0
+        try:
+            async with uow.transaction(self.session_factory) as session:
+                await session.execute(
+                    update(Lease)
+                    .where(Lease.name == self.name, Lease.holder == self.holder)
+                    .values(expires_at=datetime.now(timezone.utc))
+                )
+        except Exception as e:
+            logging.warning(f"Lease {self.name}: release failed: {e}")
+
+    async def current(self) -> Optional[LeaseInfo]:
+        """Lease row as stored (diagnostics)"""
+        async with self.session_factory() as session:
+            lease = await session.scalar(select(Lease).where(Lease.name == self.name))
+        if lease is None:
+            return None
+        return LeaseInfo(lease.name, lease.holder, lease.acquired_at, lease.expires_at, lease.last_run_on)
+
+    async def mark_run(self, day: date):
+        """Record a completed daily run, so a new leader doesn't repeat or skip it"""
+        async with uow.transaction(self.session_factory) as session:
+            await session.execute(
+                update(Lease).where(Lease.name == self.name, Lease.holder == self.holder).values(last_run_on=day)
+            )
+
+    async def run(self, leader_task: Callable[["LeaderElector"], Awaitable[None]]):
+        """Campaign forever; run leader_task while leader, cancel it when the lease is lost"""
+        task: Optional[asyncio.Task] = None
+        try:
+            while True:
+                if task is not None and not self.lease_valid:
+                    # Renewal overdue: stop acting as leader before anyone can take over
+                    task.cancel()
+                    task = None
+                await self.try_acquire()
+                if self.is_leader and (task is None or task.done()):
+                    task = asyncio.create_task(leader_task(self))
+                elif not self.is_leader and task is not None:
+                    task.cancel()
+                    task = None
+                await self._sleep_until_renewal()
+        finally:
+            if task is not None:
+                task.cancel()
+            await self.release()
+
+    async def _sleep_until_renewal(self):
+        deadline = time.monotonic() + self.renew_every
+        # A leader whose lease runs out before the next renewal steps down early
+        while time.monotonic() < deadline:
+            if self.is_leader and not self.lease_valid:
+                return
+            await asyncio.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+
+
+_elector: Optional[LeaderElector] = None
+
+
+def get_leader_elector() -> LeaderElector:
+    """Process-wide elector for the scheduler lease"""
+    global _elector
+    if _elector is None:
+        from bot.config import config
+        from bot.database.core import AsyncSessionLocal
+        _elector = LeaderElector(AsyncSessionLocal, "scheduler", ttl=config.LEADER_LEASE_TTL, renew_every=config.LEADER_RENEW_INTERVAL)
+    return _elector
@@ -319,6 +319,11 @@ class PaymentReceipt(Base):
     parsed_purpose: Mapped[Optional[str]] = mapped_column(String)
     parsed_raw_json: Mapped[Optional[dict]] = mapped_column(JSON)
     
+    # Perceptual hash (pHash, 16 hex chars) for near-duplicate detection
+    image_phash: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    # sha256 of the original file in receipt storage (None = not stored / purged)
+    blob_sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    
     decision: Mapped[ReceiptDecision] = mapped_column(SAEnum(ReceiptDecision, name="receiptdecision"))
     reject_reason: Mapped[Optional[str]] = mapped_column(String)
     
@@ -564,3 +569,33 @@ class AdminContact(Base):
     display_order: Mapped[int] = mapped_column(Integer, default=0)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
+
+
+# 3.18 FSMRecord (persistent aiogram FSM state, see bot/database/fsm_storage.py)
+class FSMRecord(Base):
+    __tablename__ = "fsm_states"
+    
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)  # fsm:<chat_id>:<user_id>
+    state: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    data: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # compact JSON
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
+# 3.19 Lease (leader election between bot replicas, see bot/database/leader.py)
+class Lease(Base):
+    __tablename__ = "leases"
+    
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)  # e.g. "scheduler"
+    holder: Mapped[str] = mapped_column(String(255), nullable=False)  # host:pid:token
+    acquired_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_run_on: Mapped[Optional[date]] = mapped_column(Date, nullable=True)  # last completed daily run
+
+
+# 3.20 ProcessedUpdate (update_id dedup across replicas, see bot/database/update_log.py)
+class ProcessedUpdate(Base):
+    __tablename__ = "processed_updates"
+    
+    bot_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,109 @@
+"""
+Read-replica routing.
+
+Handlers registered with ``flags={"replica": True}`` get a read-only session
+on the replica (see ReplicaRoutingMiddleware). The replica is used only
+while its replication lag is below REPLICA_MAX_LAG_SECONDS; otherwise, or
+if it can't be reached, reads go to the primary.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import Session
+
+READ_ONLY_KEY = "read_only"
+
+# 0 on a primary or a caught-up standby, otherwise seconds since last replayed transaction
+_PG_LAG_SQL = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+
+class ReadOnlySessionError(RuntimeError):
+    """Write attempted through a replica session"""
+
+
+@event.listens_for(Session, "before_flush")
+def _forbid_writes(session: Session, flush_context, instances):
+    if session.info.get(READ_ONLY_KEY) and (session.new or session.dirty or session.deleted):
+        raise ReadOnlySessionError("Replica session is read-only; remove the replica flag from this handler")
+
+
+class ReplicaRouter:
+    """Decides per update whether the replica is usable; lag is cached for check_interval"""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        session_factory: async_sessionmaker,
+        max_lag: float = 10.0,
+        check_interval: float = 5.0,
+    ):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Optional[float] = None        # None = unknown / unreachable
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self.routed = 0
+        self.fallbacks = 0
+
+    async def measure_lag(self) -> float:
+        async with self.engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                return float((await conn.execute(_PG_LAG_SQL)).scalar() or 0)
+            # No replication info (e.g. SQLite copy in dev): reachable = in sync
+            await conn.execute(text("SELECT 1"))
+            return 0.0
+
+    async def _refresh(self):
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return
+            try:
+                self.lag = await self.measure_lag()
+            except Exception as e:
+                if self.lag is not None:
+                    logging.warning(f"Replica unavailable, reading from primary: {e}")
+                self.lag = None
+            self._checked_at = time.monotonic()
+
+    async def available(self) -> bool:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            await self._refresh()
+        ok = self.lag is not None and self.lag <= self.max_lag
+        if ok:
+            self.routed += 1
+        else:
+            self.fallbacks += 1
+        return ok
+
+
+_router: Optional[ReplicaRouter] = None
+
+
+def get_replica_router() -> Optional[ReplicaRouter]:
+    """Global router, None if REPLICA_DATABASE_URL is not set"""
+    global _router
+    if _router is None:
+        from bot.config import config
+        from bot.database.core import ReplicaSessionLocal, replica_engine
+
+        if replica_engine is None:
+            return None
+        _router = ReplicaRouter(
+            replica_engine,
+            ReplicaSessionLocal,
+            max_lag=config.REPLICA_MAX_LAG_SECONDS,
+            check_interval=config.REPLICA_CHECK_INTERVAL,
+        )
+    return _router
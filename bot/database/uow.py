@@ -0,0 +1,92 @@
+"""
+Unit of work: services flush(), the session owner commits once.
+
+Owners are DbSessionMiddleware (one commit per update), cron jobs and
+scripts (transaction()). With the guard on, a commit() from anywhere else
+raises StrayCommitError, which is how tests catch services that commit.
+"""
+import logging
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+_GUARD_KEY = "uow.forbid_commit"
+_CALLBACKS_KEY = "uow.on_commit"
+
+
+class StrayCommitError(RuntimeError):
+    """commit() called inside a unit of work by someone other than its owner"""
+
+
+@event.listens_for(Session, "before_commit")
+def _check_guard(session: Session):
+    if session.info.get(_GUARD_KEY):
+        raise StrayCommitError(
+            "session.commit() inside a unit of work: services must flush() and let the caller commit"
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(session: Session):
+    for callback in session.info.pop(_CALLBACKS_KEY, ()):
+        try:
+            callback()
+        except Exception as e:
+            logging.error(f"on_commit callback failed: {e}", exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_commit(session: Session):
+    session.info.pop(_CALLBACKS_KEY, None)
+
+
+def guard(session: AsyncSession):
+    """Make any further session.commit() raise StrayCommitError (until commit() below)"""
+    session.info[_GUARD_KEY] = True
+
+
+@contextmanager
+def forbid_commit(session: AsyncSession) -> Iterator[AsyncSession]:
+    """Guard for a block of code (tests: `with forbid_commit(session): await service(...)`)"""
+    previous = session.info.get(_GUARD_KEY, False)
+    session.info[_GUARD_KEY] = True
+    try:
+        yield session
+    finally:
+        session.info[_GUARD_KEY] = previous
+
+
+async def commit(session: AsyncSession):
+    """The owner's commit: allowed even while guarded"""
+    guarded = session.info.pop(_GUARD_KEY, False)
+    try:
+        await session.commit()
+    finally:
+        if guarded:
+            session.info[_GUARD_KEY] = True
+
+
+def on_commit(session: AsyncSession, callback: Callable[[], None]):
+    """Run callback after the unit of work commits (dropped on rollback)"""
+    session.info.setdefault(_CALLBACKS_KEY, []).append(callback)
+
+
+@asynccontextmanager
+async def transaction(session_factory: async_sessionmaker = None, strict: bool = False) -> AsyncIterator[AsyncSession]:
+    """Session for jobs/scripts: commits once on success, rolls back on error"""
+    if session_factory is None:
+        from bot.database.core import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+
+    async with session_factory() as session:
+        if strict:
+            guard(session)
+        try:
+            yield session
+            await commit(session)
+        except BaseException:
+            await session.rollback()
+            raise
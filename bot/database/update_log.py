@@ -0,0 +1,51 @@
+"""
+Table of recently handled update_ids (``processed_updates``).
+
+Backs UpdateDedupMiddleware with UPDATE_DEDUP_STORE=db: claiming an update
+is one INSERT that only the first replica wins, made before the update is
+handled; a failed update deletes its row again. Rows older than UPDATE_DEDUP_TTL are purged daily by the scheduler; Telegram
+gives up redelivering long before that.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database import uow
+from bot.database.models import ProcessedUpdate
+
+
+async def claim_update(session_factory: async_sessionmaker, bot_id: int, update_id: int) -> bool:
+    """Claim the update before handling it; False if another process already did"""
+    values = {"bot_id": bot_id, "update_id": update_id, "seen_at": datetime.now(timezone.utc)}
+    try:
+        async with uow.transaction(session_factory) as session:
+            dialect = session.bind.dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                if dialect == "postgresql":
+                    from sqlalchemy.dialects.postgresql import insert
+                else:
+                    from sqlalchemy.dialects.sqlite import insert
+                result = await session.execute(insert(ProcessedUpdate).values(**values).on_conflict_do_nothing())
+                return result.rowcount == 1
+            session.add(ProcessedUpdate(**values))
+            await session.flush()
+            return True
+    except IntegrityError:
+        return False
+
+
+async def release_update(session_factory: async_sessionmaker, bot_id: int, update_id: int):
+    """Drop a claim whose handling failed, so a redelivery is handled again"""
+    async with uow.transaction(session_factory) as session:
+        await session.execute(
+            delete(ProcessedUpdate).where(ProcessedUpdate.bot_id == bot_id, ProcessedUpdate.update_id == update_id)
+        )
+
+
+async def purge_processed(session: AsyncSession, ttl: float) -> int:
+    """Forget update_ids handled more than ttl seconds ago"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl)
+    result = await session.execute(delete(ProcessedUpdate).where(ProcessedUpdate.seen_at < cutoff))
+    return result.rowcount or 0
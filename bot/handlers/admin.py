@@ -2,7 +2,7 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Filter, Command
 from aiogram.fsm.context import FSMContext
-from bot.config import config
+from bot.services.role_registry import role_registry
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.services.stay_service import create_object, get_all_objects, create_stay
 from bot.services.tenant_service import get_tenant_by_tg_id
@@ -18,7 +18,7 @@ class AdminFilter(Filter):
         # Works for both Message and CallbackQuery
         if hasattr(event, 'from_user'):
             user_id = event.from_user.id
-            return user_id in config.ADMIN_IDS or user_id in config.OWNER_IDS
+            return role_registry.is_admin(user_id)
         return False
 
 router = Router()
@@ -527,7 +527,7 @@ async def back_to_menu(call: CallbackQuery):
 
 # --- Reply Keyboard Handlers ---
 
-@router.message(F.text.contains("Адреса"))
+@router.message(F.text.contains("Адреса"), flags={"replica": True})
 async def list_objects_msg(message: Message, session: AsyncSession):
     from bot.utils.ui import UIEmojis, UIMessages
     from bot.database.models import RentalObject, TenantStay, StayStatus, RentCharge, ChargeStatus
@@ -546,24 +546,31 @@ async def list_objects_msg(message: Message, session: AsyncSession):
     result = await session.execute(stmt)
     objects = result.scalars().all()
     
-    # Check payment status for each object - collect all data INSIDE session
+    active_stays = {
+        obj.id: next((s for s in obj.stays if s.status == StayStatus.active.value), None)
+        for obj in objects
+    }
+    
+    # Stays with unpaid charges - one query for all objects
+    active_ids = [s.id for s in active_stays.values() if s]
+    debtor_ids = set()
+    if active_ids:
+        debt_stmt = select(RentCharge.stay_id).where(
+            RentCharge.stay_id.in_(active_ids),
+            RentCharge.status == ChargeStatus.pending.value
+        ).distinct()
+        debtor_ids = set((await session.execute(debt_stmt)).scalars().all())
+    
+    # Collect all data INSIDE session
     object_data = []
     for obj in objects:
-        active_stay = next((s for s in obj.stays if s.status == StayStatus.active.value), None)
+        active_stay = active_stays[obj.id]
         
         if not active_stay:
             status_icon = "➖"  # No tenant
             tenant_name = ""
         else:
-            # Check for unpaid charges
-            debt_stmt = select(func.count(RentCharge.id)).where(
-                RentCharge.stay_id == active_stay.id,
-                RentCharge.status == ChargeStatus.pending.value
-            )
-            debt_result = await session.execute(debt_stmt)
-            has_debt = debt_result.scalar() > 0
-            
-            status_icon = "🔴" if has_debt else "🟢"
+            status_icon = "🔴" if active_stay.id in debtor_ids else "🟢"
             tenant_name = f" ({active_stay.tenant.full_name})" if active_stay.tenant else ""
         
         # Store simple values, not ORM objects
@@ -782,10 +789,46 @@ async def list_payments_msg(message: Message, session: AsyncSession):
             [
                 InlineKeyboardButton(text=f"{UIEmojis.SUCCESS} Подтвердить", callback_data=f"pay_ok_{p.id}"),
                 InlineKeyboardButton(text=f"{UIEmojis.CANCEL} Отклонить", callback_data=f"pay_bad_{p.id}")
-            ]
+            ],
+            [InlineKeyboardButton(text="🧾 Показать чек", callback_data=f"pay_receipt_{p.id}")]
         ])
         await message.answer(msg_text, reply_markup=kb)
 
+
+@router.callback_query(F.data.startswith("pay_receipt_"))
+async def show_payment_receipt(call: CallbackQuery, session: AsyncSession):
+    """Send receipt preview from local storage (Telegram file_id as fallback)"""
+    from aiogram.types import BufferedInputFile
+    from bot.database.models import PaymentReceipt
+    from bot.services.receipt_storage import file_extension, get_receipt_storage
+    
+    payment_id = int(call.data.split("_")[-1])
+    result = await session.execute(select(PaymentReceipt).where(PaymentReceipt.payment_id == payment_id))
+    receipt = result.scalar_one_or_none()
+    if not receipt:
+        await call.answer("Чек не найден", show_alert=True)
+        return
+    
+    caption = f"🧾 Чек к платежу #{payment_id}"
+    storage = get_receipt_storage()
+    if storage and receipt.blob_sha256:
+        preview = await storage.preview(receipt.blob_sha256)
+        if preview:
+            await call.message.answer_photo(BufferedInputFile(preview, f"receipt_{receipt.id}.webp"), caption=caption)
+            await call.answer()
+            return
+        original = await storage.original(receipt.blob_sha256)
+        if original:
+            await call.message.answer_document(BufferedInputFile(original, f"receipt_{receipt.id}{file_extension(original)}"), caption=caption)
+            await call.answer()
+            return
+    
+    if receipt.file_type == "document":
+        await call.message.answer_document(receipt.file_id, caption=caption)
+    else:
+        await call.message.answer_photo(receipt.file_id, caption=caption)
+    await call.answer()
+
 @router.callback_query(F.data.startswith("obj_manage_"))
 async def manage_object(call: CallbackQuery, session: AsyncSession):
     from bot.utils.ui import UIEmojis, UIMessages, format_date, format_amount
@@ -1079,6 +1122,9 @@ async def tenant_name_submitted(message: Message, state: FSMContext, session: As
         .where(Tenant.id == tenant_id)
         .values(full_name=new_name)
     )
+    # Bulk UPDATE bypasses the ORM flush listener
+    from bot.services.identity_cache import invalidate_tenant
+    invalidate_tenant(session, tenant_id=tenant_id)
     # Middleware commits
     
     await state.clear()
@@ -1123,16 +1169,19 @@ async def reports_menu_callback(call: CallbackQuery):
     await call.answer()
 
 
-@router.callback_query(F.data == "report_debtors")
+@router.callback_query(F.data == "report_debtors", flags={"replica": True})
 async def report_debtors(call: CallbackQuery, session: AsyncSession):
     from bot.utils.ui import UIMessages, format_amount
     from bot.database.models import RentCharge, ChargeStatus, TenantStay, Tenant, RentalObject
     from sqlalchemy import select
     from sqlalchemy.orm import selectinload
     
+    # Only the 10 oldest debts are shown; don't load the rest
     stmt = (
         select(RentCharge)
         .where(RentCharge.status == ChargeStatus.pending.value)
+        .order_by(RentCharge.month, RentCharge.id)
+        .limit(10)
         .options(
             selectinload(RentCharge.stay)
             .selectinload(TenantStay.tenant),
@@ -1146,7 +1195,7 @@ async def report_debtors(call: CallbackQuery, session: AsyncSession):
     # Collect data INSIDE session
     debtors_data = []
     total = 0
-    for c in charges[:10]:
+    for c in charges:
         tenant_name = c.stay.tenant.full_name if c.stay and c.stay.tenant else "?"
         address = c.stay.rental_object.address if c.stay and c.stay.rental_object else "?"
         amount = float(c.amount)
@@ -1302,7 +1351,7 @@ async def create_admin_invite_link(call: CallbackQuery, session: AsyncSession):
     import secrets
     
     # Only owners can add admins
-    if call.from_user.id not in config.OWNER_IDS:
+    if not role_registry.is_owner(call.from_user.id):
         await call.answer("Только владельцы могут добавлять админов", show_alert=True)
         return
     
@@ -1341,7 +1390,7 @@ async def invite_admin_forward(call: CallbackQuery, state: FSMContext):
     from bot.states import InviteAdminState
     
     # Only owners can add admins
-    if call.from_user.id not in config.OWNER_IDS:
+    if not role_registry.is_owner(call.from_user.id):
         await call.answer("Только владельцы могут добавлять админов", show_alert=True)
         return
     
@@ -1393,7 +1442,7 @@ async def process_admin_invite_contact(message: Message, state: FSMContext, sess
     session.add(new_admin)
     await session.flush()  # Flush to ensure the record exists before reload
     
-    # Reload admin cache to update runtime config
+    # Reload role registry so the new admin is seen everywhere
     from bot.services.user_service import reload_admin_cache
     await reload_admin_cache(session)
     
@@ -1435,7 +1484,7 @@ async def manage_admins_menu(call: CallbackQuery, session: AsyncSession):
     
     user_id = call.from_user.id
     
-    if user_id not in config.OWNER_IDS:
+    if not role_registry.is_owner(user_id):
         await call.answer("Только владелец может управлять админами", show_alert=True)
         return
     
@@ -1466,7 +1515,7 @@ async def admin_add_menu(call: CallbackQuery):
     from bot.utils.ui import UIMessages
     
     user_id = call.from_user.id
-    if user_id not in config.OWNER_IDS:
+    if not role_registry.is_owner(user_id):
         await call.answer("Только владелец может добавлять админов", show_alert=True)
         return
     
@@ -1491,7 +1540,7 @@ async def admin_add_menu(call: CallbackQuery):
 async def admin_add_by_id_start(call: CallbackQuery, state: FSMContext):
     """Start adding admin by ID"""
     user_id = call.from_user.id
-    if user_id not in config.OWNER_IDS:
+    if not role_registry.is_owner(user_id):
         await call.answer("Только владелец может добавлять админов", show_alert=True)
         return
     
@@ -1508,7 +1557,7 @@ async def admin_add_by_id_start(call: CallbackQuery, state: FSMContext):
 async def admin_add_by_forward_start(call: CallbackQuery, state: FSMContext):
     """Start adding admin by forwarding message (existing handler will process)"""
     user_id = call.from_user.id
-    if user_id not in config.OWNER_IDS:
+    if not role_registry.is_owner(user_id):
         await call.answer("Только владелец может добавлять админов", show_alert=True)
         return
     
@@ -1528,7 +1577,7 @@ async def admin_add_by_invite_start(call: CallbackQuery, session: AsyncSession):
     from bot.utils.ui import UIMessages
     
     user_id = call.from_user.id
-    if user_id not in config.OWNER_IDS:
+    if not role_registry.is_owner(user_id):
         await call.answer("Только владелец может добавлять админов", show_alert=True)
         return
     
@@ -1560,7 +1609,7 @@ async def admin_view_detail(call: CallbackQuery, session: AsyncSession):
     from bot.utils.ui import UIEmojis, UIMessages, format_date
     
     user_id = call.from_user.id
-    if user_id not in config.OWNER_IDS:
+    if not role_registry.is_owner(user_id):
         await call.answer("Только владелец может просматривать админов", show_alert=True)
         return
     
@@ -1599,7 +1648,7 @@ async def admin_deactivate_confirm(call: CallbackQuery, session: AsyncSession):
     from bot.utils.ui import UIMessages
     
     user_id = call.from_user.id
-    if user_id not in config.OWNER_IDS:
+    if not role_registry.is_owner(user_id):
         await call.answer("Только владелец может деактивировать админов", show_alert=True)
         return
     
@@ -1609,7 +1658,7 @@ async def admin_deactivate_confirm(call: CallbackQuery, session: AsyncSession):
     success = await deactivate_admin(session, admin_tg_id)
     
     if success:
-        # Reload admin cache to update runtime config
+        # Reload role registry so the change is seen everywhere
         await reload_admin_cache(session)
         
         # Notify the deactivated admin
@@ -1757,7 +1806,7 @@ async def process_uk_inn(message: Message, state: FSMContext, session: AsyncSess
     
     uk = UKCompany(name=name, inn=inn)
     session.add(uk)
-    await session.commit()
+    await session.flush()
     
     await message.answer(UIMessages.success(f"УК <b>{name}</b> добавлена!"),
                          reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -2554,7 +2603,7 @@ async def list_payments_callback(call: CallbackQuery):
     await call.answer()
 
 
-@router.callback_query(F.data == "report_monthly")
+@router.callback_query(F.data == "report_monthly", flags={"replica": True})
 async def report_monthly(call: CallbackQuery, session: AsyncSession):
     from bot.utils.ui import UIMessages, format_amount
     from bot.database.models import Payment, PaymentStatus
@@ -2579,7 +2628,7 @@ async def report_monthly(call: CallbackQuery, session: AsyncSession):
     await call.answer()
 
 
-@router.callback_query(F.data == "report_objects")
+@router.callback_query(F.data == "report_objects", flags={"replica": True})
 async def report_objects(call: CallbackQuery, session: AsyncSession):
     from bot.utils.ui import UIMessages, format_amount
     from bot.database.models import RentalObject, ObjectStatus, TenantStay, StayStatus, RentCharge, ChargeStatus
@@ -2715,7 +2764,7 @@ async def stay_tax_submitted(message: Message, state: FSMContext, session: Async
     await message.answer(text, reply_markup=kb)
 
 
-@router.callback_query(F.data.startswith("obj_stats_"))
+@router.callback_query(F.data.startswith("obj_stats_"), flags={"replica": True})
 async def show_obj_stats(call: CallbackQuery, session: AsyncSession):
     from bot.services.analytics_service import get_object_stats
     from datetime import date
@@ -2940,7 +2989,7 @@ async def process_receipt_amount(
         payment.confirmed_at = datetime.now()
         payment.confirmed_by = message.from_user.id
         
-        await session.commit()
+        await session.flush()
         
         # Allocate payment
         await allocate_payment(session, payment_id)
@@ -3031,7 +3080,7 @@ async def process_reject_reason(
     payment.meta_json['rejected_by'] = message.from_user.id
     payment.meta_json['rejected_at'] = datetime.now().isoformat()
     
-    await session.commit()
+    await session.flush()
     
     # Notify tenant
     stay = payment.stay
@@ -3051,3 +3100,40 @@ async def process_reject_reason(
     # Confirm to admin
     await message.answer(UIMessages.success(f"Чек #{payment_id} отклонён"))
     await state.clear()
+
+
+# --- Diagnostics ---
+@router.message(Command("diag"))
+async def cmd_diag(message: Message):
+    """Scheduler leader and lease state (Owner only)"""
+    import html
+    from bot.utils.ui import UIMessages
+    from bot.database.leader import get_leader_elector
+    
+    if not role_registry.is_owner(message.from_user.id):
+        return
+    
+    elector = get_leader_elector()
+    text = UIMessages.header("Диагностика", "🩺")
+    text += UIMessages.section("Планировщик")
+    text += UIMessages.field("Этот процесс", elector.holder)
+    text += UIMessages.field("Лидер", "да" if elector.is_leader else "нет")
+    if elector.last_error:
+        text += UIMessages.field("Ошибка аренды", html.escape(elector.last_error[:200]))
+    
+    try:
+        lease = await elector.current()
+    except Exception as e:
+        logging.error(f"Failed to read scheduler lease: {e}")
+        lease = None
+    if lease is None:
+        text += "\n" + UIMessages.info_box("Аренда лидера ещё не создана")
+    else:
+        expires_at = lease.expires_at if lease.expires_at.tzinfo else lease.expires_at.replace(tzinfo=timezone.utc)
+        left = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        text += UIMessages.field("Текущий лидер", lease.holder)
+        text += UIMessages.field("Лидер с", lease.acquired_at.strftime("%d.%m.%Y %H:%M:%S UTC"))
+        text += UIMessages.field("Аренда истекает", f"{expires_at:%H:%M:%S} UTC ({left:.0f} с)" if left > 0 else "истекла")
+        text += UIMessages.field("Последний запуск", lease.last_run_on.strftime("%d.%m.%Y") if lease.last_run_on else "—")
+    
+    await message.answer(text, parse_mode="HTML")
@@ -3,6 +3,7 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from bot.services.tenant_service import set_tenant_consent
+from bot.services.role_registry import role_registry
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.states import GuestState
 
@@ -11,7 +12,6 @@ router = Router()
 @router.message(CommandStart())
 async def cmd_start(message: Message, state: FSMContext, session: AsyncSession, tenant=None):
     from bot.utils.ui import UIEmojis, UIMessages, UIKeyboards
-    from bot.config import config
     from bot.services.invite_service import redeem_invite
     
     user_id = message.from_user.id
@@ -59,13 +59,13 @@ async def cmd_start(message: Message, state: FSMContext, session: AsyncSession,
             await message.answer(UIMessages.error(msg), parse_mode="HTML")
             # Fallthrough to normal check
             
-    is_owner = user_id in config.OWNER_IDS
-    is_admin = user_id in config.ADMIN_IDS or is_owner
+    is_owner = role_registry.is_owner(user_id)
+    is_admin = role_registry.is_admin(user_id)
     
     # DEBUG: Log values
     import logging
     logging.info(f"cmd_start: user_id={user_id}, is_owner={is_owner}, is_admin={is_admin}, tenant={tenant}")
-    logging.info(f"config.OWNER_IDS={config.OWNER_IDS}, config.ADMIN_IDS={config.ADMIN_IDS}")
+    logging.info(f"roles: owners={sorted(role_registry.owner_ids)}, admins={sorted(role_registry.admin_ids)}")
     
     # Admin/Owner WITHOUT tenant record - show admin menu directly
     if is_admin and not tenant:
@@ -123,10 +123,9 @@ async def cmd_id(message: Message):
 async def cmd_tenant_mode(message: Message, state: FSMContext):
     """Switch to tenant mode (admins only - for testing UI)"""
     from bot.utils.ui import UIKeyboards, UIMessages
-    from bot.config import config
     
     user_id = message.from_user.id
-    is_admin = user_id in config.ADMIN_IDS or user_id in config.OWNER_IDS
+    is_admin = role_registry.is_admin(user_id)
     
     if not is_admin:
         await message.answer(
@@ -142,11 +141,10 @@ async def cmd_tenant_mode(message: Message, state: FSMContext):
 async def cmd_admin_mode(message: Message, state: FSMContext):
     """Switch to admin mode (admins only)"""
     from bot.utils.ui import UIKeyboards, UIMessages
-    from bot.config import config
     
     user_id = message.from_user.id
-    is_owner = user_id in config.OWNER_IDS
-    is_admin = user_id in config.ADMIN_IDS or is_owner
+    is_owner = role_registry.is_owner(user_id)
+    is_admin = role_registry.is_admin(user_id)
     
     if not is_admin:
         await message.answer(
@@ -161,12 +159,11 @@ async def cmd_admin_mode(message: Message, state: FSMContext):
 @router.message(F.text == "❔ Помощь")
 @router.message(Command("help"))
 async def cmd_help(message: Message, state: FSMContext):
-    from bot.config import config
     from bot.utils.ui import UIMessages, UIEmojis
     
     user_id = message.from_user.id
-    is_admin = user_id in config.ADMIN_IDS
-    is_owner = user_id in config.OWNER_IDS
+    is_admin = role_registry.is_admin(user_id)
+    is_owner = role_registry.is_owner(user_id)
     
     # Check current mode from state
     data = await state.get_data()
@@ -266,7 +263,8 @@ def _build_admin_help(is_owner: bool) -> str:
         text += "• Список всех администраторов\n"
         text += "• Добавление админов (по ID, пересылка, invite)\n"
         text += "• Просмотр информации об админах\n"
-        text += "• Деактивация админов\n\n"
+        text += "• Деактивация админов\n"
+        text += "• <code>/diag</code> — Диагностика (лидер планировщика)\n\n"
     
     text += UIMessages.section("🔑 Полезные команды")
     text += "<code>/admin</code> — Панель администратора\n"
@@ -314,11 +312,10 @@ async def switch_to_tenant_mode(call: CallbackQuery, state: FSMContext):
 async def switch_to_admin_mode(call: CallbackQuery, state: FSMContext):
     """Switch back to admin mode (admins only)"""
     from bot.utils.ui import UIKeyboards, UIMessages
-    from bot.config import config
     
     user_id = call.from_user.id
-    is_owner = user_id in config.OWNER_IDS
-    is_admin = user_id in config.ADMIN_IDS or is_owner
+    is_owner = role_registry.is_owner(user_id)
+    is_admin = role_registry.is_admin(user_id)
     
     # Security check: only admins can switch to admin mode
     if not is_admin:
@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.database.models import Role, StayStatus
 from bot.services.support_service import create_support_message
+from bot.services.role_registry import role_registry
 from bot.services.notification_service import notification_service
 from bot.handlers.admin import AdminFilter
 
@@ -23,7 +24,6 @@ async def tenant_message_start(message: Message, state: FSMContext, tenant):
 
 @router.message(SupportState.waiting_for_message)
 async def tenant_message_process(message: Message, state: FSMContext, tenant, session: AsyncSession):
-    from bot.config import config
     
     # Skip if tenant is None (owners/admins)
     if not tenant:
@@ -71,7 +71,7 @@ async def tenant_message_process(message: Message, state: FSMContext, tenant, se
     await create_support_message(session, stay.id, Role.tenant, msg_text)
     
     # Notify Admins
-    targets = set(config.OWNER_IDS + config.ADMIN_IDS)
+    targets = role_registry.admin_ids
     for admin_id in targets:
         try:
             if temp_file_id:
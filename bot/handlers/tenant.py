@@ -6,6 +6,7 @@ from bot.states import ReceiptState, SupportState
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.services.billing_service import parse_receipt, validate_receipt_logic, create_payment_from_receipt
 from bot.services.tenant_service import get_or_create_tenant
+from bot.services.role_registry import role_registry
 from bot.services.stay_service import create_stay # Only for admin, but maybe we need read access
 from bot.database.models import TenantStay, StayStatus, ReceiptDecision, PaymentType
 from sqlalchemy import select
@@ -230,19 +231,60 @@ async def _process_receipt_impl(message: Message, tenant, file_id: str, state: F
     # 2-3. Download and Parse
     try:
         parsed = None
+        phash = None
+        blob_sha256 = None
+        file_type = "document" if is_pdf else "photo"
         
-        if is_pdf:
-            # Skip download/OCR for PDF
-            parsed = ParsedReceipt(text="", amount=None, parsed_date=None, confidence=0.0)
+        from bot.services.receipt_storage import get_receipt_storage
+        storage = get_receipt_storage()
+        
+        if isinstance(message, CallbackQuery):
+            bot_instance = message.bot
         else:
-            if isinstance(message, CallbackQuery):
-                bot_instance = message.bot
-            else:
-                bot_instance = message.bot
-                
+            bot_instance = message.bot
+        
+        file_bytes = None
+        if not is_pdf or storage:
             file_info = await bot_instance.get_file(file_id)
             downloaded = await bot_instance.download_file(file_info.file_path)
             file_bytes = downloaded.read()
+        
+        # Keep the original locally so review/reprocessing doesn't hit Telegram again
+        if storage and file_bytes:
+            try:
+                blob_sha256 = (await storage.save(file_bytes)).sha256
+            except Exception as e:
+                import logging
+                logging.warning(f"Failed to store receipt file: {e}")
+        
+        if is_pdf:
+            # Skip OCR for PDF
+            parsed = ParsedReceipt(text="", amount=None, parsed_date=None, confidence=0.0)
+        else:
+            # Near-duplicate check BEFORE OCR (re-photographed receipt / repeated screenshot)
+            import asyncio
+            from bot.services.receipt_hash_service import compute_phash, find_recent_duplicate, phash_to_hex, receipt_hash_index
+            phash = await asyncio.to_thread(compute_phash, file_bytes)
+            duplicate = await find_recent_duplicate(session, stay.id, phash) if phash is not None else None
+            
+            if duplicate:
+                distance, original = duplicate
+                await create_payment_from_receipt(
+                    session=session,
+                    stay_id=stay.id,
+                    file_id=file_id,
+                    parsed=ParsedReceipt(text="", amount=None, parsed_date=None, confidence=0.0),
+                    decision=ReceiptDecision.rejected,
+                    pay_type=None,
+                    reject_reason=f"Дубликат чека #{original.receipt_id} (расстояние {distance})",
+                    image_phash=phash_to_hex(phash),
+                    blob_sha256=blob_sha256,
+                    file_type=file_type
+                )
+                text = UIMessages.header("Этот чек уже загружен", UIEmojis.WARNING)
+                text += UIMessages.info_box("Похоже, это повторное фото чека, который уже принят. Если это новый платёж, отправьте другой чек или обратитесь к администратору.")
+                await message.answer(text)
+                return
             
             parsed = await parse_receipt(file_bytes)
         
@@ -258,9 +300,18 @@ async def _process_receipt_impl(message: Message, tenant, file_id: str, state: F
             parsed=parsed,
             decision=decision,
             pay_type=pay_type,
-            reject_reason=reason
+            reject_reason=reason,
+            image_phash=phash_to_hex(phash) if phash is not None else None,
+            blob_sha256=blob_sha256,
+            file_type=file_type
         )
         
+        if phash is not None:
+            # Index only once the receipt row is committed
+            from bot.database.uow import on_commit
+            accepted = decision == ReceiptDecision.accepted
+            on_commit(session, lambda: receipt_hash_index.add(stay.id, receipt.id, phash, accepted=accepted))
+        
         # 6. Response
         if decision == ReceiptDecision.accepted:
             if amount > 0:
@@ -511,12 +562,11 @@ async def toggle_service_callback(call: CallbackQuery, tenant, session: AsyncSes
 @router.message(F.text.contains("Настройки"))
 async def settings_menu(message: Message, tenant, session: AsyncSession, state: FSMContext):
     from bot.utils.ui import UIEmojis, UIMessages
-    from bot.config import config
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
     user_id = message.from_user.id
-    is_owner = user_id in config.OWNER_IDS
-    is_admin = user_id in config.ADMIN_IDS or is_owner
+    is_owner = role_registry.is_owner(user_id)
+    is_admin = role_registry.is_admin(user_id)
     
     # Check testing mode
     data = await state.get_data()
@@ -672,9 +722,9 @@ async def my_object_menu(message: Message, tenant, session: AsyncSession):
 
 # --- Charges shortcut ---
 @router.message(F.text.contains("Начисления"))
-async def charges_menu(message: Message, tenant):
+async def charges_menu(message: Message, tenant, session: AsyncSession):
     # Redirect to my_charges_msg
-    await my_charges_msg(message, tenant)
+    await my_charges_msg(message, tenant, session)
 
 
 # --- Reminder Settings Callbacks ---
@@ -1,6 +1,9 @@
+from bot.startup import startup_timer  # first: its clock covers the imports below
+
 import asyncio
 import logging
 import sys
+from typing import Optional, Tuple
 
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
@@ -10,46 +13,146 @@ from bot.config import config
 from bot.handlers import common, admin, tenant, support #, admin_rso
 from bot.middlewares.consent import ConsentMiddleware
 
+from bot.services.cache_backend import CacheBackend
 from bot.services.notification_service import setup_notifications
-from bot.cron import scheduler_loop
+from bot.cron import run_scheduler
 
+startup_timer.mark("imports")
 
 
-async def main():
-    # Configure logging
+def setup_logging():
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
         stream=sys.stdout,
     )
 
-    bot = Bot(
+
+def create_bot() -> Bot:
+    return Bot(
         token=config.BOT_TOKEN, 
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher()
+
+
+def _update_dedup_middleware(shared_backend: Optional[CacheBackend]):
+    from bot.middlewares.dedup import UpdateDedupMiddleware, cache_claim_store, database_claim_store
+
+    mode = config.UPDATE_DEDUP_STORE
+    if mode == "auto":
+        mode = "cache" if shared_backend else "memory"
+
+    store = None
+    if mode == "cache" and shared_backend:
+        store = cache_claim_store(shared_backend, config.UPDATE_DEDUP_TTL)
+    elif mode == "db":
+        from bot.database.core import AsyncSessionLocal
+        store = database_claim_store(AsyncSessionLocal)
+    return UpdateDedupMiddleware(config.UPDATE_DEDUP_WINDOW, store)
+
+
+async def setup_dispatcher(bot: Bot) -> Tuple[Dispatcher, CacheBackend]:
+    """Dispatcher with middlewares, routers and roles loaded (polling and webhook)"""
+    # Sentry tracing (no-op without SENTRY_DSN); per process, so after the webhook fork
+    from bot.tracing import init_tracing
+    tracing_enabled = init_tracing()
+
+    # Shared state across replicas when CACHE_BACKEND_URL is set
+    from bot.services.cache_backend import get_cache_backend
+    cache_backend = get_cache_backend()
+    shared_backend = cache_backend if cache_backend.shared else None
+
+    # FSM storage: Redis when shared, else the database (survives restarts)
+    storage = None  # aiogram default: in-process MemoryStorage
+    if shared_backend:
+        from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+        storage = RedisStorage(
+            shared_backend.client,
+            key_builder=DefaultKeyBuilder(prefix=config.CACHE_BACKEND_PREFIX + "fsm"),
+            state_ttl=int(config.FSM_STATE_TTL),
+            data_ttl=int(config.FSM_STATE_TTL),
+        )
+        logging.info("Shared cache backend enabled (rate limits, FSM, invalidation)")
+    elif config.FSM_STORAGE == "db":
+        from bot.database.core import AsyncSessionLocal
+        from bot.database.fsm_storage import DatabaseStorage
+        storage = DatabaseStorage(AsyncSessionLocal, state_ttl=config.FSM_STATE_TTL, cache_ttl=config.FSM_CACHE_TTL)
+
+    # One update at a time per user (aiogram holds this lock around the FSM state and handler)
+    from bot.middlewares.concurrency import ConcurrencyMiddleware, UserEventIsolation
+    if shared_backend:
+        from aiogram.fsm.storage.redis import RedisEventIsolation
+        isolation = RedisEventIsolation(
+            shared_backend.client,
+            key_builder=DefaultKeyBuilder(prefix=config.CACHE_BACKEND_PREFIX + "fsm"),
+        )
+    else:
+        isolation = UserEventIsolation()
+    dp = Dispatcher(storage=storage, events_isolation=isolation)
+
+    # Outermost: in-flight updates are drained on shutdown before aiogram closes the FSM
+    from bot.shutdown import GracefulShutdown
+    shutdown = GracefulShutdown(config.SHUTDOWN_TIMEOUT)
+    shutdown.install(dp)
     
     # Setup Services
     setup_notifications(bot)
 
     # Middleware registration
     # Order: Outer -> Inner
+    # 0. In-flight tracking (graceful shutdown, above)
     # 1. Error Handler (wraps everything)
-    # 2. Rate Limiting (prevents spam)
-    # 3. DB Session (provides session)
-    # 4. Consent (uses session)
+    # 2. Redelivered updates (update_id dedup)
+    # 3. Concurrency cap + duplicate callbacks (inside the per-user lock)
+    # 4. Rate Limiting (prevents spam)
+    # 5. DB Session (provides session)
+    # 6. Consent (uses session)
     from bot.middlewares.db import DbSessionMiddleware
     from bot.middlewares.consent import ConsentMiddleware
     from bot.middlewares.error import GlobalErrorMiddleware
     from bot.middlewares.rate_limit import RateLimitMiddleware, FileUploadRateLimiter
     
-    # Order matters: Error -> RateLimit -> DB -> Consent
+    from bot.middlewares.metrics import HandlerMetricsMiddleware, TelegramErrorMetrics, UpdateMetricsMiddleware
+    
+    # Order matters: Error -> Metrics -> Dedup -> Concurrency -> RateLimit -> DB -> Consent
+    dedup = _update_dedup_middleware(shared_backend)
+    concurrency = ConcurrencyMiddleware(config.UPDATE_CONCURRENCY, config.CALLBACK_DEDUP_WINDOW)
+    rate_limit = None
+    if config.RATE_LIMIT_UPDATES > 0:
+        rate_limit = RateLimitMiddleware(config.RATE_LIMIT_UPDATES, config.RATE_LIMIT_WINDOW, backend=shared_backend)
+    upload_limit = FileUploadRateLimiter(rate=3, per=60, backend=shared_backend)  # 3 files/min
+    if tracing_enabled:
+        # Outermost: the update's root span also covers error handling
+        from bot.middlewares.tracing import TracingMiddleware, TracingRequestMiddleware
+        dp.update.outer_middleware(TracingMiddleware())
+        dp.message.middleware(TracingMiddleware())
+        dp.callback_query.middleware(TracingMiddleware())
+        bot.session.middleware(TracingRequestMiddleware())
     dp.update.outer_middleware(GlobalErrorMiddleware())
-    dp.update.middleware(RateLimitMiddleware(rate=10, per=60))  # 10 req/min
-    dp.message.middleware(FileUploadRateLimiter(rate=3, per=60))  # 3 files/min
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(dedup)
+    dp.update.outer_middleware(concurrency)
+    if config.FSM_STORAGE == "db" and not shared_backend:
+        # Around the DB session: FSM changes are written after the update's commit
+        from bot.middlewares.fsm import FSMFlushMiddleware
+        dp.update.outer_middleware(FSMFlushMiddleware(storage))
+    if rate_limit is not None:
+        dp.update.middleware(rate_limit)
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    dp.message.middleware(upload_limit)
     dp.update.middleware(DbSessionMiddleware())
     dp.update.middleware(ConsentMiddleware())
 
+    # Read replica for handlers flagged {"replica": True} (event level: needs handler flags)
+    from bot.database.replica import get_replica_router
+    replica_router = get_replica_router()
+    if replica_router:
+        from bot.middlewares.replica import ReplicaRoutingMiddleware
+        dp.message.middleware(ReplicaRoutingMiddleware(replica_router))
+        dp.callback_query.middleware(ReplicaRoutingMiddleware(replica_router))
+        logging.info("Read replica enabled for report/list handlers")
+
     # Router registration - ORDER MATTERS!
     # Admin first - AdminFilter passes admins to admin handlers
     # Non-admins skip admin router and go to common/tenant
@@ -59,27 +162,79 @@ async def main():
     dp.include_router(tenant.router)
     dp.include_router(support.router)
 
-    # Load admins from DB
-    from bot.database.core import AsyncSessionLocal
-    from bot.services.user_service import reload_admin_cache
-    
-    try:
-        async with AsyncSessionLocal() as session:
-            count = await reload_admin_cache(session)
-            logging.info(f"Loaded {count} admins from DB.")
-    except Exception as e:
-        logging.error(f"Failed to load admins from DB: {e}")
+    startup_timer.mark("dispatcher")
+
+    # Admins from DB, OCR provider probe, DB pool and feature modules, concurrently
+    from bot.startup import warm_up
+    await warm_up()
+    startup_timer.mark("warm_up")
+
+    # Admin changes and tenant identity invalidations made by other replicas
+    if shared_backend:
+        from bot.services.identity_cache import subscribe_invalidations
+        from bot.services.user_service import subscribe_role_reloads
+        await subscribe_role_reloads(shared_backend)
+        await subscribe_invalidations(shared_backend)
+
+    # Runtime stats for /metrics (read on scrape)
+    from bot import metrics
+    from bot.services.identity_cache import identity_cache
+    bot.session.middleware(TelegramErrorMetrics())
+    metrics.watch_database()
+    metrics.registry.watch("updates", concurrency.get_stats)
+    metrics.registry.watch("update_dedup", dedup.get_stats)
+    if rate_limit is not None:
+        metrics.registry.watch("rate_limit", rate_limit.get_stats)
+    metrics.registry.watch("upload_limit", upload_limit.get_stats)
+    metrics.registry.watch("shutdown", shutdown.in_flight.get_stats)
+    metrics.registry.watch("identity_cache", lambda: {"hits": identity_cache.hits, "misses": identity_cache.misses})
+    if isinstance(isolation, UserEventIsolation):
+        metrics.registry.watch("user_queues", isolation.get_stats)
+    if hasattr(storage, "get_stats"):
+        metrics.registry.watch("fsm", storage.get_stats)
+
+    return dp, cache_backend
+
 
-    # Start Scheduler
-    asyncio.create_task(scheduler_loop())
+async def main():
+    # Configure logging
+    setup_logging()
+
+    bot = create_bot()
+    dp, cache_backend = await setup_dispatcher(bot)
+    shutdown = dp["graceful_shutdown"]
+
+    # Start Scheduler (runs only while this process holds the leader lease)
+    shutdown.scheduler = asyncio.create_task(run_scheduler())
+
+    metrics_runner = None
+    if config.METRICS_PORT:
+        from bot.metrics import start_metrics_server
+        metrics_runner = await start_metrics_server(config.METRICS_HOST, config.METRICS_PORT)
+
+    startup_timer.mark("services")
+    logging.info(startup_timer.summary())
+    logging.info("Starting bot (polling)...")
+    try:
+        # SIGTERM/SIGINT stop polling; dp shutdown then drains (bot/shutdown.py)
+        await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await shutdown.close(bot, cache_backend, confirm_offset=True)
 
-    logging.info("Starting bot...")
-    await dp.start_polling(bot)
 
 if __name__ == "__main__":
     try:
         if sys.platform == "win32":
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-        asyncio.run(main())
+        else:
+            from bot.startup import install_uvloop
+            install_uvloop()  # inherited by forked webhook workers
+        if config.BOT_MODE == "webhook":
+            from bot.webhook import run_webhook
+            run_webhook()
+        else:
+            asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         logging.info("Bot stopped.")
@@ -0,0 +1,226 @@
+"""
+Prometheus metrics.
+
+A small registry rendered in the Prometheus text format at ``/metrics``:
+by a separate aiohttp server on METRICS_PORT in polling mode, and on the
+webhook app itself in webhook mode, where each worker reports its own
+process and every sample carries a ``worker`` label (sum over it in queries).
+
+Recording is a dict lookup and a few additions on the event loop thread,
+with no locks and no I/O. Values that already live elsewhere (DB pool,
+SQL totals, get_stats() of middlewares and storages) are read only when
+/metrics is scraped, via gauge callbacks and watch().
+"""
+import logging
+import math
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+PREFIX = "rentbot_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OCR_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+JOB_BUCKETS = (1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    """Set explicitly, or read from callback() (a number or {label values: number}) on scrape"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), callback: Optional[Callable[[], Any]] = None):
+        super().__init__(name, help, labels)
+        self.callback = callback
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def samples(self) -> Iterable[str]:
+        if self.callback is not None:
+            value = self.callback()
+            self.values = dict(value) if isinstance(value, Mapping) else {(): value}
+        return super().samples()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self.values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+def _with_labels(sample: str, extra: str) -> str:
+    series, value = sample.rsplit(" ", 1)
+    if series.endswith("}"):
+        return f"{series[:-1]},{extra}}} {value}"
+    return f"{series}{{{extra}}} {value}"
+
+
+class Registry:
+    def __init__(self, prefix: str = PREFIX):
+        self.prefix = prefix
+        self.metrics: Dict[str, Any] = {}
+        self._watched: Dict[str, Callable[[], Mapping[str, Any]]] = {}
+        # Added to every sample, e.g. {"worker": "0"} in a webhook worker
+        self.const_labels: Dict[str, str] = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self.prefix + name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), callback: Optional[Callable[[], Any]] = None) -> Gauge:
+        return self._add(Gauge(self.prefix + name, help, labels, callback))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help, labels, buckets))
+
+    def watch(self, component: str, get_stats: Callable[[], Mapping[str, Any]]):
+        """Export the numeric values of get_stats() as gauges {prefix}{component}_{key}"""
+        self._watched[component] = get_stats
+
+    def render(self) -> str:
+        extra = _labels(self.const_labels.keys(), self.const_labels.values())[1:-1]
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                logging.warning(f"Metric {metric.name} failed: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if extra:
+                samples = [_with_labels(sample, extra) for sample in samples]
+            lines.extend(samples)
+        for component, get_stats in self._watched.items():
+            try:
+                stats = _flatten(get_stats())
+            except Exception as e:
+                logging.warning(f"Stats of {component} failed: {e}")
+                continue
+            for key, value in stats:
+                name = f"{self.prefix}{component}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                series = f"{name}{{{extra}}}" if extra else name
+                lines.append(f"{series} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(stats: Mapping[str, Any], prefix: str = "") -> List[Tuple[str, float]]:
+    flat = []
+    for key, value in stats.items():
+        if isinstance(value, Mapping):
+            flat.extend(_flatten(value, f"{prefix}{key}_"))
+        elif isinstance(value, (int, float)):  # bools too
+            flat.append((f"{prefix}{key}", value))
+    return flat
+
+
+registry = Registry()
+
+updates_total = registry.counter("updates_total", "Updates received", ["type"])
+handler_duration = registry.histogram("handler_duration_seconds", "Handler run time", ["router", "handler"])
+handler_errors = registry.counter("handler_errors_total", "Handlers that raised", ["router", "handler", "error"])
+ocr_duration = registry.histogram("ocr_duration_seconds", "OCR provider call time", ["provider"], OCR_BUCKETS)
+ocr_failures = registry.counter("ocr_failures_total", "OCR provider calls that raised", ["provider"])
+ocr_in_flight = registry.gauge("ocr_in_flight", "OCR recognitions running or waiting for a worker thread")
+ocr_in_flight.set(0)
+telegram_errors = registry.counter("telegram_api_errors_total", "Failed Bot API requests", ["method", "error"])
+job_duration = registry.histogram("scheduler_job_duration_seconds", "Scheduled job run time", ["job"], JOB_BUCKETS)
+
+
+def _pool_stats(engine) -> Dict[str, float]:
+    pool = engine.sync_engine.pool
+    stats = {}
+    for key, method in (("size", "size"), ("checked_out", "checkedout"), ("overflow", "overflow"), ("idle", "checkedin")):
+        if hasattr(pool, method):
+            stats[key] = getattr(pool, method)()
+    return stats
+
+
+def watch_database():
+    """DB pool gauges and SQL instrumentation totals"""
+    from bot.database import instrumentation
+    from bot.database.core import engine, replica_engine
+
+    registry.watch("db_pool", lambda: _pool_stats(engine))
+    if replica_engine is not None:
+        registry.watch("db_replica_pool", lambda: _pool_stats(replica_engine))
+    registry.watch("sql", lambda: instrumentation.totals)
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve /metrics next to the poller; returns the runner for cleanup()"""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Metrics on http://{host}:{port}/metrics")
+    return runner
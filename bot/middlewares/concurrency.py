@@ -0,0 +1,209 @@
+"""
+Update scheduling: per-user serialization, a global cap and callback dedup.
+
+Polling and webhook mode both run updates as concurrent tasks, so a
+double-tapped ``pay_ok_`` or two quick receipt photos from one user race on
+FSM state and allocate_payment, and a flood from many users checks out more
+DB connections than the pool has.
+
+* UserEventIsolation is the dispatcher's ``events_isolation``: aiogram holds
+  its per-user lock around loading FSM state and running the handler, so one
+  user's updates run one at a time, in arrival order. Unlike aiogram's
+  SimpleEventIsolation it drops locks nobody holds or waits for.
+* ConcurrencyMiddleware caps in-flight handlers across all users. When the
+  cap is reached, payment actions go first, then other callback queries,
+  then plain messages.
+* A callback pressed again (same user, message and data) within
+  CALLBACK_DEDUP_WINDOW seconds of the first press finishing is answered and
+  dropped, so it never reaches the handler.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+# Priorities (lower runs first)
+PRIORITY_PAYMENT = 0
+PRIORITY_CALLBACK = 1
+PRIORITY_MESSAGE = 2
+
+PAYMENT_CALLBACK_PREFIXES = (
+    "pay_ok_", "pay_bad_", "pay_receipt_", "mark_paid_", "manual_payment_",
+    "cancel_payment:", "approve_receipt:", "reject_receipt:", "confirm_type_receipt",
+)
+PAYMENT_STATE_GROUPS = (
+    "ReceiptState:", "ManualPaymentState:", "CancelPaymentState:", "ApproveReceiptState:", "RejectReceiptState:",
+)
+
+
+class UserEventIsolation(BaseEventIsolation):
+    """In-process per-key locks, removed once nobody holds or waits for them"""
+
+    def __init__(self):
+        # key -> [lock, holders + waiters]
+        self._locks: Dict[Hashable, List[Any]] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        slot = self._locks.get(key)
+        if slot is None:
+            slot = self._locks[key] = [asyncio.Lock(), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            # close() may have cleared the locks while a handler outlived the drain
+            if slot[1] == 0 and self._locks.get(key) is slot:
+                del self._locks[key]
+
+    async def close(self) -> None:
+        self._locks.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._locks),
+            "queued": sum(max(0, users - 1) for _, users in self._locks.values()),
+        }
+
+
+class PrioritySlots:
+    """Counting semaphore that hands free slots to the lowest priority value first"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self.max_waiting = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: int = PRIORITY_MESSAGE):
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, waiter)
+        self.max_waiting = max(self.max_waiting, len(self._waiters))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+            else:
+                # The slot was handed to us just as we were cancelled
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():  # skip waiters cancelled but not yet removed
+                future.set_result(None)  # the slot passes straight on
+                return
+        self.in_use -= 1
+
+
+def update_priority(update: Update, raw_state: Optional[str] = None) -> int:
+    if update.callback_query is not None:
+        if (update.callback_query.data or "").startswith(PAYMENT_CALLBACK_PREFIXES):
+            return PRIORITY_PAYMENT
+        return PRIORITY_CALLBACK
+    if raw_state and raw_state.startswith(PAYMENT_STATE_GROUPS):
+        return PRIORITY_PAYMENT
+    return PRIORITY_MESSAGE
+
+
+class ConcurrencyMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: caps in-flight updates and drops repeated callbacks.
+
+    Registered after aiogram's FSM middleware, i.e. inside the per-user lock
+    of UserEventIsolation: a user waiting for their own previous update does
+    not take a slot.
+    """
+
+    def __init__(self, limit: int = 10, dedup_window: float = 2.0):
+        super().__init__()
+        self.slots = PrioritySlots(limit)
+        self.dedup_window = dedup_window
+        self._running: Set[Tuple[int, int, str]] = set()
+        # Finished callback key -> finish time, oldest first
+        self._recent: "OrderedDict[Tuple[int, int, str], float]" = OrderedDict()
+        self.duplicates = 0
+        self.processed = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        dedup_key = self._callback_key(event.callback_query)
+        if dedup_key is not None:
+            if self._is_duplicate(dedup_key):
+                self.duplicates += 1
+                try:
+                    await event.callback_query.answer()
+                except Exception as e:
+                    logging.debug(f"Failed to answer duplicate callback: {e}")
+                return None
+            self._running.add(dedup_key)
+
+        try:
+            await self.slots.acquire(update_priority(event, data.get("raw_state")))
+            try:
+                return await handler(event, data)
+            finally:
+                self.slots.release()
+                self.processed += 1
+        finally:
+            if dedup_key is not None:
+                self._running.discard(dedup_key)
+                self._recent.pop(dedup_key, None)
+                self._recent[dedup_key] = time.monotonic()
+
+    @staticmethod
+    def _callback_key(call: Optional[CallbackQuery]) -> Optional[Tuple[int, int, str]]:
+        if call is None or call.message is None or not call.data:
+            return None
+        return (call.from_user.id, call.message.message_id, call.data)
+
+    def _is_duplicate(self, key: Tuple[int, int, str]) -> bool:
+        if key in self._running:
+            return True
+        now = time.monotonic()
+        while self._recent:
+            oldest, finished = next(iter(self._recent.items()))
+            if now - finished < self.dedup_window:
+                break
+            del self._recent[oldest]
+        return key in self._recent
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.slots.limit,
+            "in_flight": self.slots.in_use,
+            "waiting": self.slots.waiting,
+            "max_waiting": self.slots.max_waiting,
+            "processed": self.processed,
+            "duplicate_callbacks": self.duplicates,
+        }
@@ -2,8 +2,8 @@ from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, Update
 from sqlalchemy.ext.asyncio import AsyncSession
-from bot.services.tenant_service import get_tenant_by_tg_id
-from bot.database.models import Tenant
+from bot.services.identity_cache import resolve_tenant
+from bot.services.role_registry import role_registry
 
 class ConsentMiddleware(BaseMiddleware):
     async def __call__(
@@ -19,8 +19,7 @@ class ConsentMiddleware(BaseMiddleware):
             return await handler(event, data)
         
         # Skip consent check for owners and admins
-        from bot.config import config
-        if user.id in config.OWNER_IDS or user.id in config.ADMIN_IDS:
+        if role_registry.is_admin(user.id):
             data["tenant"] = None  # Inject None so handlers don't crash
             return await handler(event, data)
         
@@ -30,9 +29,10 @@ class ConsentMiddleware(BaseMiddleware):
             # Fallback (should not happen if configured correctly)
             return await handler(event, data)
             
-        # Inspect tenant status
+        # Inspect tenant status (cached snapshot; handlers needing the ORM
+        # object call `await tenant.load(session)`)
         try:
-            tenant = await get_tenant_by_tg_id(session, user.id)
+            tenant = await resolve_tenant(session, user.id)
             data["tenant"] = tenant # Inject tenant into handler
             
             # If tenant exists, check consent
@@ -1,27 +1,116 @@
-from typing import Callable, Dict, Any, Awaitable
+from typing import Callable, Dict, Any, Awaitable, Optional
+from dataclasses import dataclass
 import logging
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from bot.database.core import AsyncSessionLocal
+from bot.database import instrumentation, uow
+from bot.database.instrumentation import QueryStats
+
+
+@dataclass
+class SessionStats(QueryStats):
+    """Per-update DB usage (statement counters come from instrumentation hooks)"""
+    used: bool = False          # session was actually created
+    committed: bool = False
+
+
+class LazySession:
+    """
+    AsyncSession stand-in that creates the real session on first use.
+    Updates that never touch the DB (help screens, FSM steps, ignored
+    callbacks) don't check out a connection or send COMMIT.
+    """
+    __slots__ = ("_factory", "_session", "_strict", "_info", "stats")
+
+    def __init__(
+        self,
+        factory: async_sessionmaker,
+        stats: SessionStats,
+        strict: bool = False,
+        info: Optional[Dict[str, Any]] = None
+    ):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+        self._strict = strict
+        self._info = info
+        self.stats = stats
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+            if self._info:
+                self._session.info.update(self._info)
+            if self._strict:
+                uow.guard(self._session)
+            self.stats.used = True
+        return self._session
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get(), name)
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def has_changes(self) -> bool:
+        """Pending ORM changes or writes executed in this session's open transaction"""
+        s = self._session
+        if s is None:
+            return False
+        if s.new or s.dirty or s.deleted:
+            return True
+        return s.in_transaction() and s.info.get(instrumentation.UNCOMMITTED_WRITES, 0) > 0
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
 
 class DbSessionMiddleware(BaseMiddleware):
+    def __init__(self, session_factory: async_sessionmaker = AsyncSessionLocal, strict: Optional[bool] = None):
+        from bot.config import config
+        self.session_factory = session_factory
+        # strict: handlers/services calling session.commit() raise StrayCommitError
+        self.strict = config.DB_STRICT_UOW if strict is None else strict
+        # Cumulative counters (for logs/metrics)
+        self.totals = {"updates": 0, "sessions": 0, "commits": 0, "statements": 0}
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        async with AsyncSessionLocal() as session:
-            data["session"] = session
-            try:
-                result = await handler(event, data)
-                # Auto-commit if no exception occurred
-                # Warning: If handler returns explicitly but logic failed logic-wise, we still commit.
-                # Business logic must raise exceptions to trigger rollback.
-                await session.commit()
-                return result
-            except Exception as e:
+        stats = SessionStats()
+        session = LazySession(self.session_factory, stats, self.strict)
+        data["session"] = session
+        data["db_stats"] = stats
+        token = instrumentation.start(stats)
+        try:
+            result = await handler(event, data)
+            # Unit of work: services only flush, this is the single commit of the update.
+            # Warning: If handler returns explicitly but logic failed logic-wise, we still commit.
+            # Business logic must raise exceptions to trigger rollback.
+            if session.has_changes():
+                await uow.commit(session)
+                stats.committed = True
+            return result
+        except Exception as e:
+            if session.started:
                 await session.rollback()
-                logging.error(f"Database error in handler: {e}", exc_info=True)
-                raise
+            logging.error(f"Database error in handler: {e}", exc_info=True)
+            raise
+        finally:
+            await session.close()
+            instrumentation.stop(token)
+            instrumentation.finish(stats, instrumentation.describe_update(event))
+            self.totals["updates"] += 1
+            self.totals["sessions"] += stats.used
+            self.totals["commits"] += stats.committed
+            self.totals["statements"] += stats.statements
+            logging.debug(
+                f"DB: session={'yes' if stats.used else 'no'} statements={stats.statements} "
+                f"db_time={stats.db_time * 1000:.1f}ms committed={stats.committed}"
+            )
@@ -0,0 +1,143 @@
+"""
+Skip updates that were already handled.
+
+Telegram redelivers an update when a webhook response is lost or a poller
+restarts before confirming its offset, and approve_payment,
+execute_mark_paid or manual_payment_amount would then record a payment
+twice. UpdateDedupMiddleware claims each update_id before any handler (and
+before DbSessionMiddleware) runs; a repeat is dropped without touching the
+database, also while the first delivery is still running.
+
+Handling is at most once: a handler that raises, or is cancelled by a
+shutdown, releases its claim so a redelivery runs again (its transaction
+was rolled back), but a process killed outright keeps the claim and that
+update is not retried.
+
+A bounded in-memory window per bot catches repeats within one process. With
+several replicas the claim also goes to a shared store: the cache backend
+when CACHE_BACKEND_URL is set, or the ``processed_updates`` table with
+UPDATE_DEDUP_STORE=db.
+"""
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from bot.services.cache_backend import CacheBackend
+
+class ClaimStore(ABC):
+    """update_ids claimed by any replica"""
+
+    @abstractmethod
+    async def claim(self, bot_id: int, update_id: int) -> bool:
+        """True if this process is the first to claim the update"""
+        pass
+
+    @abstractmethod
+    async def release(self, bot_id: int, update_id: int):
+        """Forget a claim whose handling failed"""
+        pass
+
+
+class _CacheClaimStore(ClaimStore):
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def claim(self, bot_id: int, update_id: int) -> bool:
+        return await self.backend.incr(f"upd:{bot_id}:{update_id}", 1, self.ttl) == 1
+
+    async def release(self, bot_id: int, update_id: int):
+        await self.backend.delete(f"upd:{bot_id}:{update_id}")
+
+
+class _DatabaseClaimStore(ClaimStore):
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    async def claim(self, bot_id: int, update_id: int) -> bool:
+        from bot.database.update_log import claim_update
+        return await claim_update(self.session_factory, bot_id, update_id)
+
+    async def release(self, bot_id: int, update_id: int):
+        from bot.database.update_log import release_update
+        await release_update(self.session_factory, bot_id, update_id)
+
+
+def cache_claim_store(backend: CacheBackend, ttl: float) -> ClaimStore:
+    return _CacheClaimStore(backend, ttl)
+
+
+def database_claim_store(session_factory) -> ClaimStore:
+    return _DatabaseClaimStore(session_factory)
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    def __init__(self, window: int = 10000, store: Optional[ClaimStore] = None):
+        super().__init__()
+        self.window = window
+        self.store = store
+        # (bot_id, update_id) of recent updates, oldest first
+        self._seen: "OrderedDict[Tuple[int, int], None]" = OrderedDict()
+        self.duplicates = 0
+        self.store_errors = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        bot = data.get("bot")
+        key = (bot.id if bot is not None else 0, event.update_id)
+        if key in self._seen:
+            self.duplicates += 1
+            logging.info(f"Skipping redelivered update {event.update_id}")
+            return None
+        self._seen[key] = None
+        if len(self._seen) > self.window:
+            self._seen.popitem(last=False)
+
+        claimed = False
+        if self.store is not None:
+            try:
+                claimed = await self.store.claim(*key)
+            except Exception as e:
+                # Fail open: a missed duplicate beats a dropped update
+                self.store_errors += 1
+                logging.warning(f"Update dedup store failed, handling update {event.update_id}: {e}")
+            else:
+                if not claimed:
+                    self.duplicates += 1
+                    logging.info(f"Skipping update {event.update_id} already handled by another replica")
+                    return None
+
+        try:
+            return await handler(event, data)
+        except BaseException:
+            # Failed or cut off by a shutdown: a redelivery may handle it again
+            await self._release(key, claimed)
+            raise
+
+    async def _release(self, key: Tuple[int, int], claimed: bool):
+        self._seen.pop(key, None)
+        if not claimed:
+            return
+        try:
+            await self.store.release(*key)
+        except Exception as e:
+            self.store_errors += 1
+            logging.warning(f"Update dedup store failed, update {key[1]} stays claimed: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "window": len(self._seen),
+            "duplicates": self.duplicates,
+            "store_errors": self.store_errors,
+        }
@@ -0,0 +1,35 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.database.fsm_storage import DatabaseStorage
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """
+    Writes the FSM changes of an update in one go once it is handled.
+
+    Registered as an outer update middleware, i.e. around DbSessionMiddleware,
+    so the write happens after the update's own transaction has finished.
+    """
+
+    def __init__(self, storage: DatabaseStorage):
+        super().__init__()
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            try:
+                await self.storage.flush()
+            except Exception as e:
+                # The background flush retries the entries that are still dirty
+                logging.error(f"FSM flush failed: {e}")
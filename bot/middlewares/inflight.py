@@ -0,0 +1,69 @@
+"""
+In-flight update tracking for graceful shutdown.
+
+InFlightMiddleware is the outermost update middleware, ahead of aiogram's
+own (an update waiting for its user's lock counts too): every update the
+dispatcher is handling, up to the last Bot API call of its handler (OCR
+included), is in flight until it returns. drain() waits for them, so a
+stopping process does not cut a payment approval or a receipt recognition
+in half.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+
+class InFlightMiddleware(BaseMiddleware):
+    def __init__(self):
+        super().__init__()
+        # One future per running update (-> its update_id), resolved when it returns
+        self._pending: Dict[asyncio.Future, Optional[int]] = {}
+        self.handled = 0
+        # Highest update_id handled
+        self.last_update_id: Optional[int] = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        done = asyncio.get_running_loop().create_future()
+        self._pending[done] = event.update_id if isinstance(event, Update) else None
+        try:
+            return await handler(event, data)
+        finally:
+            del self._pending[done]
+            done.set_result(None)
+            self.handled += 1
+            if isinstance(event, Update) and (self.last_update_id is None or event.update_id > self.last_update_id):
+                self.last_update_id = event.update_id
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait for running updates (and any started meanwhile); False on timeout"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # Update tasks created just before the stop have not reached us yet
+        await asyncio.sleep(0)
+        while self._pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.wait(set(self._pending), timeout=remaining)
+        return True
+
+    def confirmable_offset(self) -> Optional[int]:
+        """Polling offset that skips only finished updates: the lowest unfinished id, else last + 1"""
+        unfinished = [update_id for update_id in self._pending.values() if update_id is not None]
+        if unfinished:
+            return min(unfinished)
+        return self.last_update_id + 1 if self.last_update_id is not None else None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"in_flight": self.in_flight, "handled": self.handled}
@@ -2,49 +2,224 @@
 Rate Limiting Middleware
 
 Prevents spam and abuse by limiting requests per user.
+
+Each policy is a two-bucket sliding-window counter: per key only the hits
+of the current and the previous fixed window are kept, and the previous
+one is weighted by how much of it still overlaps the sliding window. A key
+costs one small __slots__ record regardless of traffic, and keys idle for
+two windows (whose counters are zero anyway) are evicted periodically.
+
+With a shared CacheBackend (several replicas) the same two counters live in
+the backend as TTL'd keys, so a user's limit is not multiplied by the
+number of replicas.
 """
 import logging
-from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Callable, Dict, Any, Awaitable, List
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Awaitable, Hashable, Optional
 
 from aiogram import BaseMiddleware
-from aiogram.types import Message, CallbackQuery, TelegramObject
+from aiogram.types import Message, CallbackQuery, TelegramObject, Update
+from bot.services.cache_backend import CacheBackend
+from bot.services.role_registry import role_registry
+
+
+@dataclass(frozen=True, slots=True)
+class RatePolicy:
+    """`rate` cost units per `per` seconds"""
+    name: str
+    rate: float
+    per: float
+
+
+# Default routes: any update, any file upload, photos sent to OCR
+GENERAL_POLICY = RatePolicy("general", rate=10, per=60)
+UPLOAD_POLICY = RatePolicy("upload", rate=3, per=60)
+OCR_POLICY = RatePolicy("ocr", rate=20, per=3600)
+
+
+class _Window:
+    __slots__ = ("index", "current", "previous", "seen")
+
+    def __init__(self, index: int, seen: float):
+        self.index = index
+        self.current = 0.0
+        self.previous = 0.0
+        self.seen = seen
+
+
+class SlidingWindowLimiter:
+    """Per-key limiter for one policy, with bounded memory"""
+
+    def __init__(self, policy: RatePolicy, max_keys: int = 100_000):
+        self.policy = policy
+        self.max_keys = max_keys
+        # Ordered by last hit: idle keys are always at the front
+        self._windows: Dict[Hashable, _Window] = {}
+        self._next_sweep = 0.0
+        self.evicted = 0
+
+    def _roll(self, window: _Window, index: int):
+        if index != window.index:
+            window.previous = window.current if index == window.index + 1 else 0.0
+            window.current = 0.0
+            window.index = index
+
+    def _estimate(self, window: _Window, now: float) -> float:
+        position = now / self.policy.per
+        self._roll(window, int(position))
+        return window.previous * (1.0 - (position - window.index)) + window.current
+
+    def hit(self, key: Hashable, cost: float = 1.0, now: Optional[float] = None) -> bool:
+        """Count a request of `cost`; False (and not counted) if over the limit"""
+        now = time.monotonic() if now is None else now
+        if now >= self._next_sweep:
+            self.evict_idle(now)
+
+        window = self._windows.pop(key, None)
+        if window is None:
+            window = _Window(int(now / self.policy.per), now)
+        allowed = self._estimate(window, now) + cost <= self.policy.rate
+        if allowed:
+            window.current += cost
+        window.seen = now
+        self._windows[key] = window
+
+        if len(self._windows) > self.max_keys:
+            del self._windows[next(iter(self._windows))]
+            self.evicted += 1
+        return allowed
+
+    async def allow(self, key: Hashable, cost: int = 1) -> bool:
+        return self.hit(key, cost)
+
+    def usage(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Cost counted for key in the sliding window ending now"""
+        window = self._windows.get(key)
+        if window is None:
+            return 0.0
+        return self._estimate(window, time.monotonic() if now is None else now)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop keys with no hits for two windows"""
+        now = time.monotonic() if now is None else now
+        idle_before = now - 2 * self.policy.per
+        evicted = 0
+        while self._windows:
+            key = next(iter(self._windows))
+            if self._windows[key].seen > idle_before:
+                break
+            del self._windows[key]
+            evicted += 1
+        self.evicted += evicted
+        self._next_sweep = now + self.policy.per
+        return evicted
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by tracked keys (dict + records + int keys)"""
+        record = sys.getsizeof(_Window(0, 0.0)) + 4 * sys.getsizeof(0.0)
+        return sys.getsizeof(self._windows) + len(self._windows) * (record + sys.getsizeof(2 ** 40))
+
+    def get_stats(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.monotonic() if now is None else now
+        self.evict_idle(now)
+        usage = [self._estimate(w, now) for w in self._windows.values()]
+        return {
+            "policy": self.policy.name,
+            "rate_limit": f"{self.policy.rate:g}/{self.policy.per:g}s",
+            "tracked_keys": len(self._windows),
+            "active_users": sum(1 for u in usage if u > 0),
+            "total_requests": round(sum(usage), 1),
+            "evicted": self.evicted,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+
+class SharedWindowLimiter:
+    """Two-bucket counter kept in a CacheBackend; replicas share the limit"""
+
+    def __init__(self, policy: RatePolicy, backend: CacheBackend):
+        self.policy = policy
+        self.backend = backend
+
+    async def allow(self, key: Hashable, cost: int = 1, now: Optional[float] = None) -> bool:
+        # Wall clock: window boundaries must line up across hosts
+        position = (time.time() if now is None else now) / self.policy.per
+        index = int(position)
+        prefix = f"rl:{self.policy.name}:{key}:"
+        current = await self.backend.incr(f"{prefix}{index}", cost, ttl=2 * self.policy.per)
+        previous = int(await self.backend.get(f"{prefix}{index - 1}") or 0)
+        if previous * (1.0 - (position - index)) + current <= self.policy.rate:
+            return True
+        # Denied requests don't count
+        await self.backend.incr(f"{prefix}{index}", -cost)
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy.name,
+            "rate_limit": f"{self.policy.rate:g}/{self.policy.per:g}s",
+            "backend": type(self.backend).__name__,
+        }
+
+
+def _limiter(policy: RatePolicy, backend: Optional[CacheBackend]):
+    if backend is not None:
+        return SharedWindowLimiter(policy, backend)
+    return SlidingWindowLimiter(policy)
+
+
+def _reply_target(event: TelegramObject) -> TelegramObject:
+    """Message/CallbackQuery to answer, also when registered at update level"""
+    if isinstance(event, Update):
+        return event.event
+    return event
+
+
+def _user_id(event: TelegramObject, data: Dict[str, Any]) -> Optional[int]:
+    user = data.get("event_from_user")
+    if user is None:
+        user = getattr(_reply_target(event), "from_user", None)
+    return user.id if user else None
 
 
 class RateLimitMiddleware(BaseMiddleware):
     """
     Rate limiting middleware to prevent spam and abuse.
-    
-    Limits number of requests per user in a time window.
+
+    Limits number of requests per user in a time window. At update level it
+    counts every tap, message and FSM step, so the bot registers it only
+    when RATE_LIMIT_UPDATES is set.
     """
-    
+
     def __init__(
         self,
-        rate: int = 10,
-        per: int = 60,
-        message: str = "⚠️ Слишком много запросов. Подождите немного."
+        rate: int = GENERAL_POLICY.rate,
+        per: int = GENERAL_POLICY.per,
+        message: str = "⚠️ Слишком много запросов. Подождите немного.",
+        backend: Optional[CacheBackend] = None
     ):
         """
         Initialize rate limiter.
-        
+
         Args:
             rate: Maximum number of requests
             per: Time window in seconds
             message: Message to show when rate limit exceeded
+            backend: Shared cache backend (multi-instance); None = in-process
         """
         super().__init__()
         self.rate = rate
         self.per = per
         self.message = message
-        self.requests: Dict[int, List[datetime]] = defaultdict(list)
-        
-        # Cache admin IDs to avoid repeated imports
-        from bot.config import config
-        self.admin_ids = set(config.OWNER_IDS + config.ADMIN_IDS)
-        
+        self.limiter = _limiter(RatePolicy(GENERAL_POLICY.name, rate, per), backend)
+
         logging.info(f"Rate limiter initialized: {rate} requests per {per} seconds")
-    
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
@@ -54,93 +229,63 @@ class RateLimitMiddleware(BaseMiddleware):
         """
         Check rate limit before processing event.
         """
-        # Get user ID
-        user_id = None
-        if isinstance(event, Message):
-            user_id = event.from_user.id if event.from_user else None
-        elif isinstance(event, CallbackQuery):
-            user_id = event.from_user.id if event.from_user else None
-        
+        user_id = _user_id(event, data)
+
         # Skip rate limiting if no user ID
         if not user_id:
             return await handler(event, data)
-        
-        # Skip rate limiting for admins/owners (cached)
-        if user_id in self.admin_ids:
+
+        # Skip rate limiting for admins/owners (live registry view)
+        if role_registry.is_admin(user_id):
             return await handler(event, data)
-        
-        now = datetime.now()
-        
-        # Clean old requests
-        self.requests[user_id] = [
-            req_time for req_time in self.requests[user_id]
-            if now - req_time < timedelta(seconds=self.per)
-        ]
-        
-        # Check rate limit
-        if len(self.requests[user_id]) >= self.rate:
-            logging.warning(
-                f"Rate limit exceeded for user {user_id}: "
-                f"{len(self.requests[user_id])} requests in {self.per}s"
-            )
-            
+
+        if not await self.limiter.allow(user_id):
+            logging.warning(f"Rate limit exceeded for user {user_id}: {self.rate} requests in {self.per}s")
+
             # Send rate limit message
-            if isinstance(event, Message):
-                await event.answer(self.message)
-            elif isinstance(event, CallbackQuery):
-                await event.answer(self.message, show_alert=True)
-            
+            target = _reply_target(event)
+            if isinstance(target, Message):
+                await target.answer(self.message)
+            elif isinstance(target, CallbackQuery):
+                await target.answer(self.message, show_alert=True)
+
             return  # Don't process the request
-        
-        # Add request timestamp
-        self.requests[user_id].append(now)
-        
+
         # Process request
         return await handler(event, data)
-    
+
     def get_stats(self) -> Dict[str, Any]:
-        """Get rate limiter statistics."""
-        now = datetime.now()
-        active_users = 0
-        total_requests = 0
-        
-        for user_id, timestamps in self.requests.items():
-            recent = [
-                t for t in timestamps
-                if now - t < timedelta(seconds=self.per)
-            ]
-            if recent:
-                active_users += 1
-                total_requests += len(recent)
-        
-        return {
-            "active_users": active_users,
-            "total_requests": total_requests,
-            "rate_limit": f"{self.rate}/{self.per}s"
-        }
+        """Get rate limiter statistics (including approximate memory use)."""
+        return self.limiter.get_stats()
 
 
 class FileUploadRateLimiter(BaseMiddleware):
     """
     Stricter rate limiting for file uploads (receipts, photos).
-    
+
     File uploads are more expensive (OCR, storage), so limit them more.
+    Photos additionally count against an hourly OCR budget; PDFs skip OCR.
     """
-    
+
     def __init__(
         self,
-        rate: int = 3,
-        per: int = 60,
-        message: str = "⚠️ Слишком много файлов. Подождите минуту."
+        rate: int = UPLOAD_POLICY.rate,
+        per: int = UPLOAD_POLICY.per,
+        message: str = "⚠️ Слишком много файлов. Подождите минуту.",
+        ocr_policy: RatePolicy = OCR_POLICY,
+        ocr_message: str = "⚠️ Слишком много фото чеков за час. Попробуйте позже.",
+        backend: Optional[CacheBackend] = None
     ):
         super().__init__()
         self.rate = rate
         self.per = per
         self.message = message
-        self.uploads: Dict[int, List[datetime]] = defaultdict(list)
-        
+        self.ocr_message = ocr_message
+        self.uploads = _limiter(RatePolicy(UPLOAD_POLICY.name, rate, per), backend)
+        self.ocr = _limiter(ocr_policy, backend)
+
         logging.info(f"File upload limiter initialized: {rate} uploads per {per} seconds")
-    
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
@@ -151,37 +296,29 @@ class FileUploadRateLimiter(BaseMiddleware):
         # Only apply to messages with photos or documents
         if not isinstance(event, Message):
             return await handler(event, data)
-        
+
         if not (event.photo or event.document):
             return await handler(event, data)
-        
+
         user_id = event.from_user.id if event.from_user else None
         if not user_id:
             return await handler(event, data)
-        
+
         # Skip for admins
-        from bot.config import config
-        if user_id in (config.OWNER_IDS + config.ADMIN_IDS):
+        if role_registry.is_admin(user_id):
             return await handler(event, data)
-        
-        now = datetime.now()
-        
-        # Clean old uploads
-        self.uploads[user_id] = [
-            upload_time for upload_time in self.uploads[user_id]
-            if now - upload_time < timedelta(seconds=self.per)
-        ]
-        
-        # Check limit
-        if len(self.uploads[user_id]) >= self.rate:
-            logging.warning(
-                f"File upload rate limit exceeded for user {user_id}: "
-                f"{len(self.uploads[user_id])} uploads in {self.per}s"
-            )
+
+        if not await self.uploads.allow(user_id):
+            logging.warning(f"File upload rate limit exceeded for user {user_id}: {self.rate} uploads in {self.per}s")
             await event.answer(self.message)
             return
-        
-        # Add upload timestamp
-        self.uploads[user_id].append(now)
-        
+
+        if event.photo and not await self.ocr.allow(user_id):
+            logging.warning(f"OCR rate limit exceeded for user {user_id}")
+            await event.answer(self.ocr_message)
+            return
+
         return await handler(event, data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"upload": self.uploads.get_stats(), "ocr": self.ocr.get_stats()}
@@ -0,0 +1,42 @@
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject
+from bot.database.replica import READ_ONLY_KEY, ReplicaRouter
+from bot.middlewares.db import LazySession, SessionStats
+
+
+class ReplicaRoutingMiddleware(BaseMiddleware):
+    """
+    Event-level middleware (needs the resolved handler for its flags).
+    For handlers registered with flags={"replica": True} swaps
+    data["session"] for a lazy read-only session on the replica; the primary
+    session from DbSessionMiddleware stays untouched and is closed by it.
+    """
+
+    def __init__(self, router: ReplicaRouter):
+        self.router = router
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not get_flag(data, "replica") or not await self.router.available():
+            return await handler(event, data)
+
+        # strict + read_only: commit() and flushing changes raise
+        session = LazySession(
+            self.router.session_factory,
+            data.get("db_stats") or SessionStats(),
+            strict=True,
+            info={READ_ONLY_KEY: True}
+        )
+        primary = data.get("session")
+        data["session"] = session
+        try:
+            return await handler(event, data)
+        finally:
+            data["session"] = primary
+            await session.close()
@@ -0,0 +1,52 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from bot import tracing
+from bot.database.instrumentation import describe_update
+
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Root span per update.
+
+    Registered as an outer update middleware it opens the transaction;
+    registered as an inner event middleware as well it renames it after the
+    handler that matched ("router.handler"), so traces group by handler.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Update):
+            with tracing.transaction("telegram.update", describe_update(event)):
+                return await handler(event, data)
+
+        callback = getattr(data.get("handler"), "callback", None)
+        if callback is not None:
+            user = data.get("event_from_user")
+            tracing.set_transaction_name(
+                f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}",
+                user.id if user else None,
+            )
+        return await handler(event, data)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: a span per Bot API call"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        with tracing.span("http.client.telegram", type(method).__name__):
+            return await make_request(bot, method)
@@ -0,0 +1,283 @@
+"""
+Bulk re-OCR of stored receipts.
+
+Re-runs OCR over existing PaymentReceipt rows (e.g. after switching or
+upgrading the OCR provider) and rewrites ocr_text / ocr_conf / parsed_*.
+
+    python -m bot.reocr --provider tesseract --workers 4
+    python -m bot.reocr --provider manager --dry-run --limit 200
+    python -m bot.reocr --reset            # start over, ignore checkpoint
+
+Receipts are read by id in keyset batches, files come from receipt
+storage or Telegram with bounded concurrency, Tesseract runs in a process
+pool, each batch is written with one bulk UPDATE and the last processed id
+is checkpointed, so the job can be stopped at any time and resumed. Receipts
+whose fetch or OCR failed are kept in the checkpoint and retried on the next
+run. The new provider is added to parsed_raw_json under "reocr"; the
+payload already stored there is kept.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database.models import PaymentReceipt
+from bot.services.ocr.base import OCRResult
+
+DEFAULT_CHECKPOINT = "data/reocr_checkpoint.json"
+
+# (file_id, blob_sha256) -> (bytes, sha256)
+FetchFn = Callable[[str, Optional[str]], Awaitable[Tuple[Optional[bytes], Optional[str]]]]
+# (bytes, is_pdf) -> OCRResult
+OcrFn = Callable[[bytes, bool], Awaitable[OCRResult]]
+
+
+@dataclass
+class Checkpoint:
+    last_id: int = 0
+    processed: int = 0
+    updated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    # Receipts to retry: fetch or OCR failed (ids may be below last_id)
+    failed_ids: List[int] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "Checkpoint":
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+    def save(self, path: Optional[str]):
+        if not path:
+            return
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**asdict(self), "saved_at": datetime.now(timezone.utc).isoformat()}, f)
+        os.replace(tmp, path)
+
+
+@dataclass(frozen=True)
+class _Row:
+    id: int
+    file_id: str
+    file_type: str
+    blob_sha256: Optional[str]
+    parsed_raw_json: Optional[Dict[str, Any]]
+
+
+class ReOCRBackfill:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        fetch: FetchFn,
+        ocr: OcrFn,
+        batch_size: int = 100,
+        fetch_concurrency: int = 8,
+        checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT,
+        dry_run: bool = False,
+    ):
+        self.session_factory = session_factory
+        self.fetch = fetch
+        self.ocr = ocr
+        self.batch_size = batch_size
+        self.fetch_semaphore = asyncio.Semaphore(fetch_concurrency)
+        self.checkpoint_path = checkpoint_path
+        self.dry_run = dry_run
+
+    async def _fetch_one(self, row: _Row):
+        async with self.fetch_semaphore:
+            try:
+                return await self.fetch(row.file_id, row.blob_sha256)
+            except Exception as e:
+                logging.warning(f"Re-OCR: receipt {row.id}: fetch failed: {e}")
+                return None, None
+
+    async def _ocr_one(self, row: _Row, data: bytes) -> Optional[OCRResult]:
+        try:
+            return await self.ocr(data, row.file_type == "document")
+        except Exception as e:
+            logging.warning(f"Re-OCR: receipt {row.id}: OCR failed: {e}")
+            return None
+
+    async def process_batch(self, rows: List[_Row], state: Checkpoint) -> List[dict]:
+        files = await asyncio.gather(*(self._fetch_one(row) for row in rows))
+        jobs = [(row, data, sha) for row, (data, sha) in zip(rows, files)]
+        results = await asyncio.gather(*(
+            self._ocr_one(row, data) if data else asyncio.sleep(0, None)
+            for row, data, _ in jobs
+        ))
+
+        now = datetime.now(timezone.utc).isoformat()
+        values = []
+        for (row, data, sha), result in zip(jobs, results):
+            state.processed += 1
+            if result is None:
+                state.failed += 1
+                if row.id not in state.failed_ids:
+                    state.failed_ids.append(row.id)
+                continue
+            if row.id in state.failed_ids:
+                state.failed_ids.remove(row.id)
+            if not result.text and result.amount is None:
+                # Provider returned nothing; keep what we have
+                state.skipped += 1
+                continue
+            values.append({
+                "id": row.id,
+                "ocr_text": result.text,
+                "ocr_conf": result.confidence,
+                "parsed_amount": result.amount,
+                "parsed_date": result.date,
+                "parsed_receiver": result.metadata.get("receiver") or None,
+                "parsed_raw_json": {
+                    **(row.parsed_raw_json or {}),
+                    "reocr": {"provider": result.metadata.get("provider"), "at": now},
+                },
+                "blob_sha256": sha or row.blob_sha256,
+            })
+        state.updated += len(values)
+        return values
+
+    async def _read_batch(self, where, size: int) -> List[_Row]:
+        # Short read, closed before the batch is written (SQLite allows one writer at a time)
+        stmt = (
+            select(PaymentReceipt.id, PaymentReceipt.file_id, PaymentReceipt.file_type,
+                   PaymentReceipt.blob_sha256, PaymentReceipt.parsed_raw_json)
+            .where(where)
+            .order_by(PaymentReceipt.id)
+            .limit(size)
+        )
+        async with self.session_factory() as reader:
+            return [_Row(*r) for r in (await reader.execute(stmt)).all()]
+
+    async def run(self, limit: Optional[int] = None, reset: bool = False) -> Checkpoint:
+        state = Checkpoint() if reset else Checkpoint.load(self.checkpoint_path)
+        if state.last_id:
+            logging.info(f"Re-OCR: resuming after receipt #{state.last_id}, retrying {len(state.failed_ids)} failed")
+
+        # Failed receipts of earlier runs first, then keyset batches after the checkpoint
+        retry = list(state.failed_ids)
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = self.batch_size if remaining is None else min(self.batch_size, remaining)
+            if retry:
+                ids, retry = retry[:size], retry[size:]
+                rows = await self._read_batch(PaymentReceipt.id.in_(ids), size)
+                # Receipts deleted meanwhile are not retried again
+                found = {row.id for row in rows}
+                state.failed_ids = [i for i in state.failed_ids if i in found or i not in ids]
+                if not rows:
+                    continue
+            else:
+                rows = await self._read_batch(PaymentReceipt.id > state.last_id, size)
+                if not rows:
+                    break
+            if remaining is not None:
+                remaining -= len(rows)
+
+            values = await self.process_batch(rows, state)
+            if values and not self.dry_run:
+                async with self.session_factory() as writer:
+                    await writer.execute(update(PaymentReceipt), values)
+                    await writer.commit()
+            # A batch of retries only ends below the checkpoint
+            state.last_id = max(state.last_id, rows[-1].id)
+            if not self.dry_run:
+                state.save(self.checkpoint_path)
+            logging.info(
+                f"Re-OCR: up to #{state.last_id}: processed={state.processed} "
+                f"updated={state.updated} skipped={state.skipped} failed={state.failed}"
+            )
+        return state
+
+
+def _tesseract_ocr(pool: ProcessPoolExecutor) -> OcrFn:
+    from bot.services.ocr.pytesseract_provider import recognize_image_sync
+
+    async def ocr(data: bytes, is_pdf: bool) -> OCRResult:
+        if is_pdf:
+            return OCRResult(text="", amount=None, date=None, confidence=0.0,
+                             metadata={'provider': 'pytesseract', 'pdf_not_supported': True})
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, recognize_image_sync, data)
+    return ocr
+
+
+def _manager_ocr() -> OcrFn:
+    from bot.services.ocr import ocr_manager
+
+    async def ocr(data: bytes, is_pdf: bool) -> OCRResult:
+        return await ocr_manager.recognize(data, is_pdf=is_pdf)
+    return ocr
+
+
+async def _main(args) -> Checkpoint:
+    from aiogram import Bot
+    from bot.config import config
+    from bot.database.core import AsyncSessionLocal
+    from bot.services.receipt_storage import fetch_receipt_file
+
+    bot = Bot(token=config.BOT_TOKEN)
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.provider == "tesseract" else None
+    try:
+        async def fetch(file_id: str, blob_sha256: Optional[str]):
+            return await fetch_receipt_file(bot, file_id, blob_sha256)
+
+        job = ReOCRBackfill(
+            AsyncSessionLocal,
+            fetch=fetch,
+            ocr=_tesseract_ocr(pool) if pool else _manager_ocr(),
+            batch_size=args.batch_size,
+            fetch_concurrency=args.fetch_concurrency,
+            checkpoint_path=args.checkpoint,
+            dry_run=args.dry_run,
+        )
+        return await job.run(limit=args.limit, reset=args.reset)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        await bot.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run OCR over stored receipts")
+    parser.add_argument("--provider", choices=("tesseract", "manager"), default="tesseract",
+                        help="tesseract: process pool; manager: configured OCRManager (Ollama/Tesseract)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--fetch-concurrency", type=int, default=8)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--reset", action="store_true", help="Ignore checkpoint and start from the first receipt")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Run OCR but don't write results or checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        stream=sys.stdout,
+    )
+    try:
+        state = asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        logging.info("Re-OCR interrupted; progress is checkpointed, rerun to resume")
+        return
+    logging.info(f"Re-OCR finished: {asdict(state)}")
+
+
+if __name__ == "__main__":
+    main()
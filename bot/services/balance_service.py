@@ -8,6 +8,7 @@ from bot.database.models import (
     TenantStay, RentCharge, CommCharge, Payment, PaymentAllocation,
     PaymentStatus, StayStatus
 )
+from bot.services.payment_service import get_paid_amounts
 
 
 class ChargeInfo(NamedTuple):
@@ -171,18 +172,10 @@ async def _get_unpaid_charges(
     )
     rent_result = await session.execute(rent_stmt)
     rent_charges = rent_result.scalars().all()
+    rent_paid = await get_paid_amounts(session, "rent", [c.id for c in rent_charges])
     
     for charge in rent_charges:
-        # Sum allocations for this charge
-        alloc_stmt = (
-            select(func.coalesce(func.sum(PaymentAllocation.amount), 0))
-            .where(
-                PaymentAllocation.charge_id == charge.id,
-                PaymentAllocation.charge_type == "rent"
-            )
-        )
-        alloc_result = await session.execute(alloc_stmt)
-        paid_amount = float(alloc_result.scalar())
+        paid_amount = rent_paid.get(charge.id, 0.0)
         
         if paid_amount < float(charge.amount) - 0.01:
             unpaid.append(ChargeInfo(
@@ -205,17 +198,10 @@ async def _get_unpaid_charges(
     )
     comm_result = await session.execute(comm_stmt)
     comm_charges = comm_result.scalars().all()
+    comm_paid = await get_paid_amounts(session, "comm", [c.id for c in comm_charges])
     
     for charge in comm_charges:
-        alloc_stmt = (
-            select(func.coalesce(func.sum(PaymentAllocation.amount), 0))
-            .where(
-                PaymentAllocation.charge_id == charge.id,
-                PaymentAllocation.charge_type == "comm"
-            )
-        )
-        alloc_result = await session.execute(alloc_stmt)
-        paid_amount = float(alloc_result.scalar())
+        paid_amount = comm_paid.get(charge.id, 0.0)
         
         if paid_amount < float(charge.amount) - 0.01:
             unpaid.append(ChargeInfo(
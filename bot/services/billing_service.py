@@ -5,6 +5,7 @@ from datetime import date
 from decimal import Decimal
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from bot.services.ocr import extraction
 from bot.database.models import (
     TenantStay, RentCharge, CommCharge, Payment, PaymentReceipt, 
     PaymentType, PaymentStatus, ReceiptDecision, ChargeStatus, RentReceiver, CommProvider
@@ -37,7 +38,7 @@ async def ensure_rent_charge(session: AsyncSession, stay: TenantStay, for_month:
             status=ChargeStatus.pending.value
         )
         session.add(charge)
-        await session.commit()
+        await session.flush()
     return charge
 
 # --- Receipt Parsing ---
@@ -53,66 +54,18 @@ class ParsedReceipt:
 
 
 def extract_amount_from_text(text: str) -> Optional[float]:
-    """Extract monetary amount from text using regex patterns"""
-    import re
-    
-    # Common patterns for amounts in Russian receipts
-    patterns = [
-        r'(?:итого|сумма|к оплате|всего)[:\s]*(\d[\d\s]*[.,]?\d*)\s*(?:руб|₽|р\.?)?',
-        r'(\d{1,3}(?:[\s,]\d{3})*(?:[.,]\d{2})?)\s*(?:руб|₽|р\.)',
-        r'(?:amount|sum)[:\s]*(\d+[.,]?\d*)',
-        r'(\d{4,})[.,](\d{2})',  # Large number with decimals (e.g., 30000.00)
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text.lower(), re.IGNORECASE)
-        if match:
-            amount_str = match.group(1).replace(' ', '').replace(',', '.')
-            try:
-                return float(amount_str)
-            except ValueError:
-                continue
-    
-    return None
+    """Extract monetary amount from text (see bot.services.ocr.extraction)"""
+    return extraction.extract_amount(text)
 
 
 def extract_date_from_text(text: str) -> Optional[date]:
     """Extract date from text"""
-    import re
-    from datetime import datetime
-    
-    patterns = [
-        (r'(\d{2})[./](\d{2})[./](\d{4})', '%d.%m.%Y'),
-        (r'(\d{2})[./](\d{2})[./](\d{2})', '%d.%m.%y'),
-        (r'(\d{4})-(\d{2})-(\d{2})', '%Y-%m-%d'),
-    ]
-    
-    for pattern, fmt in patterns:
-        match = re.search(pattern, text)
-        if match:
-            try:
-                return datetime.strptime(match.group(0), fmt).date()
-            except ValueError:
-                continue
-    
-    return None
+    return extraction.extract_date(text)
 
 
 def extract_receiver_from_text(text: str) -> str:
     """Extract receiver/payee name"""
-    import re
-    
-    patterns = [
-        r'(?:получатель|payee|кому)[:\s]*([А-ЯЁа-яёA-Za-z\s\.]+)',
-        r'(?:ИП|ООО|АО)\s+[«"]?([^»"\n]+)[»"]?',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1).strip()[:100]
-    
-    return ""
+    return extraction.extract_receiver(text)
 
 
 async def parse_receipt_with_ollama(file_bytes: bytes) -> Optional[ParsedReceipt]:
@@ -298,7 +251,10 @@ async def create_payment_from_receipt(
     parsed: ParsedReceipt,
     decision: ReceiptDecision,
     pay_type: PaymentType,
-    reject_reason: Optional[str] = None
+    reject_reason: Optional[str] = None,
+    image_phash: Optional[str] = None,
+    blob_sha256: Optional[str] = None,
+    file_type: str = "photo"
 ) -> Tuple[Optional[Payment], PaymentReceipt]:
     
     # Create Payment if Accepted
@@ -319,16 +275,18 @@ async def create_payment_from_receipt(
         payment_id=payment.id if payment else None,
         stay_id=stay_id,
         file_id=file_id,
-        file_type="photo",
+        file_type=file_type,
         ocr_text=parsed.ocr_text,
         ocr_conf=parsed.confidence,
         parsed_amount=parsed.amount,
         parsed_receiver=parsed.receiver_raw,
         parsed_purpose=parsed.purpose_raw,
+        image_phash=image_phash,
+        blob_sha256=blob_sha256,
         decision=decision.value,
         reject_reason=reject_reason
     )
     session.add(receipt_record)
-    await session.commit()
+    await session.flush()
     
     return payment, receipt_record
@@ -0,0 +1,278 @@
+"""
+Shared cache backend.
+
+State that must agree across bot replicas (rate-limit counters, cache
+invalidation, FSM) goes through a CacheBackend instead of process memory:
+
+- atomic counters with TTL (incr)
+- key/value with TTL (get/set/delete)
+- pub/sub for invalidation (publish/subscribe)
+
+MemoryBackend keeps everything in the process; it is the default for a
+single instance and the fake used in tests. RedisBackend talks to any
+Redis-protocol server (Redis, Valkey, KeyDB, Dragonfly; requires
+``pip install redis``). Values are strings; keys are namespaced by prefix.
+
+    CACHE_BACKEND_URL=redis://localhost:6379/0
+"""
+import asyncio
+import inspect
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+# Callback for a channel message; may be sync or async
+Subscriber = Callable[[str], Any]
+
+
+class CacheBackend(ABC):
+    """Interface; all data methods are coroutines"""
+
+    # True when other processes see the same data (subscriptions are only
+    # worth wiring up then)
+    shared = False
+
+    def __init__(self):
+        # publish_soon() tasks not finished yet (flush() waits for them)
+        self._publishing: Set[asyncio.Task] = set()
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically add to a counter; ttl (seconds) is set when the key is created"""
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        pass
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        pass
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        pass
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str):
+        pass
+
+    @abstractmethod
+    async def subscribe(self, channel: str, callback: Subscriber):
+        pass
+
+    async def close(self):
+        await self.flush()
+
+    def publish_soon(self, channel: str, message: str):
+        """Fire-and-forget publish from sync code (flush/commit hooks)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.publish(channel, message))
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+        task.add_done_callback(_log_task_error)
+
+    async def flush(self):
+        """Wait for publish_soon() messages still being sent"""
+        if self._publishing:
+            await asyncio.gather(*self._publishing, return_exceptions=True)
+
+
+def _log_task_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logging.warning(f"Cache backend publish failed: {task.exception()}")
+
+
+async def _deliver(callback: Subscriber, message: str):
+    try:
+        result = callback(message)
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logging.exception(f"Cache subscriber failed: {e}")
+
+
+class MemoryBackend(CacheBackend):
+    """In-process backend (single instance, tests)"""
+
+    def __init__(self):
+        super().__init__()
+        # key -> (value, expires_at or None)
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[0]
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        current = self._live(key)
+        if current is None:
+            expires = time.monotonic() + ttl if ttl else None
+            value = amount
+        else:
+            expires = self._data[key][1]
+            value = int(current) + amount
+        self._data[key] = (str(value), expires)
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._live(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def publish(self, channel: str, message: str):
+        for callback in list(self._subscribers.get(channel, ())):
+            await _deliver(callback, message)
+
+    async def subscribe(self, channel: str, callback: Subscriber):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        expired = [k for k, (_, expires) in self._data.items() if expires is not None and expires <= now]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# INCRBY and set the TTL only when this call created the key
+_INCR_SCRIPT = """
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value == tonumber(ARGV[1]) and tonumber(ARGV[2]) > 0 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return value
+"""
+
+
+class RedisBackend(CacheBackend):
+    """Redis-protocol backend shared by all replicas"""
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "rentbot:", client=None):
+        super().__init__()
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self._incr = client.register_script(_INCR_SCRIPT)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        ttl_ms = int(ttl * 1000) if ttl else 0
+        return int(await self._incr(keys=[self._key(key)], args=[amount, ttl_ms]))
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(self._key(key))
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[str]]:
+        if not keys:
+            return []
+        return await self.client.mget([self._key(k) for k in keys])
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        await self.client.set(self._key(key), value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*(self._key(k) for k in keys))
+
+    async def publish(self, channel: str, message: str):
+        await self.client.publish(self._key(channel), message)
+
+    async def subscribe(self, channel: str, callback: Subscriber):
+        if self._pubsub is None:
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        if channel not in self._subscribers:
+            self._subscribers[channel] = []
+            await self._pubsub.subscribe(self._key(channel))
+        self._subscribers[channel].append(callback)
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Cache backend pub/sub error: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            channel = message["channel"][len(self.prefix):]
+            for callback in list(self._subscribers.get(channel, ())):
+                await _deliver(callback, message["data"])
+
+    async def close(self):
+        await self.flush()
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self.client.aclose()
+
+
+_backend: Optional[CacheBackend] = None
+
+
+def get_cache_backend() -> CacheBackend:
+    """Configured backend: Redis if CACHE_BACKEND_URL is set, else in-process"""
+    global _backend
+    if _backend is not None:
+        return _backend
+
+    from bot.config import config
+
+    url = config.CACHE_BACKEND_URL
+    if url:
+        try:
+            _backend = RedisBackend(url, prefix=config.CACHE_BACKEND_PREFIX)
+        except ImportError as e:
+            # Falling back to process memory would silently unshare locks, dedup and roles
+            raise ImportError("CACHE_BACKEND_URL is set but the redis package is missing (pip install redis)") from e
+    else:
+        _backend = MemoryBackend()
+    return _backend
+
+
+def set_cache_backend(backend: Optional[CacheBackend]):
+    """Replace the process-wide backend (tests, custom deployments)"""
+    global _backend
+    _backend = backend
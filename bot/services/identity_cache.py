@@ -0,0 +1,179 @@
+"""
+Tenant identity cache.
+
+ConsentMiddleware needs, on every non-admin update, only who the user is
+(tenant id, consent, status, name). This keeps a TTL + LRU map
+tg_id -> TenantIdentity so repeated button presses skip the SELECT.
+Unknown users are cached too (shorter TTL) until an invite links them.
+
+Entries are invalidated explicitly (invalidate_tenant) by the services that
+change identity fields, and by a flush listener for any ORM change to a
+Tenant; invalidation is repeated after commit so a concurrent update can't
+re-cache the old row. With a shared cache backend the post-commit
+invalidation is also published to the other replicas. The TTL bounds
+staleness for bulk UPDATE statements nobody invalidated.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from bot.database import uow
+from bot.database.models import Tenant
+from bot.services.cache_backend import CacheBackend, get_cache_backend
+
+# Pub/sub channel for invalidations made by other replicas
+IDENTITY_CHANNEL = "identity"
+
+# Tenant attributes the snapshot depends on
+_IDENTITY_FIELDS = ("tg_id", "full_name", "personal_data_consent", "status")
+
+
+@dataclass(frozen=True, slots=True)
+class TenantIdentity:
+    """Lightweight stand-in for Tenant injected into handlers as `tenant`"""
+    id: int
+    tg_id: int
+    full_name: str
+    personal_data_consent: bool
+    status: str
+
+    async def load(self, session: AsyncSession) -> Optional[Tenant]:
+        """Full ORM Tenant, for handlers that need more than the snapshot"""
+        return await session.get(Tenant, self.id)
+
+
+class IdentityCache:
+    def __init__(self, ttl: float = 60.0, negative_ttl: float = 10.0, maxsize: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        # tg_id -> (expires_at, identity or None for "not a tenant")
+        self._entries: "OrderedDict[int, Tuple[float, Optional[TenantIdentity]]]" = OrderedDict()
+        self._tg_by_tenant: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tg_id: int) -> Tuple[bool, Optional[TenantIdentity]]:
+        """(found, identity); identity is None for a cached "not a tenant" """
+        entry = self._entries.get(tg_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._drop(tg_id)
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(tg_id)
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, tg_id: int, identity: Optional[TenantIdentity]):
+        ttl = self.ttl if identity is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        self._drop(tg_id)
+        self._entries[tg_id] = (time.monotonic() + ttl, identity)
+        if identity is not None:
+            self._tg_by_tenant[identity.id] = tg_id
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tg_id: Optional[int] = None, tenant_id: Optional[int] = None):
+        if tenant_id is not None and tenant_id in self._tg_by_tenant:
+            self._drop(self._tg_by_tenant[tenant_id])
+        if tg_id is not None:
+            self._drop(tg_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._tg_by_tenant.clear()
+
+    def _drop(self, tg_id: int):
+        entry = self._entries.pop(tg_id, None)
+        if entry is not None and entry[1] is not None:
+            self._tg_by_tenant.pop(entry[1].id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _cache_from_config() -> IdentityCache:
+    from bot.config import config
+    return IdentityCache(
+        ttl=config.IDENTITY_CACHE_TTL,
+        negative_ttl=config.IDENTITY_CACHE_NEGATIVE_TTL,
+        maxsize=config.IDENTITY_CACHE_SIZE,
+    )
+
+
+identity_cache = _cache_from_config()
+
+
+async def resolve_tenant(session: AsyncSession, tg_id: int) -> Optional[TenantIdentity]:
+    """Identity of the tenant bound to tg_id (None if not a tenant); one SELECT on a miss"""
+    found, identity = identity_cache.get(tg_id)
+    if found:
+        return identity
+
+    row = (await session.execute(
+        select(Tenant.id, Tenant.tg_id, Tenant.full_name, Tenant.personal_data_consent, Tenant.status)
+        .where(Tenant.tg_id == tg_id)
+    )).first()
+    identity = None
+    if row is not None:
+        status = row.status.value if hasattr(row.status, "value") else row.status
+        identity = TenantIdentity(row.id, row.tg_id, row.full_name, bool(row.personal_data_consent), status)
+    identity_cache.put(tg_id, identity)
+    return identity
+
+
+def _invalidate_everywhere(tg_id: Optional[int], tenant_id: Optional[int]):
+    """After commit: drop the entry here and on the other replicas"""
+    identity_cache.invalidate(tg_id=tg_id, tenant_id=tenant_id)
+    backend = get_cache_backend()
+    if backend.shared:
+        backend.publish_soon(IDENTITY_CHANNEL, f"{tg_id or ''}:{tenant_id or ''}")
+
+
+async def subscribe_invalidations(backend: CacheBackend):
+    """Apply invalidations published by other replicas"""
+    def on_message(message: str):
+        tg_id, _, tenant_id = message.partition(":")
+        identity_cache.invalidate(
+            tg_id=int(tg_id) if tg_id else None,
+            tenant_id=int(tenant_id) if tenant_id else None,
+        )
+
+    await backend.subscribe(IDENTITY_CHANNEL, on_message)
+
+
+def invalidate_tenant(session: Optional[AsyncSession], tg_id: Optional[int] = None, tenant_id: Optional[int] = None):
+    """Drop cached identity now and again once the session's unit of work commits"""
+    identity_cache.invalidate(tg_id=tg_id, tenant_id=tenant_id)
+    if session is not None:
+        uow.on_commit(session, lambda: _invalidate_everywhere(tg_id, tenant_id))
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed_tenants(session: Session, flush_context):
+    """Any ORM change of an identity field (consent, ban, rename, relink) drops the entry"""
+    for obj in list(session.dirty) + list(session.deleted) + list(session.new):
+        if not isinstance(obj, Tenant):
+            continue
+        state = inspect(obj)
+        tg_ids = {obj.tg_id}
+        changed = obj in session.new or obj in session.deleted
+        for name in _IDENTITY_FIELDS:
+            history = state.attrs[name].history
+            if history.has_changes():
+                changed = True
+                if name == "tg_id":
+                    tg_ids.update(history.deleted)
+        if not changed:
+            continue
+        for tg_id in tg_ids:
+            identity_cache.invalidate(tg_id=tg_id, tenant_id=obj.id)
+            uow.on_commit(session, lambda tg_id=tg_id, tenant_id=obj.id: _invalidate_everywhere(tg_id, tenant_id))
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta, timezone
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.database.models import InviteCode, Tenant, TenantStatus
+from bot.services.identity_cache import invalidate_tenant
 from bot.database.models import InviteCode, Tenant, TenantStatus
 
 def _generate_random_code(length=8) -> str:
@@ -94,7 +95,7 @@ async def redeem_invite(session: AsyncSession, code: str, tg_id: int, username:
             # Rollback invite usage
             invite.is_used = False
             invite.used_at = None
-            await session.commit()
+            await session.flush()
             return False, f"Вы уже зарегистрированы как {existing_user.role}", None
         
         # NEW: Check if registered as tenant
@@ -106,7 +107,7 @@ async def redeem_invite(session: AsyncSession, code: str, tg_id: int, username:
             # Rollback invite usage
             invite.is_used = False
             invite.used_at = None
-            await session.commit()
+            await session.flush()
             return False, (
                 f"Вы уже зарегистрированы как жилец ({existing_tenant.full_name}). "
                 f"Для получения прав администратора обратитесь к владельцу системы. "
@@ -135,7 +136,7 @@ async def redeem_invite(session: AsyncSession, code: str, tg_id: int, username:
             # Rollback invite usage
             invite.is_used = False
             invite.used_at = None
-            await session.commit()
+            await session.flush()
             return False, "Ошибка кода: не привязан жилец", None
     
         stmt_t = select(Tenant).where(Tenant.id == invite.tenant_id)
@@ -146,7 +147,7 @@ async def redeem_invite(session: AsyncSession, code: str, tg_id: int, username:
             # Rollback invite usage
             invite.is_used = False
             invite.used_at = None
-            await session.commit()
+            await session.flush()
             return False, "Профиль жильца не найден", None
         
         # Check if linked (ignore negative temp IDs)
@@ -158,16 +159,19 @@ async def redeem_invite(session: AsyncSession, code: str, tg_id: int, username:
                 # Rollback invite usage
                 invite.is_used = False
                 invite.used_at = None
-                await session.commit()
+                await session.flush()
                 return False, "Этот профиль уже привязан к другому Telegram аккаунту.", None
 
         tenant.tg_id = tg_id
         tenant.tg_username = username
         tenant.status = TenantStatus.active.value
         result_obj = tenant
+        
+        # This user was cached as "not a tenant"
+        invalidate_tenant(session, tg_id=tg_id, tenant_id=tenant.id)
 
-    # Commit all changes
-    await session.commit()
+    # let middleware or caller commit
+    await session.flush()
     
     welcome_name = result_obj.full_name if hasattr(result_obj, 'full_name') else "Пользователь"
     return True, f"Успешно! Добро пожаловать, {welcome_name}.", result_obj
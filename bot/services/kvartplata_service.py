@@ -336,7 +336,7 @@ async def save_rso_to_db(
         session.add(provider)
         created_providers.append(provider)
     
-    await session.commit()
+    await session.flush()
     logger.info(f"Saved {len(created_providers)} RSO providers to database")
     
     return created_providers
@@ -0,0 +1,293 @@
+"""
+Receipt field extraction (amount, date, receiver) from OCR text.
+
+All patterns are compiled once at import. The text is lowercased once and
+scanned twice: keywords, then dates and numbers together. Every number is
+kept as a candidate with its position and nearest keyword, candidates are
+scored and the best one wins.
+This replaces "first regex that matches", which regularly picked INNs,
+account numbers or parts of dates.
+"""
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+# --- Patterns (compiled once) ---
+
+_CURRENCY_AFTER_RE = re.compile(r'[ \u00a0]?(?:руб|₽|р\.|р\b|rub|rur)')
+_CURRENCY_BEFORE_RE = re.compile(r'(?:₽|rub|руб\.?)[ \u00a0]?$')
+
+# kind: + (total), - (identifier next to number), c (commission)
+_KEYWORDS = (
+    ("+", ("итого", "итог", "к оплате", "к списанию", "сумма платежа", "сумма перевода",
+           "сумма операции", r"сумм[аеуы]", "всего", "оплачено", "списано", "total", "amount", "sum")),
+    ("c", (r"комисси[яи]", "fee")),
+    ("-", ("инн", "кпп", "бик", "огрн", "р/сч?", "к/сч?", "л/сч?", r"лицев\w*", r"сч[её]т\w*",
+           "номер", "№", r"тел\w*", r"карт\w*", r"документ\w*", r"операци\w*", r"код\w*", "смена",
+           "ккт", "фн", "фд", "фп", "рн", r"квитанц\w*", r"заказ\w*", r"паспорт\w*")),
+)
+_KEYWORD_FIRST_CHARS = "".join(sorted({w[0] for _, words in _KEYWORDS for w in words}))
+_KEYWORD_RE = re.compile(
+    f"(?=[{re.escape(_KEYWORD_FIRST_CHARS)}])(?<![а-яёa-z])(?:"
+    + "|".join(f"(?P<k{i}>{'|'.join(words)})" for i, (_, words) in enumerate(_KEYWORDS))
+    + ")"
+)
+_KEYWORD_KINDS = {f"k{i}": kind for i, (kind, _) in enumerate(_KEYWORDS)}
+
+_MONTHS = {
+    "января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6,
+    "июля": 7, "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12,
+}
+# One scan for dates and numbers: a date wins where both match, so the
+# parts of 01.02.2024 never become amount candidates.
+# Leading (?=\d) lets the engine skip non-digit positions before the lookbehinds.
+_TOKEN_RE = re.compile(
+    r'(?=\d)(?:'
+    # 01.02.2024 | 2024-02-01 | 1 февраля 2024
+    r'(?<!\d)(?:'
+    r'(?P<d1>\d{1,2})[./](?P<m1>\d{1,2})[./](?P<y1>\d{4}|\d{2})'
+    r'|(?P<y2>\d{4})-(?P<m2>\d{2})-(?P<d2>\d{2})'
+    r'|(?P<d3>\d{1,2})\s+(?P<mon>' + "|".join(_MONTHS) + r')\s+(?P<y3>\d{4})'
+    r')(?!\d)'
+    # 30 000,00 | 30000.00 | 1 520 | 950
+    r'|(?<![\d.,:/\-*+#])'
+    r'(?P<int>\d{1,3}(?:[ \u00a0\u202f]\d{3})+|\d+)'
+    r'(?:[.,](?P<cents>\d{1,2}))?'
+    r'(?![\d:/]|[.,]\d)'
+    r')'
+)
+_DATE_KEYWORD_RE = re.compile(r'дата|date|время|оплачен\w*|проведен\w*')
+_TIME_AFTER_RE = re.compile(r',?\s*(?:в\s*)?\d{1,2}:\d{2}')
+
+# Matched against the lowercased text; the name is sliced from the original
+_RECEIVER_PATTERNS = (
+    re.compile(r'(?:получатель|payee|кому)[:\s]*([а-яёa-z][а-яёa-z \t\.]*)'),
+    re.compile(r'(?<![а-яёa-z])(?:ип|ооо|ао)\s+[«"]?([^»"\n]+)[»"]?'),
+)
+
+# --- Scoring knobs ---
+MIN_AMOUNT_SCORE = 2.0
+PLAUSIBLE_AMOUNT = (1.0, 1_000_000.0)
+MAX_BARE_DIGITS = 7          # 8+ digits without separators = identifier
+KEYWORD_WINDOW = 40          # chars before the number on the same line
+
+
+@dataclass(frozen=True)
+class AmountCandidate:
+    value: float
+    start: int
+    end: int
+    score: float
+    keyword: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class DateCandidate:
+    value: date
+    start: int
+    score: float
+
+
+@dataclass(frozen=True)
+class ExtractedFields:
+    amount: Optional[float]
+    date: Optional[date]
+    receiver: str
+
+
+def _keyword_index(lower: str) -> Tuple[List[int], List[Tuple[str, str]]]:
+    """Keyword end positions (sorted) and their (kind, text)"""
+    ends, info = [], []
+    for m in _KEYWORD_RE.finditer(lower):
+        ends.append(m.end())
+        info.append((_KEYWORD_KINDS[m.lastgroup], m.group()))
+    return ends, info
+
+
+def _nearest_keyword(ends, info, pos: int, line_start: int):
+    """Closest keyword ending before pos on the same line: (kind, text, distance)"""
+    i = bisect_right(ends, pos) - 1
+    if i < 0 or ends[i] < line_start:
+        return None
+    return info[i][0], info[i][1], pos - ends[i]
+
+
+def _line_bounds(text: str, pos: int) -> Tuple[int, int]:
+    """Start of the line containing pos and start of the line above it"""
+    start = text.rfind("\n", 0, pos) + 1
+    prev = text.rfind("\n", 0, start - 1) + 1 if start else 0
+    return start, prev
+
+
+def find_amount_candidates(text: str) -> List[AmountCandidate]:
+    """All numbers that could be the paid amount, scored; best first"""
+    if not text:
+        return []
+    lower = text.lower()
+    _, numbers = _scan(lower, date.today())
+    candidates = [AmountCandidate(*raw) for raw in _amount_candidates(lower, numbers)]
+    # Higher score first; on ties prefer the later one (totals sit at the bottom)
+    candidates.sort(key=lambda c: (-c.score, -c.start))
+    return candidates
+
+
+# (value, start, end, score, keyword); extract_fields() only needs the best
+# one, so candidates stay tuples until find_*_candidates() builds dataclasses
+_RawAmount = Tuple[float, int, int, float, Optional[str]]
+_RawDate = Tuple[date, int, float]
+# (start, end, integer part, cents) of a number that is not part of a date
+_Number = Tuple[int, int, str, Optional[str]]
+
+
+def _amount_candidates(lower: str, numbers: List[_Number]) -> List[_RawAmount]:
+    """Scored amount candidates, in text order"""
+    ends, info = _keyword_index(lower)
+    currency_after = _CURRENCY_AFTER_RE.match
+    currency_before = _CURRENCY_BEFORE_RE.search
+    low, high = PLAUSIBLE_AMOUNT
+
+    raw: List[_RawAmount] = []
+    for start, end, int_part, cents in numbers:
+        grouped = not int_part.isdigit()
+        digits = int_part.replace(" ", "").replace("\u00a0", "").replace("\u202f", "") if grouped else int_part
+        if not grouped and len(digits) > MAX_BARE_DIGITS:
+            continue
+        value = float(f"{digits}.{cents or 0}")
+
+        score = 0.0
+        keyword = None
+        line_start, prev_line_start = _line_bounds(lower, start)
+        near = _nearest_keyword(ends, info, start, line_start)
+        if near and near[2] <= KEYWORD_WINDOW:
+            kind, keyword, distance = near
+            if kind == "+":
+                score += max(1.0, 4.0 - distance / 20.0)
+            elif kind == "c":
+                score -= 3.0
+            else:
+                score -= 6.0
+        elif line_start > 0:
+            # Number alone on the line below "ИТОГО:"
+            above = _nearest_keyword(ends, info, line_start - 1, prev_line_start)
+            if above and above[0] == "+" and not lower[line_start:start].strip():
+                keyword = above[1]
+                score += 2.0
+
+        if currency_after(lower, end) or currency_before(lower, max(0, start - 6), start):
+            score += 2.0
+        if cents is not None and len(cents) == 2:
+            score += 1.0
+        if grouped:
+            score += 0.5
+
+        if value < low:
+            score -= 4.0
+        elif value > high:
+            score -= 2.0
+        else:
+            score += 1.0
+
+        raw.append((value, start, end, score, keyword))
+
+    # The total is usually repeated (line item + ИТОГО + списано)
+    counts = {}
+    for candidate in raw:
+        counts[candidate[0]] = counts.get(candidate[0], 0) + 1
+    if len(counts) == len(raw):
+        return raw
+    return [
+        (value, start, end, score + min(1.0, 0.5 * (counts[value] - 1)), keyword)
+        for value, start, end, score, keyword in raw
+    ]
+
+
+def find_date_candidates(text: str, today: Optional[date] = None) -> List[DateCandidate]:
+    """All valid dates in text, scored; best first"""
+    if not text:
+        return []
+    raw, _ = _scan(text.lower(), today or date.today())
+    candidates = [DateCandidate(*candidate) for candidate in raw]
+    # Higher score first; on ties prefer the earliest (header date)
+    candidates.sort(key=lambda c: (-c.score, c.start))
+    return candidates
+
+
+def _scan(lower: str, today: date) -> Tuple[List[_RawDate], List[_Number]]:
+    """Scored date candidates and the numbers outside dates, both in text order"""
+    candidates, numbers = [], []
+    for m in _TOKEN_RE.finditer(lower):
+        start, end = m.span()
+        d1, m1, y1, y2, m2, d2, d3, mon, y3, int_part, cents = m.groups()
+        if int_part is not None:
+            numbers.append((start, end, int_part, cents))
+            continue
+        try:
+            if d1:
+                year = int(y1)
+                if year < 100:
+                    year += 2000
+                value = date(year, int(m1), int(d1))
+            elif y2:
+                value = date(int(y2), int(m2), int(d2))
+            else:
+                value = date(int(y3), _MONTHS[mon], int(d3))
+        except ValueError:
+            continue
+
+        score = 0.0
+        line_start = lower.rfind("\n", 0, start) + 1
+        if _DATE_KEYWORD_RE.search(lower, line_start, start):
+            score += 2.0
+        if _TIME_AFTER_RE.match(lower, end):
+            score += 1.0
+        if value > today + timedelta(days=1):
+            score -= 3.0
+        elif value < today - timedelta(days=3 * 365):
+            score -= 2.0
+        candidates.append((value, start, score))
+    return candidates, numbers
+
+
+def extract_amount(text: str) -> Optional[float]:
+    """Best-scored amount or None if nothing looks like a total"""
+    return extract_fields(text).amount if text else None
+
+
+def extract_date(text: str) -> Optional[date]:
+    """Best-scored date or None"""
+    candidates = find_date_candidates(text)
+    return candidates[0].value if candidates else None
+
+
+def extract_receiver(text: str, lower: Optional[str] = None) -> str:
+    """Receiver/payee name (first matching pattern), max 100 chars"""
+    if not text:
+        return ""
+    lower = lower if lower is not None else text.lower()
+    source = text if len(lower) == len(text) else lower
+    for pattern in _RECEIVER_PATTERNS:
+        match = pattern.search(lower)
+        if match:
+            start, end = match.span(1)
+            return source[start:end].strip()[:100]
+    return ""
+
+
+def extract_fields(text: str) -> ExtractedFields:
+    """Amount, date and receiver from one scan of dates and numbers"""
+    if not text:
+        return ExtractedFields(None, None, "")
+    lower = text.lower()
+    dates, numbers = _scan(lower, date.today())
+    amounts = _amount_candidates(lower, numbers)
+    # Same order as find_*_candidates(): score, then the later amount / earlier date
+    best_amount = max(amounts, key=lambda c: (c[3], c[1])) if amounts else None
+    best_date = min(dates, key=lambda c: (-c[2], c[1])) if dates else None
+    return ExtractedFields(
+        amount=best_amount[0] if best_amount and best_amount[3] >= MIN_AMOUNT_SCORE else None,
+        date=best_date[0] if best_date else None,
+        receiver=extract_receiver(text, lower),
+    )
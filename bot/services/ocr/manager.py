@@ -1,7 +1,10 @@
 """OCR Manager - manages providers with fallback"""
 
+import asyncio
 import logging
+import time
 from typing import Optional
+from bot import metrics, tracing
 from .base import OCRProvider, OCRResult
 from .pytesseract_provider import PytesseractProvider
 from .ai_provider import AIModelProvider
@@ -10,10 +13,18 @@ from .ai_provider import AIModelProvider
 class OCRManager:
     """Manages OCR providers with automatic fallback"""
     
-    def __init__(self):
-        self.primary_provider: Optional[OCRProvider] = None
-        self.fallback_provider: Optional[OCRProvider] = None
-        self._initialized = False
+    def __init__(
+        self,
+        primary_provider: Optional[OCRProvider] = None,
+        fallback_provider: Optional[OCRProvider] = None
+    ):
+        """
+        Providers passed explicitly (benchmarks, tests) skip config-driven
+        initialization; the global instance is configured lazily from config.
+        """
+        self.primary_provider: Optional[OCRProvider] = primary_provider
+        self.fallback_provider: Optional[OCRProvider] = fallback_provider
+        self._initialized = primary_provider is not None
     
     async def initialize(self):
         """Initialize providers (call once at startup)"""
@@ -33,8 +44,8 @@ class OCRManager:
             except Exception as e:
                 logging.warning(f"Failed to initialize AI OCR provider: {e}")
         
-        # Pytesseract as fallback
-        pytesseract_provider = PytesseractProvider()
+        # Pytesseract as fallback (the probe runs `tesseract --version`)
+        pytesseract_provider = await asyncio.to_thread(PytesseractProvider)
         if pytesseract_provider.is_available():
             if not self.primary_provider:
                 self.primary_provider = pytesseract_provider
@@ -48,6 +59,23 @@ class OCRManager:
         if not self.primary_provider:
             logging.warning("No OCR providers available!")
     
+    @staticmethod
+    async def _run(provider: OCRProvider, file_bytes: bytes, is_pdf: bool) -> OCRResult:
+        """One provider call, timed for the metrics endpoint and traced"""
+        metrics.ocr_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            with tracing.span("ocr", provider.name):
+                if is_pdf:
+                    return await provider.recognize_pdf(file_bytes)
+                return await provider.recognize_image(file_bytes)
+        except Exception:
+            metrics.ocr_failures.inc(provider.name)
+            raise
+        finally:
+            metrics.ocr_duration.observe(time.perf_counter() - started, provider.name)
+            metrics.ocr_in_flight.inc(amount=-1)
+    
     async def recognize(self, file_bytes: bytes, is_pdf: bool = False) -> OCRResult:
         """Recognize with automatic fallback"""
         
@@ -59,10 +87,7 @@ class OCRManager:
         if self.primary_provider:
             try:
                 logging.info(f"Trying primary OCR provider: {self.primary_provider.name}")
-                if is_pdf:
-                    result = await self.primary_provider.recognize_pdf(file_bytes)
-                else:
-                    result = await self.primary_provider.recognize_image(file_bytes)
+                result = await self._run(self.primary_provider, file_bytes, is_pdf)
                 
                 # If got amount, success
                 if result.amount is not None:
@@ -77,10 +102,7 @@ class OCRManager:
         if self.fallback_provider:
             try:
                 logging.info(f"Trying fallback OCR provider: {self.fallback_provider.name}")
-                if is_pdf:
-                    result = await self.fallback_provider.recognize_pdf(file_bytes)
-                else:
-                    result = await self.fallback_provider.recognize_image(file_bytes)
+                result = await self._run(self.fallback_provider, file_bytes, is_pdf)
                 
                 logging.info(f"Fallback OCR result: amount={result.amount}")
                 return result
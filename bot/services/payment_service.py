@@ -3,7 +3,7 @@ Payment allocation service for distributing payments across charges.
 
 Implements FIFO (First In, First Out) allocation strategy.
 """
-from typing import List
+from typing import Dict, Iterable, List
 from datetime import date
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,6 +13,7 @@ from bot.database.models import (
     Payment, PaymentAllocation, RentCharge, CommCharge,
     TenantStay, ChargeStatus, PaymentStatus
 )
+from bot.services.role_registry import role_registry
 
 
 async def allocate_payment(
@@ -87,6 +88,12 @@ async def allocate_payment(
     
     all_charges.sort(key=lambda x: x[1].month)
     
+    # Already allocated per charge, one query per charge type
+    paid = {
+        "rent": await get_paid_amounts(session, "rent", [c.id for c in rent_charges]),
+        "comm": await get_paid_amounts(session, "comm", [c.id for c in comm_charges]),
+    }
+    
     # Initialize allocations list
     allocations = []
 
@@ -96,7 +103,7 @@ async def allocate_payment(
             break
         
         # How much still owed on this charge?
-        paid_so_far = await _get_paid_amount_for_charge(session, charge.id, charge_type)
+        paid_so_far = paid[charge_type].get(charge.id, 0.0)
         charge_amount = float(charge.amount)
         charge_remaining = charge_amount - paid_so_far
         
@@ -129,7 +136,7 @@ async def allocate_payment(
     payment.allocated_amount = float(payment.allocated_amount or 0) + (float(amount_to_allocate) - already_allocated - remaining)
     payment.unallocated_amount = remaining
     
-    await session.commit()
+    await session.flush()
     return allocations
 
 
@@ -185,6 +192,27 @@ async def _get_paid_amount_for_charge(
     return float(result.scalar())
 
 
+async def get_paid_amounts(
+    session: AsyncSession,
+    charge_type: str,
+    charge_ids: Iterable[int]
+) -> Dict[int, float]:
+    """Amount already allocated per charge id; charges without allocations are absent"""
+    charge_ids = list(charge_ids)
+    if not charge_ids:
+        return {}
+    stmt = (
+        select(PaymentAllocation.charge_id, func.sum(PaymentAllocation.amount))
+        .where(
+            PaymentAllocation.charge_type == charge_type,
+            PaymentAllocation.charge_id.in_(charge_ids)
+        )
+        .group_by(PaymentAllocation.charge_id)
+    )
+    result = await session.execute(stmt)
+    return {charge_id: float(total or 0) for charge_id, total in result.all()}
+
+
 async def get_payment_allocations(
     session: AsyncSession,
     payment_id: int
@@ -265,7 +293,7 @@ async def deallocate_payment(
         total = payment.total_amount if payment.total_amount is not None else payment.amount
         payment.unallocated_amount = float(total)
     
-    await session.commit()
+    await session.flush()
 
 
 async def mark_charge_as_paid(
@@ -297,7 +325,6 @@ async def mark_charge_as_paid(
         ValueError: If charge not found or already paid
     """
     from datetime import datetime, timezone
-    from bot.config import config
     
     # LOCK CHARGE ROW to prevent concurrent marking
     if charge_type == "rent":
@@ -339,7 +366,7 @@ async def mark_charge_as_paid(
         raise ValueError("Stay or rental object not found")
     
     # Only owner of the object or OWNER can mark payment
-    if admin_id not in config.OWNER_IDS and stay.rental_object.owner_id != admin_id:
+    if not role_registry.is_owner(admin_id) and stay.rental_object.owner_id != admin_id:
         raise ValueError("У вас нет прав на отметку этого начисления")
     
     # Create virtual payment
@@ -375,7 +402,7 @@ async def mark_charge_as_paid(
     # Mark charge as paid
     charge.status = ChargeStatus.paid.value
     
-    await session.commit()
+    await session.flush()
     
     return payment
 
@@ -410,7 +437,6 @@ async def cancel_payment(
     """
     import logging
     from datetime import datetime
-    from bot.config import config
     from sqlalchemy import delete
     
     # LOCK PAYMENT ROW to prevent concurrent cancellation
@@ -438,7 +464,7 @@ async def cancel_payment(
         raise ValueError(f"Cannot cancel payment with status: {payment.status}")
     
     # Security check: OWNER or object owner
-    is_owner = admin_id in config.OWNER_IDS
+    is_owner = role_registry.is_owner(admin_id)
     is_object_owner = (
         payment.stay and 
         payment.stay.rental_object and 
@@ -497,7 +523,7 @@ async def cancel_payment(
     payment.meta_json['cancel_reason'] = reason
     payment.meta_json['original_status'] = payment.status
     
-    await session.commit()
+    await session.flush()
     
     import logging
     logging.info(f"Payment {payment_id} cancelled by admin {admin_id}. Reason: {reason}")
@@ -121,7 +121,7 @@ async def recalculate_charges_for_period(
         # For now, we SKIP comm recalculation or just preserve it.
         pass
 
-    await session.commit()
+    await session.flush()
     
     # 4. Re-allocate payments
     # Find all payments for this stay with unallocated_amount > 0
@@ -0,0 +1,231 @@
+"""
+Near-duplicate receipt detection.
+
+Every receipt photo gets a 64-bit perceptual hash (DCT pHash). Hashes are
+kept per stay in a BK-tree, so a new upload is compared by Hamming distance
+against the stay's earlier receipts before OCR runs. Re-photographed paper
+receipts and repeated screenshots land within a few bits of each other.
+
+The trees are per process. A stay's tree is read from the DB on first
+lookup; receipts stored by other replicas after that are not in it, so
+across replicas a duplicate is only caught when this process loads (or
+reloads, after LRU eviction) the stay from the database.
+"""
+import io
+import logging
+import math
+import operator
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database.models import PaymentReceipt, ReceiptDecision
+
+HASH_BITS = 64
+_SIDE = 32          # image is reduced to 32x32 before DCT
+_LOW = 8            # top-left 8x8 DCT coefficients form the hash
+
+# DCT-II basis rows for the low frequencies, computed once
+_DCT = [
+    [math.cos(math.pi * (2 * x + 1) * u / (2 * _SIDE)) for x in range(_SIDE)]
+    for u in range(_LOW)
+]
+
+
+def compute_phash(file_bytes: bytes) -> Optional[int]:
+    """64-bit pHash of an image, None if the bytes are not a readable image"""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(io.BytesIO(file_bytes)) as img:
+            img = ImageOps.exif_transpose(img)
+            small = img.convert("L").resize((_SIDE, _SIDE), Image.Resampling.LANCZOS)
+    except Exception as e:
+        logging.debug(f"pHash: not an image: {e}")
+        return None
+
+    pixels = small.tobytes()  # mode L: one byte per pixel, row by row
+    rows = [pixels[y * _SIDE:(y + 1) * _SIDE] for y in range(_SIDE)]
+
+    # Separable 2D DCT, low frequencies only: 8x32 then 8x8
+    partial = [[sum(map(operator.mul, basis, row)) for row in rows] for basis in _DCT]
+    coeffs = [
+        sum(map(operator.mul, basis_v, partial_u))
+        for basis_v in _DCT
+        for partial_u in partial
+    ]
+
+    # DC term carries overall brightness only
+    ac = coeffs[1:]
+    median = sorted(ac)[len(ac) // 2]
+    value = 0
+    for c in coeffs:
+        value = (value << 1) | (1 if c > median else 0)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def phash_to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def phash_from_hex(value: str) -> int:
+    return int(value, 16)
+
+
+@dataclass(slots=True)
+class HashEntry:
+    receipt_id: int
+    phash: int
+    created_at: datetime     # naive UTC
+    accepted: bool
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance"""
+
+    __slots__ = ("_root", "size")
+
+    def __init__(self):
+        # node = [entry, {distance: child_node}]
+        self._root: Optional[list] = None
+        self.size = 0
+
+    def add(self, entry: HashEntry):
+        self.size += 1
+        if self._root is None:
+            self._root = [entry, {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(entry.phash, node[0].phash)
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [entry, {}]
+                return
+            node = child
+
+    def search(self, phash: int, max_distance: int) -> List[Tuple[int, HashEntry]]:
+        """All entries within max_distance, closest first"""
+        found = []
+        stack = [self._root] if self._root else []
+        while stack:
+            entry, children = stack.pop()
+            d = hamming(phash, entry.phash)
+            if d <= max_distance:
+                found.append((d, entry))
+            low, high = d - max_distance, d + max_distance
+            for dist, child in children.items():
+                if low <= dist <= high:
+                    stack.append(child)
+        found.sort(key=lambda x: (x[0], -x[1].receipt_id))
+        return found
+
+
+def _naive_utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class ReceiptHashIndex:
+    """Per-stay BK-trees, loaded from DB on first lookup, LRU-bounded"""
+
+    def __init__(self, max_stays: int = 2048):
+        self.max_stays = max_stays
+        self._trees: "OrderedDict[int, BKTree]" = OrderedDict()
+
+    async def _tree(self, session: AsyncSession, stay_id: int) -> BKTree:
+        tree = self._trees.get(stay_id)
+        if tree is not None:
+            self._trees.move_to_end(stay_id)
+            return tree
+
+        stmt = select(
+            PaymentReceipt.id, PaymentReceipt.image_phash,
+            PaymentReceipt.created_at, PaymentReceipt.decision
+        ).where(
+            PaymentReceipt.stay_id == stay_id,
+            PaymentReceipt.image_phash.isnot(None)
+        )
+        result = await session.execute(stmt)
+
+        tree = BKTree()
+        for receipt_id, phash_hex, created_at, decision in result.all():
+            tree.add(HashEntry(
+                receipt_id=receipt_id,
+                phash=phash_from_hex(phash_hex),
+                created_at=_naive_utc(created_at),
+                accepted=decision in (ReceiptDecision.accepted, ReceiptDecision.accepted.value),
+            ))
+
+        self._trees[stay_id] = tree
+        if len(self._trees) > self.max_stays:
+            self._trees.popitem(last=False)
+        return tree
+
+    async def find_duplicate(
+        self,
+        session: AsyncSession,
+        stay_id: int,
+        phash: int,
+        max_distance: int,
+        since: Optional[datetime] = None
+    ) -> Optional[Tuple[int, HashEntry]]:
+        """Closest accepted receipt of this stay within max_distance (and not older than since)"""
+        tree = await self._tree(session, stay_id)
+        since = _naive_utc(since) if since else None
+        for distance, entry in tree.search(phash, max_distance):
+            if not entry.accepted:
+                continue
+            if since and entry.created_at < since:
+                continue
+            return distance, entry
+        return None
+
+    def add(self, stay_id: int, receipt_id: int, phash: int, accepted: bool,
+            created_at: Optional[datetime] = None):
+        """Register a freshly stored receipt (no-op if the stay isn't loaded yet)"""
+        tree = self._trees.get(stay_id)
+        if tree is not None:
+            tree.add(HashEntry(receipt_id, phash, _naive_utc(created_at), accepted))
+
+    def invalidate(self, stay_id: Optional[int] = None):
+        if stay_id is None:
+            self._trees.clear()
+        else:
+            self._trees.pop(stay_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "stays": len(self._trees),
+            "hashes": sum(t.size for t in self._trees.values()),
+        }
+
+
+# Global instance
+receipt_hash_index = ReceiptHashIndex()
+
+
+async def find_recent_duplicate(
+    session: AsyncSession,
+    stay_id: int,
+    phash: int
+) -> Optional[Tuple[int, HashEntry]]:
+    """Near-duplicate lookup with thresholds from config"""
+    from datetime import timedelta
+    from bot.config import config
+
+    since = datetime.now(timezone.utc) - timedelta(days=config.RECEIPT_DUP_WINDOW_DAYS)
+    return await receipt_hash_index.find_duplicate(
+        session, stay_id, phash, config.RECEIPT_DUP_MAX_DISTANCE, since=since
+    )
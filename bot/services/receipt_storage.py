@@ -0,0 +1,327 @@
+"""
+Receipt file storage.
+
+Original receipt bytes are kept content-addressed (sha256, two-level fan-out
+``ab/cd/<sha256>``) next to a WebP preview of images, which admins get
+instead of the full-size photo. Reprocessing, admin review and exports read from
+here instead of downloading the file from Telegram again.
+
+Backends: local directory (default, also the dev stand-in for S3) and any
+S3-compatible bucket (requires boto3).
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database.models import PaymentReceipt
+
+PREVIEW_SUFFIX = ".preview.webp"
+
+# Leading bytes -> extension for originals sent back as documents
+_MAGIC = (
+    (b"%PDF", ".pdf"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF8", ".gif"),
+)
+
+
+def blob_key(sha256: str, suffix: str = "") -> str:
+    """Fan-out key: ab/cd/abcdef...[suffix]"""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{suffix}"
+
+
+class BlobStore(ABC):
+    """Minimal key/bytes store; implementations are blocking and run in a thread"""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes):
+        pass
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file in the same directory, then rename (atomic)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def delete(self, key: str):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore(BlobStore):
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 access_key: Optional[str] = None, secret_key: Optional[str] = None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+        )
+
+    def put(self, key: str, data: bytes):
+        self._client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            obj = self._client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self._client.exceptions.NoSuchKey:
+            return None
+        return obj["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except ClientError:
+            return False
+
+    def delete(self, key: str):
+        self._client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+def file_extension(data: bytes) -> str:
+    """Extension matching the file's content (.bin when unknown)"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    if data[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return ".heic"
+    for magic, extension in _MAGIC:
+        if data.startswith(magic):
+            return extension
+    return ".bin"
+
+
+def render_image(data: bytes, max_side: int, fmt: str, quality: int) -> Optional[bytes]:
+    """Downscaled copy of an image (keeps aspect ratio), None if not an image"""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, fmt, quality=quality, **({"method": 4} if fmt == "WEBP" else {"optimize": True}))
+            return out.getvalue()
+    except Exception as e:
+        logging.debug(f"Receipt storage: cannot render {fmt}: {e}")
+        return None
+
+
+@dataclass(frozen=True)
+class StoredReceipt:
+    sha256: str
+    size: int
+    has_preview: bool
+
+
+class ReceiptStorage:
+    def __init__(self, store: BlobStore, preview_size: int = 1280):
+        self.store = store
+        self.preview_size = preview_size
+
+    def _save_sync(self, data: bytes) -> StoredReceipt:
+        sha = hashlib.sha256(data).hexdigest()
+        key = blob_key(sha)
+        if not self.store.exists(key):
+            self.store.put(key, data)
+
+        # Also re-rendered when an earlier save stored the original only
+        preview_key = blob_key(sha, PREVIEW_SUFFIX)
+        if self.store.exists(preview_key):
+            return StoredReceipt(sha, len(data), True)
+        preview = render_image(data, self.preview_size, "WEBP", 80)
+        if preview:
+            self.store.put(preview_key, preview)
+        return StoredReceipt(sha, len(data), preview is not None)
+
+    async def save(self, data: bytes) -> StoredReceipt:
+        """Store original + preview; idempotent for identical bytes, fills in a missing preview"""
+        return await asyncio.to_thread(self._save_sync, data)
+
+    async def original(self, sha256: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.store.get, blob_key(sha256))
+
+    async def preview(self, sha256: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.store.get, blob_key(sha256, PREVIEW_SUFFIX))
+
+    def _purge_sync(self, sha256: str):
+        for suffix in ("", PREVIEW_SUFFIX):
+            self.store.delete(blob_key(sha256, suffix))
+
+    async def purge(self, sha256: str):
+        await asyncio.to_thread(self._purge_sync, sha256)
+
+
+_storage: Optional[ReceiptStorage] = None
+_storage_ready = False
+
+
+def get_receipt_storage() -> Optional[ReceiptStorage]:
+    """Configured storage or None if RECEIPT_STORAGE=off"""
+    global _storage, _storage_ready
+    if _storage_ready:
+        return _storage
+
+    from bot.config import config
+
+    backend = config.RECEIPT_STORAGE
+    store: Optional[BlobStore] = None
+    try:
+        if backend == "local":
+            store = LocalBlobStore(config.RECEIPT_STORAGE_DIR)
+        elif backend == "s3":
+            store = S3BlobStore(
+                bucket=config.S3_BUCKET,
+                prefix=config.S3_PREFIX,
+                endpoint_url=config.S3_ENDPOINT_URL,
+                access_key=config.S3_ACCESS_KEY,
+                secret_key=config.S3_SECRET_KEY,
+            )
+        elif backend != "off":
+            logging.warning(f"Unknown RECEIPT_STORAGE={backend!r}, receipt files will not be stored")
+    except ImportError:
+        logging.warning("RECEIPT_STORAGE=s3 requires boto3, receipt files will not be stored")
+
+    _storage = ReceiptStorage(store, config.RECEIPT_PREVIEW_SIZE) if store else None
+    _storage_ready = True
+    return _storage
+
+
+async def fetch_receipt_file(
+    bot,
+    file_id: str,
+    blob_sha256: Optional[str] = None
+) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    (bytes, sha256) of a receipt file: local store first, Telegram as fallback.
+    Files fetched from Telegram are stored; sha256 is None if storage is off.
+    """
+    storage = get_receipt_storage()
+    if storage and blob_sha256:
+        data = await storage.original(blob_sha256)
+        if data is not None:
+            return data, blob_sha256
+
+    if bot is None:
+        return None, None
+    try:
+        file_info = await bot.get_file(file_id)
+        downloaded = await bot.download_file(file_info.file_path)
+        data = downloaded.read()
+    except Exception as e:
+        logging.warning(f"Receipt file {file_id}: download from Telegram failed: {e}")
+        return None, None
+
+    if storage:
+        return data, (await storage.save(data)).sha256
+    return data, None
+
+
+async def load_receipt_bytes(session: AsyncSession, bot, receipt: PaymentReceipt) -> Optional[bytes]:
+    """Original receipt bytes; links a freshly stored file to the receipt"""
+    data, sha256 = await fetch_receipt_file(bot, receipt.file_id, receipt.blob_sha256)
+    if sha256 and sha256 != receipt.blob_sha256:
+        receipt.blob_sha256 = sha256
+        await session.flush()
+    return data
+
+
+async def apply_retention(session: AsyncSession, days: int) -> int:
+    """
+    Delete stored files of receipts older than `days`.
+    A blob shared with a newer receipt is kept. Returns number of purged blobs.
+    """
+    storage = get_receipt_storage()
+    if not storage or days <= 0:
+        return 0
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+
+    old_stmt = select(PaymentReceipt.blob_sha256).where(
+        PaymentReceipt.blob_sha256.isnot(None),
+        PaymentReceipt.created_at < cutoff
+    ).distinct()
+    old = {row[0] for row in (await session.execute(old_stmt)).all()}
+    if not old:
+        return 0
+
+    keep_stmt = select(PaymentReceipt.blob_sha256).where(
+        PaymentReceipt.blob_sha256.in_(old),
+        PaymentReceipt.created_at >= cutoff
+    ).distinct()
+    keep = {row[0] for row in (await session.execute(keep_stmt)).all()}
+
+    expired: List[str] = sorted(old - keep)
+    for sha in expired:
+        await storage.purge(sha)
+
+    if expired:
+        await session.execute(
+            update(PaymentReceipt)
+            .where(PaymentReceipt.blob_sha256.in_(expired))
+            .values(blob_sha256=None)
+        )
+        await session.flush()
+
+    logging.info(f"Receipt retention: purged {len(expired)} file(s) older than {days} days")
+    return len(expired)
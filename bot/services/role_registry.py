@@ -0,0 +1,62 @@
+"""
+Role registry.
+
+One in-memory view of who is an owner or admin, read by AdminFilter, the
+middlewares and the services on every update. It is seeded from .env at
+import, filled from the users table at startup and rebuilt by
+reload_admin_cache after admin changes. A rebuild swaps the whole snapshot
+in one assignment, so readers see either the old roles or the new ones,
+never a mix, and never touch the database.
+"""
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable
+
+
+@dataclass(frozen=True, slots=True)
+class Roles:
+    """Immutable snapshot; `admins` includes owners"""
+    owners: FrozenSet[int] = frozenset()
+    admins: FrozenSet[int] = frozenset()
+
+    @classmethod
+    def build(cls, owners: Iterable[int] = (), admins: Iterable[int] = ()) -> "Roles":
+        owners = frozenset(owners)
+        return cls(owners=owners, admins=owners | frozenset(admins))
+
+
+class RoleRegistry:
+    def __init__(self, owners: Iterable[int] = (), admins: Iterable[int] = ()):
+        self._roles = Roles.build(owners, admins)
+
+    @property
+    def roles(self) -> Roles:
+        return self._roles
+
+    @property
+    def owner_ids(self) -> FrozenSet[int]:
+        return self._roles.owners
+
+    @property
+    def admin_ids(self) -> FrozenSet[int]:
+        """Owners and admins"""
+        return self._roles.admins
+
+    def is_owner(self, tg_id: int) -> bool:
+        return tg_id in self._roles.owners
+
+    def is_admin(self, tg_id: int) -> bool:
+        """Admin or owner"""
+        return tg_id in self._roles.admins
+
+    def replace(self, owners: Iterable[int], admins: Iterable[int]) -> Roles:
+        """Swap in a new snapshot atomically"""
+        self._roles = Roles.build(owners, admins)
+        return self._roles
+
+
+def _registry_from_config() -> RoleRegistry:
+    from bot.config import config
+    return RoleRegistry(owners=config._env_owner_ids, admins=config._env_admin_ids)
+
+
+role_registry = _registry_from_config()
@@ -86,7 +86,7 @@ async def assign_rso_to_object(
         session.add(link)
         created_links.append(link)
     
-    await session.commit()
+    await session.flush()
     return created_links
 
 
@@ -106,7 +106,6 @@ async def remove_rso_from_object(
         ObjectRSOLink.provider_id == provider_id
     )
     result = await session.execute(stmt)
-    await session.commit()
     
     return result.rowcount > 0
 
@@ -133,7 +132,7 @@ async def create_uk_rso_link(
     
     link = UKRSOLink(uk_id=uk_id, provider_id=provider_id)
     session.add(link)
-    await session.commit()
+    await session.flush()
     return link
 
 
@@ -158,7 +157,7 @@ async def update_rso_account_details(
         
     link.account_number = account_number
     link.personal_account = account_number # Sync with new field
-    await session.commit()
+    await session.flush()
     return True
 
 async def create_provider(
@@ -177,7 +176,7 @@ async def create_provider(
         object_id=None # Global provider
     )
     session.add(provider)
-    await session.commit()
+    await session.flush()
     return provider
 
 
@@ -17,7 +17,7 @@ async def get_tenant_settings(session: AsyncSession, tenant_id: int) -> TenantSe
     if not settings:
         settings = TenantSettings(tenant_id=tenant_id)
         session.add(settings)
-        await session.commit()
+        await session.flush()
     
     return settings
 
@@ -42,7 +42,7 @@ async def update_tenant_settings(
     if reminder_days is not None:
         settings.reminder_days = reminder_days
     
-    await session.commit()
+    await session.flush()
     return settings
 
 
@@ -76,7 +76,7 @@ async def toggle_service(session: AsyncSession, stay_id: int, provider_id: int,
     else:
         sub.enabled = enabled
     
-    await session.commit()
+    await session.flush()
     return sub
 
 
@@ -95,4 +95,4 @@ async def create_default_subscriptions(session: AsyncSession, stay_id: int, obje
         )
         session.add(sub)
     
-    await session.commit()
+    await session.flush()
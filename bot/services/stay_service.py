@@ -8,13 +8,13 @@ from bot.database.models import (
     RentalObject, ObjectSettings, TenantStay, StayStatus, 
     ObjectStatus, StayOccupant, Tenant
 )
+from bot.services.role_registry import role_registry
 
 async def create_object(session: AsyncSession, admin_id: int, address: str) -> RentalObject:
     """Create a new rental object with default settings.
     Only admins can create objects.
     """
     import logging
-    from bot.config import config
     
     # INPUT VALIDATION
     if not address or len(address) < 5:
@@ -23,7 +23,7 @@ async def create_object(session: AsyncSession, admin_id: int, address: str) -> R
         raise ValueError("Address too long (max 500 characters)")
     
     # PERMISSION CHECK: Only admins can create objects
-    if admin_id not in (config.OWNER_IDS + config.ADMIN_IDS):
+    if not role_registry.is_admin(admin_id):
         logging.warning(f"Permission denied: user {admin_id} tried to create object")
         raise PermissionError("Only admins can create objects")
     
@@ -34,7 +34,7 @@ async def create_object(session: AsyncSession, admin_id: int, address: str) -> R
     # Create default settings
     settings = ObjectSettings(object_id=obj.id)
     session.add(settings)
-    await session.commit()
+    await session.flush()
     return obj
 
 async def get_all_objects(session: AsyncSession, owner_id: Optional[int] = None) -> List[RentalObject]:
@@ -65,7 +65,6 @@ async def create_stay(
     """
     
     import logging
-    from bot.config import config
     
     # INPUT VALIDATION
     if rent_amount <= 0:
@@ -98,7 +97,7 @@ async def create_stay(
         raise ValueError(f"Объект ID {object_id} не найден")
     
     # PERMISSION CHECK: Only object owner or OWNER can create stay
-    if admin_id not in config.OWNER_IDS and rental_object.owner_id != admin_id:
+    if not role_registry.is_owner(admin_id) and rental_object.owner_id != admin_id:
         logging.warning(f"Permission denied: admin {admin_id} tried to create stay on object {object_id} owned by {rental_object.owner_id}")
         raise PermissionError("Only object owner can create stay")
     
@@ -146,7 +145,7 @@ async def create_stay(
         .values(status=ObjectStatus.occupied.value)
     )
     
-    await session.commit()
+    await session.flush()
     return stay
 
 async def end_stay(session: AsyncSession, stay_id: int, admin_id: int) -> TenantStay:
@@ -156,7 +155,6 @@ async def end_stay(session: AsyncSession, stay_id: int, admin_id: int) -> Tenant
     Checks permissions (only object owner or OWNER can end stay).
     """
     import logging
-    from bot.config import config
     
     # LOCK STAY ROW to prevent concurrent end_stay calls
     lock_stmt = (
@@ -175,7 +173,7 @@ async def end_stay(session: AsyncSession, stay_id: int, admin_id: int) -> Tenant
     if not stay.rental_object:
         raise ValueError("Rental object not found")
     
-    if admin_id not in config.OWNER_IDS and stay.rental_object.owner_id != admin_id:
+    if not role_registry.is_owner(admin_id) and stay.rental_object.owner_id != admin_id:
         logging.warning(f"Permission denied: admin {admin_id} tried to end stay {stay_id} on object owned by {stay.rental_object.owner_id}")
         raise PermissionError("Only object owner can end stay")
     
@@ -202,7 +200,7 @@ async def end_stay(session: AsyncSession, stay_id: int, admin_id: int) -> Tenant
         .values(status=ObjectStatus.free.value)
     )
     
-    await session.commit()
+    await session.flush()
     
     return stay
 
@@ -255,7 +253,7 @@ async def add_occupant(
         receive_meter_reminders=receive_meter
     )
     session.add(occupant)
-    await session.commit()
+    await session.flush()
     return occupant
 
 
@@ -300,7 +298,7 @@ async def remove_occupant(
         if co_tenant:
             co_tenant.role = "primary"
     
-    await session.commit()
+    await session.flush()
 
 
 async def get_active_occupants(
@@ -333,7 +331,6 @@ async def update_occupant_preferences(
     Only the occupant themselves or admins can update preferences.
     """
     import logging
-    from bot.config import config
     
     stmt = (
         select(StayOccupant)
@@ -351,7 +348,7 @@ async def update_occupant_preferences(
         raise ValueError("Tenant not found for occupant")
     
     is_own_preferences = occupant.tenant.tg_id == requesting_tg_id
-    is_admin = requesting_tg_id in (config.OWNER_IDS + config.ADMIN_IDS)
+    is_admin = role_registry.is_admin(requesting_tg_id)
     
     if not (is_own_preferences or is_admin):
         logging.warning(f"Permission denied: user {requesting_tg_id} tried to update preferences for occupant {occupant_id} (tenant {occupant.tenant.tg_id})")
@@ -364,5 +361,5 @@ async def update_occupant_preferences(
     if receive_meter is not None:
         occupant.receive_meter_reminders = receive_meter
     
-    await session.commit()
+    await session.flush()
     return occupant
@@ -16,7 +16,7 @@ async def create_support_message(
         is_read_by_tenant=(from_role == Role.tenant)
     )
     session.add(msg)
-    await session.commit()
+    await session.flush()
     return msg
 
 async def get_chat_history(session: AsyncSession, stay_id: int):
@@ -2,6 +2,7 @@ from datetime import datetime, timezone
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.database.models import Tenant, TenantStatus
+from bot.services.identity_cache import invalidate_tenant
 
 async def get_tenant_by_tg_id(session: AsyncSession, tg_id: int) -> Tenant | None:
     stmt = select(Tenant).where(Tenant.tg_id == tg_id)
@@ -37,7 +38,9 @@ async def get_or_create_tenant(session: AsyncSession, tg_user) -> Tenant:
     
     result = await session.execute(stmt)
     tenant = result.scalar_one()
-    await session.commit()
+    await session.flush()
+    # "Not a tenant" may be cached for this user
+    invalidate_tenant(session, tg_id=tg_user.id, tenant_id=tenant.id)
     
     return tenant
 
@@ -50,5 +53,6 @@ async def set_tenant_consent(session: AsyncSession, tenant_id: int, status: bool
         if status:
             tenant.consent_date = datetime.now(timezone.utc)
             tenant.consent_version = "1.0"
-        await session.commit()
+        await session.flush()
+        invalidate_tenant(session, tg_id=tenant.tg_id, tenant_id=tenant.id)
     return tenant
@@ -6,6 +6,8 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.database.models import User, UserRole
 from bot.database.core import AsyncSessionLocal
+from bot.services.cache_backend import CacheBackend, get_cache_backend
+from bot.services.role_registry import role_registry
 
 
 async def get_user_by_tg_id(session: AsyncSession, tg_id: int) -> Optional[User]:
@@ -40,38 +42,32 @@ async def create_admin(
         is_active=True
     )
     session.add(user)
-    await session.commit()
+    await session.flush()
     return user
 
 
 async def deactivate_admin(session: AsyncSession, tg_id: int) -> bool:
     """Deactivate admin (soft delete)"""
-    from bot.config import config
-    
     # SECURITY: Cannot deactivate OWNER
-    if tg_id in config.OWNER_IDS:
+    if role_registry.is_owner(tg_id):
         return False
     
     user = await get_user_by_tg_id(session, tg_id)
     if user:
         user.is_active = False
-        await session.commit()
+        await session.flush()
         return True
     return False
 
 
 async def is_owner(tg_id: int) -> bool:
-    """Check if user is owner"""
-    async with AsyncSessionLocal() as session:
-        user = await get_user_by_tg_id(session, tg_id)
-        return user is not None and user.role == UserRole.owner.value
+    """Check if user is owner (role registry, no DB query)"""
+    return role_registry.is_owner(tg_id)
 
 
 async def is_admin_or_owner(tg_id: int) -> bool:
-    """Check if user is admin or owner"""
-    async with AsyncSessionLocal() as session:
-        user = await get_user_by_tg_id(session, tg_id)
-        return user is not None and user.role in [UserRole.owner.value, UserRole.admin.value]
+    """Check if user is admin or owner (role registry, no DB query)"""
+    return role_registry.is_admin(tg_id)
 
 
 async def get_admin_ids() -> List[int]:
@@ -81,36 +77,54 @@ async def get_admin_ids() -> List[int]:
         return [admin.tg_id for admin in admins]
 
 
-async def reload_admin_cache(session: AsyncSession = None) -> int:
+ROLES_CHANNEL = "roles"
+
+
+async def reload_admin_cache(session: AsyncSession = None, broadcast: bool = True) -> int:
     """
-    Reload admin list in runtime config from DB.
+    Rebuild the role registry from .env and the users table.
     
-    This is the ONLY function that should modify config.ADMIN_IDS/OWNER_IDS
-    after bot startup. Call this after adding/removing admins.
+    This is the ONLY function that should change roles after bot startup.
+    Call this after adding/removing admins. The new snapshot replaces the
+    old one in a single assignment; with a shared cache backend the other
+    replicas are told to reload too (unless broadcast=False), once the
+    caller's session commits, so they read the change from the database.
     
     Returns:
         Number of admins loaded
     """
     from bot.config import config
+    from bot.database import uow
     from bot.database.core import AsyncSessionLocal
     
     if session is None:
         async with AsyncSessionLocal() as session:
-            return await reload_admin_cache(session)
+            count = await reload_admin_cache(session, broadcast=False)
+        backend = get_cache_backend()
+        if broadcast and backend.shared:
+            await backend.publish(ROLES_CHANNEL, "reload")
+        return count
     
     admins = await get_all_admins(session)
     
-    # Collect new lists from DB
-    db_admin_ids = []
-    db_owner_ids = []
-    
-    for user in admins:
-        if user.role == 'owner':
-            db_owner_ids.append(user.tg_id)
-        db_admin_ids.append(user.tg_id)  # All users (including owners) are admins
+    # All users (including owners) are admins; env-defined IDs are preserved
+    db_owner_ids = [user.tg_id for user in admins if user.role == UserRole.owner.value]
+    role_registry.replace(
+        owners=config._env_owner_ids + db_owner_ids,
+        admins=config._env_admin_ids + [user.tg_id for user in admins],
+    )
     
-    # Update config (preserve env-defined IDs, add DB IDs)
-    config.ADMIN_IDS = list(set(config._env_admin_ids + db_admin_ids))
-    config.OWNER_IDS = list(set(config._env_owner_ids + db_owner_ids))
+    backend = get_cache_backend()
+    if broadcast and backend.shared:
+        # Before the commit the other replicas would reload the old rows
+        uow.on_commit(session, lambda: backend.publish_soon(ROLES_CHANNEL, "reload"))
     
     return len(admins)
+
+
+async def subscribe_role_reloads(backend: CacheBackend):
+    """Reload roles when another replica changed admins"""
+    async def on_message(message: str):
+        await reload_admin_cache(broadcast=False)
+
+    await backend.subscribe(ROLES_CHANNEL, on_message)
@@ -0,0 +1,126 @@
+"""
+Graceful shutdown.
+
+On SIGTERM (a deploy, ``docker stop``) aiogram used to close the FSM
+storage at once and asyncio.run() cancelled whatever was still running: a
+receipt halfway through OCR, a payment approval between its commit and the
+tenant's notification, the daily billing run. GracefulShutdown instead
+spends up to SHUTDOWN_TIMEOUT on:
+
+1. intake: polling stops (aiogram's signal handlers), the webhook answers
+   503 so Telegram redelivers elsewhere;
+2. drain, concurrently: in-flight updates finish (with their OCR and the
+   notifications they send), and a running scheduled job finishes while no
+   new one starts;
+3. the scheduler task is cancelled, releasing the leader lease at once;
+4. aiogram's own shutdown closes the FSM storage and per-user locks;
+5. close(): the polling offset is confirmed up to the first unfinished
+   update, pending cache publishes and
+   Sentry events are sent, final counters are logged, and the Bot API
+   session, cache backend and DB pools are closed.
+
+Notifications have no outbox: handlers and jobs send them inline, so
+draining those covers them. Prometheus pulls, so the counters are logged on
+exit instead of being pushed.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.event.handler import HandlerObject
+
+from bot.middlewares.inflight import InFlightMiddleware
+from bot.services.cache_backend import CacheBackend
+
+
+async def _step(step: str, work: Awaitable):
+    try:
+        await work
+    except Exception as e:
+        logging.error(f"Shutdown step {step} failed: {e}")
+
+
+class GracefulShutdown:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.in_flight = InFlightMiddleware()
+        # run_scheduler() task, stopped after its current run
+        self.scheduler: Optional[asyncio.Task] = None
+        # None until drain() ran; then whether every update finished
+        self.drained: Optional[bool] = None
+        self._deadline: Optional[float] = None
+
+    def begin(self):
+        """Start the shutdown clock (the first call wins)"""
+        if self._deadline is None:
+            self._deadline = time.monotonic() + self.timeout
+
+    def remaining(self) -> float:
+        self.begin()
+        return max(0.0, self._deadline - time.monotonic())
+
+    def install(self, dp: Dispatcher):
+        """Track updates (outermost middleware) and drain on dp shutdown"""
+        # Ahead of aiogram's FSMContextMiddleware, which holds updates on the
+        # per-user lock: those are in flight too
+        middlewares = dp.update.outer_middleware
+        registered = list(middlewares)
+        for middleware in registered:
+            middlewares.unregister(middleware)
+        middlewares.register(self.in_flight)
+        for middleware in registered:
+            middlewares.register(middleware)
+        dp["graceful_shutdown"] = self
+        # aiogram registers fsm.close as the first shutdown handler; updates
+        # still running would lose their FSM storage and per-user locks
+        dp.shutdown.handlers.insert(0, HandlerObject(callback=self.drain))
+
+    async def drain(self) -> bool:
+        """Wait for in-flight updates and the scheduled run, then stop the scheduler"""
+        from bot import cron, metrics
+
+        self.begin()
+        logging.info(f"Shutting down: {self.in_flight.in_flight} updates in flight, waiting up to {self.remaining():.0f}s")
+        updates_done, run_done = await asyncio.gather(
+            self.in_flight.drain(self.remaining()),
+            cron.finish_current_run(self.remaining()),
+        )
+        if not updates_done:
+            ocr = metrics.ocr_in_flight.values.get((), 0)
+            logging.warning(f"Shutdown timeout: {self.in_flight.in_flight} updates still running ({ocr} in OCR)")
+        if not run_done:
+            logging.warning("Shutdown timeout: interrupting the scheduled run")
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+            try:
+                await self.scheduler  # releases the lease so a standby takes over at once
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logging.error(f"Scheduler failed: {e}")
+        self.drained = updates_done
+        return updates_done
+
+    async def close(self, bot: Bot, cache_backend: CacheBackend, confirm_offset: bool = False):
+        """After dp shutdown: flush and close every connection this process holds"""
+        from bot import metrics, tracing
+        from bot.database.core import engine, replica_engine
+
+        offset = self.in_flight.confirmable_offset()
+        if confirm_offset and offset is not None:
+            # Updates handled since the last getUpdates would come back on
+            # restart; unfinished ones (and any after them) should
+            await _step("offset", bot.get_updates(offset=offset, limit=1, timeout=0))
+        await _step("cache", cache_backend.close())
+        await _step("tracing", tracing.flush(max(1.0, self.remaining())))
+
+        errors = int(sum(metrics.handler_errors.values.values()))
+        api_errors = int(sum(metrics.telegram_errors.values.values()))
+        logging.info(f"Stopped: {self.in_flight.handled} updates handled, {errors} handler errors, {api_errors} Bot API errors")
+
+        await _step("bot", bot.session.close())
+        for db_engine in (engine, replica_engine):
+            if db_engine is not None:
+                await _step("db", db_engine.dispose())
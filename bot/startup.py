@@ -0,0 +1,146 @@
+"""
+Process startup: event loop, concurrent warm-up and a timing breakdown.
+
+install_uvloop() makes asyncio.run() use uvloop (EVENT_LOOP=uvloop, the
+default where it is installed). warm_up() runs the independent startup
+steps at the same time instead of leaving them to the first updates:
+
+* admins   role registry from .env and the users table
+* ocr      OCR provider probe (Ollama /api/tags, tesseract --version), which
+           the first receipt would otherwise wait for
+* db       DB_WARMUP_CONNECTIONS pool connections opened (replica too)
+* modules  optional libraries of enabled features imported in a thread
+           (Pillow for receipts, boto3 for RECEIPT_STORAGE=s3); those of
+           disabled features (bs4, pytesseract without tesseract) never are
+
+A failed step is logged and startup goes on; connections and imports then
+happen on first use as before. startup_timer collects imports, dispatcher setup and warm-up
+times for the "Started" log line.
+"""
+import asyncio
+import importlib
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import Awaitable, Dict, List, Optional
+
+
+class StartupTimer:
+    """Wall time of consecutive startup phases (mark) and of warm-up steps"""
+
+    def __init__(self):
+        self.started = self._last = time.perf_counter()
+        self.loop = "asyncio"
+        self.phases: Dict[str, float] = {}
+        self.warm_up: Dict[str, float] = {}
+
+    def mark(self, phase: str):
+        """End a phase: the time since the previous mark (or process start)"""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def summary(self) -> str:
+        parts = []
+        for phase, seconds in self.phases.items():
+            part = f"{phase} {seconds:.2f}s"
+            if phase == "warm_up" and self.warm_up:
+                part += " [" + ", ".join(f"{step} {s:.2f}s" for step, s in self.warm_up.items()) + "]"
+            parts.append(part)
+        total = self._last - self.started
+        return f"Started on {self.loop} in {total:.2f}s: " + ", ".join(parts)
+
+
+startup_timer = StartupTimer()
+
+
+def install_uvloop() -> bool:
+    """Use uvloop for every asyncio.run() in this process (and forked workers)"""
+    from bot.config import config
+
+    if config.EVENT_LOOP != "uvloop":
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    startup_timer.loop = "uvloop"
+    return True
+
+
+async def _timed(step: str, work: Awaitable) -> bool:
+    started = time.perf_counter()
+    try:
+        await work
+        return True
+    except Exception as e:
+        logging.error(f"Startup step {step} failed: {e}")
+        return False
+    finally:
+        startup_timer.warm_up[step] = time.perf_counter() - started
+
+
+async def _load_admins():
+    from bot.database.core import AsyncSessionLocal
+    from bot.services.user_service import reload_admin_cache
+
+    async with AsyncSessionLocal() as session:
+        count = await reload_admin_cache(session, broadcast=False)
+    logging.info(f"Loaded {count} admins from DB.")
+
+
+async def _init_ocr():
+    # Looked up at call time: benchmarks swap in their own manager
+    from bot.services import ocr
+
+    await ocr.ocr_manager.initialize()
+
+
+async def _open_connections(engine, count: int):
+    """Check out count connections at once, so the pool keeps that many open"""
+    from sqlalchemy import text
+
+    async with AsyncExitStack() as stack:
+        connections = [await stack.enter_async_context(engine.connect()) for _ in range(count)]
+        await asyncio.gather(*(connection.execute(text("SELECT 1")) for connection in connections))
+
+
+async def _warm_db(count: int):
+    from bot.database.core import engine, replica_engine
+
+    engines = [engine] + ([replica_engine] if replica_engine is not None else [])
+    await asyncio.gather(*(_open_connections(e, count) for e in engines))
+
+
+def feature_modules() -> List[str]:
+    """Optional libraries needed by the features enabled in config"""
+    from bot.config import config
+
+    modules = ["PIL.Image", "PIL.ImageOps"]  # receipt phash and previews
+    if config.RECEIPT_STORAGE == "s3":
+        modules.append("boto3")
+    return modules
+
+
+def _import_modules(modules: List[str]):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logging.warning(f"Optional module {name} is not installed: {e}")
+
+
+async def warm_up(db_connections: Optional[int] = None):
+    """Admins, OCR probe, DB pool and feature modules, concurrently"""
+    from bot.config import config
+
+    db_connections = config.DB_WARMUP_CONNECTIONS if db_connections is None else db_connections
+    steps = {
+        "admins": _load_admins(),
+        "ocr": _init_ocr(),
+        "modules": asyncio.to_thread(_import_modules, feature_modules()),
+    }
+    if db_connections > 0:
+        steps["db"] = _warm_db(db_connections)
+    await asyncio.gather(*(_timed(step, work) for step, work in steps.items()))
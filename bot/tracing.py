@@ -0,0 +1,118 @@
+"""
+Performance tracing through Sentry.
+
+With SENTRY_DSN set, init_tracing() starts the SDK with
+SENTRY_TRACES_SAMPLE_RATE and these spans:
+
+* a transaction per update (TracingMiddleware), named after the handler
+  that ran (e.g. "admin.approve_payment"), and one per scheduled job;
+* child spans per SQL statement (SqlalchemyIntegration), per outgoing HTTP
+  call to DaData/Kvartplata/Ollama/GIS (AioHttpIntegration), per Bot API
+  call (TracingRequestMiddleware) and per OCR provider call.
+
+AsyncioIntegration copies the trace into tasks, and asyncio.to_thread copies
+it into OCR worker threads, so their spans land under the update that
+started them. Bot tokens are scrubbed from URLs before anything is sent.
+
+Without SENTRY_DSN the helpers return nullcontext() and nothing is imported.
+"""
+import asyncio
+import logging
+import re
+from contextlib import nullcontext
+from typing import Any, ContextManager, Optional
+
+_BOT_TOKEN_RE = re.compile(r"/bot\d+:[\w-]+")
+
+_enabled = False
+
+
+def _scrub(value: Any) -> Any:
+    """Replace bot tokens in every string of a Sentry event"""
+    if isinstance(value, str):
+        return _BOT_TOKEN_RE.sub("/bot<token>", value)
+    if isinstance(value, dict):
+        return {key: _scrub(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_scrub(item) for item in value]
+    return value
+
+
+def _before_send(event, hint):
+    return _scrub(event)
+
+
+def _traces_sampler(sampling_context) -> float:
+    from bot.config import config
+
+    op = sampling_context.get("transaction_context", {}).get("op")
+    # aiohttp server transactions (webhook POSTs, health checks) only ack;
+    # the work is traced by the update's own transaction
+    if op == "http.server":
+        return 0.0
+    return config.SENTRY_TRACES_SAMPLE_RATE
+
+
+def init_tracing() -> bool:
+    """Start Sentry if SENTRY_DSN is set; True when tracing is on"""
+    global _enabled
+    from bot.config import config
+
+    if not config.SENTRY_DSN:
+        return False
+    try:
+        import sentry_sdk
+        from sentry_sdk.integrations.aiohttp import AioHttpIntegration
+        from sentry_sdk.integrations.asyncio import AsyncioIntegration
+        from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
+    except ImportError:
+        logging.warning("SENTRY_DSN is set but sentry-sdk is not installed (pip install sentry-sdk)")
+        return False
+
+    sentry_sdk.init(
+        dsn=config.SENTRY_DSN,
+        environment=config.SENTRY_ENVIRONMENT,
+        traces_sampler=_traces_sampler,
+        integrations=[AsyncioIntegration(), AioHttpIntegration(), SqlalchemyIntegration()],
+        before_send=_before_send,
+        before_send_transaction=_before_send,
+        send_default_pii=False,
+    )
+    _enabled = True
+    logging.info(f"Sentry tracing on: {config.SENTRY_ENVIRONMENT}, sample rate {config.SENTRY_TRACES_SAMPLE_RATE}")
+    return True
+
+
+def transaction(op: str, name: str) -> ContextManager:
+    """Root span (an update, a scheduled job)"""
+    if not _enabled:
+        return nullcontext()
+    import sentry_sdk
+    return sentry_sdk.start_transaction(op=op, name=name)
+
+
+def span(op: str, name: str) -> ContextManager:
+    """Child span of whatever is running; a no-op outside a transaction"""
+    if not _enabled:
+        return nullcontext()
+    import sentry_sdk
+    return sentry_sdk.start_span(op=op, name=name)
+
+
+def set_transaction_name(name: str, user_id: Optional[int] = None):
+    if not _enabled:
+        return
+    import sentry_sdk
+    scope = sentry_sdk.get_current_scope()
+    if scope.transaction is not None:
+        scope.transaction.name = name
+    if user_id is not None:
+        scope.set_user({"id": str(user_id)})
+
+
+async def flush(timeout: float = 2.0):
+    """Send queued events and spans before the process exits"""
+    if not _enabled:
+        return
+    import sentry_sdk
+    await asyncio.to_thread(sentry_sdk.flush, timeout)
@@ -0,0 +1,263 @@
+"""
+Webhook mode.
+
+    BOT_MODE=webhook python -m bot.main
+
+An aiohttp server takes updates on WEBHOOK_PATH. It checks Telegram's
+secret-token header against WEBHOOK_SECRET (required: without it anyone
+could post updates as an owner), acknowledges at once and lets the dispatcher process
+the update in the background. The parent process binds the listening socket
+once and forks WEBHOOK_WORKERS workers that all accept on it. Worker 0
+registers the webhook with Telegram; the scheduler runs in whichever
+process holds the leader lease (bot/database/leader.py). More than one
+worker requires CACHE_BACKEND_URL: role reloads, cache invalidation, FSM
+state, per-user locks and rate limits are only shared through it.
+
+    POST {WEBHOOK_PATH}   updates (401 on a bad secret, 503 while draining)
+    GET  /healthz         liveness and counters
+    GET  /readyz          readiness (503 while draining)
+    GET  /metrics         Prometheus metrics of this worker (worker="N" label)
+
+On SIGTERM/SIGINT a worker stops taking updates (503, so Telegram redelivers
+them), waits up to SHUTDOWN_TIMEOUT for in-flight ones and the scheduled run
+and shuts down (see bot/shutdown.py).
+Polling (the default BOT_MODE) stays for development.
+
+Local check with a recorded update:
+
+    curl -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \\
+         -H "Content-Type: application/json" -d @update.json \\
+         http://localhost:8080/telegram/webhook
+"""
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Any, Dict, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from bot.config import config
+from bot import metrics
+from bot.metrics import metrics_view
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    def __init__(self, dp: Dispatcher, bot: Bot, path: str = "/telegram/webhook", secret: str = "", leader=None):
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET is required in webhook mode")
+        self.dp = dp
+        self.bot = bot
+        self.leader = leader
+        self.path = path
+        self.secret = secret
+        self.draining = False
+        self.started = time.monotonic()
+        self._tasks: Set[asyncio.Task] = set()
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.healthz)
+        app.router.add_get("/readyz", self.readyz)
+        app.router.add_get("/metrics", metrics_view)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            self.rejected += 1
+            return web.Response(status=401)
+        if self.draining:
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError:
+            return web.Response(status=400)
+
+        self.received += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response(status=200)
+
+    async def _process(self, update: Update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logging.exception(f"Webhook update {update.update_id} failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.monotonic() - self.started, 1),
+            "draining": self.draining,
+            "in_flight": len(self._tasks),
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "scheduler_leader": self.leader.is_leader if self.leader is not None else None,
+        }
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", **self.stats()})
+
+    async def readyz(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.json_response({"status": "draining", **self.stats()}, status=503)
+        return web.json_response({"status": "ready", **self.stats()})
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop taking updates and wait for in-flight ones; False on timeout"""
+        self.draining = True
+        if not self._tasks:
+            return True
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        return not pending
+
+
+def bind_socket(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    """Listening socket shared by all workers"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+async def serve(sock: socket.socket, worker: int = 0, stop: Optional[asyncio.Event] = None):
+    """One worker: dispatcher + aiohttp app on the shared socket until stopped"""
+    from bot.cron import run_scheduler
+    from bot.database.leader import get_leader_elector
+    from bot.main import create_bot, setup_dispatcher
+    from bot.startup import startup_timer
+
+    bot = create_bot()
+    dp, cache_backend = await setup_dispatcher(bot)
+    elector = get_leader_elector()
+    server = WebhookServer(dp, bot, config.WEBHOOK_PATH, config.WEBHOOK_SECRET, leader=elector)
+    metrics.registry.watch("webhook", server.stats)
+    # Workers share the port: each scrape hits one of them, told apart by this label
+    metrics.registry.const_labels["worker"] = str(worker)
+
+    runner = web.AppRunner(server.build_app(), handle_signals=False, access_log=None)
+    await runner.setup()
+    await web.SockSite(runner, sock).start()
+
+    stop = stop or asyncio.Event()
+    if sys.platform != "win32":
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+    # Every worker campaigns; the lease holder runs the scheduler
+    shutdown = dp["graceful_shutdown"]
+    shutdown.scheduler = asyncio.create_task(run_scheduler())
+    if worker == 0:
+        if config.WEBHOOK_URL:
+            await bot.set_webhook(
+                url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+                secret_token=config.WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logging.info(f"Webhook set to {config.WEBHOOK_URL.rstrip('/')}{config.WEBHOOK_PATH}")
+        else:
+            logging.warning("WEBHOOK_URL is not set: the webhook must be registered with Telegram separately")
+
+    await dp.emit_startup(bot=bot)
+    startup_timer.mark("services")
+    logging.info(f"Webhook worker {worker}: {startup_timer.summary()}")
+    logging.info(f"Webhook worker {worker} (pid {os.getpid()}) accepting updates on {config.WEBHOOK_PATH}")
+    try:
+        await stop.wait()
+    finally:
+        logging.info(f"Webhook worker {worker} draining...")
+        if not await server.drain(shutdown.remaining()):
+            logging.warning(f"Webhook worker {worker}: {len(server._tasks)} updates still running after drain timeout")
+        # Scheduled run and scheduler lease, then the FSM storage
+        await dp.emit_shutdown(bot=bot)
+        await runner.cleanup()
+        await shutdown.close(bot, cache_backend)
+        logging.info(f"Webhook worker {worker} stopped ({server.processed} updates processed)")
+
+
+def _worker_main(sock: socket.socket, worker: int):
+    from bot.main import setup_logging
+
+    setup_logging()
+    try:
+        asyncio.run(serve(sock, worker))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_webhook(workers: Optional[int] = None):
+    """Bind the socket, fork workers and wait for them (SIGTERM is forwarded)"""
+    from bot.main import setup_logging
+
+    setup_logging()
+    if not config.WEBHOOK_SECRET:
+        raise ValueError(
+            "WEBHOOK_SECRET is required in webhook mode! Set it in .env file.\n"
+            "Use a long random string (A-Z, a-z, 0-9, _ and -)."
+        )
+    workers = workers or config.WEBHOOK_WORKERS
+    if workers > 1:
+        from bot.services.cache_backend import get_cache_backend, set_cache_backend
+
+        if not get_cache_backend().shared:
+            raise ValueError(
+                "CACHE_BACKEND_URL is required with WEBHOOK_WORKERS > 1!\n"
+                "Without it workers miss each other's role changes, FSM writes and per-user locks."
+            )
+        set_cache_backend(None)  # each worker connects on its own after the fork
+    sock = bind_socket(config.WEBHOOK_HOST, config.WEBHOOK_PORT)
+    logging.info(f"Webhook listening on {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT} with {workers} worker(s)")
+
+    if workers <= 1 or sys.platform == "win32":
+        _worker_main(sock, 0)
+        return
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=_worker_main, args=(sock, i), name=f"webhook-worker-{i}")
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    # Ctrl+C reaches the whole process group; workers drain on their own
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            logging.error(f"{process.name} exited with code {process.exitcode}")
+    sock.close()
+
+
+if __name__ == "__main__":
+    run_webhook()
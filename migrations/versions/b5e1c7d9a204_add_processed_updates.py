@@ -0,0 +1,35 @@
+"""add_processed_updates
+
+Revision ID: b5e1c7d9a204
+Revises: a4d8e2f6c913
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e1c7d9a204'
+down_revision: Union[str, None] = 'a4d8e2f6c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Recently handled update_ids, so a redelivered update is skipped on any replica
+    op.create_table(
+        'processed_updates',
+        sa.Column('bot_id', sa.BigInteger(), nullable=False, autoincrement=False),
+        sa.Column('update_id', sa.BigInteger(), nullable=False, autoincrement=False),
+        sa.Column('seen_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('bot_id', 'update_id'),
+    )
+    op.create_index('ix_processed_updates_seen_at', 'processed_updates', ['seen_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_processed_updates_seen_at', table_name='processed_updates')
+    op.drop_table('processed_updates')
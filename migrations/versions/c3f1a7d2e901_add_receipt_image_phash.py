@@ -0,0 +1,35 @@
+"""add_receipt_image_phash
+
+Revision ID: c3f1a7d2e901
+Revises: 1c631ee2de30
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f1a7d2e901'
+down_revision: Union[str, None] = '1c631ee2de30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Perceptual hash of receipt photo for near-duplicate detection
+    op.add_column('payment_receipts', sa.Column('image_phash', sa.String(length=16), nullable=True))
+
+    # Duplicate index is loaded per stay
+    from sqlalchemy import text
+    conn = op.get_bind()
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_payment_receipts_stay_id ON payment_receipts (stay_id)'))
+
+
+def downgrade() -> None:
+    from sqlalchemy import text
+    conn = op.get_bind()
+    conn.execute(text('DROP INDEX IF EXISTS ix_payment_receipts_stay_id'))
+    op.drop_column('payment_receipts', 'image_phash')
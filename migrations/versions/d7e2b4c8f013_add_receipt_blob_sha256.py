@@ -0,0 +1,34 @@
+"""add_receipt_blob_sha256
+
+Revision ID: d7e2b4c8f013
+Revises: c3f1a7d2e901
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e2b4c8f013'
+down_revision: Union[str, None] = 'c3f1a7d2e901'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # sha256 of the original receipt file in receipt storage
+    op.add_column('payment_receipts', sa.Column('blob_sha256', sa.String(length=64), nullable=True))
+
+    from sqlalchemy import text
+    conn = op.get_bind()
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_payment_receipts_blob_sha256 ON payment_receipts (blob_sha256)'))
+
+
+def downgrade() -> None:
+    from sqlalchemy import text
+    conn = op.get_bind()
+    conn.execute(text('DROP INDEX IF EXISTS ix_payment_receipts_blob_sha256'))
+    op.drop_column('payment_receipts', 'blob_sha256')
@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+import pytest
+import pytest_asyncio
+from aiogram.types import Update, User
+
+from bench.fake_bot import make_bot, make_message
+from bot.middlewares.rate_limit import RateLimitMiddleware
+from bot.services.cache_backend import MemoryBackend, RedisBackend
+from bot.services.identity_cache import TenantIdentity, identity_cache, subscribe_invalidations
+
+# Run the contract against a real server too: REDIS_URL=redis://localhost:6379/15
+REDIS_URL = os.getenv("REDIS_URL")
+
+
+@pytest_asyncio.fixture(params=["memory", "redis"])
+async def backend(request):
+    if request.param == "memory":
+        yield MemoryBackend()
+        return
+    if not REDIS_URL:
+        pytest.skip("REDIS_URL not set")
+    pytest.importorskip("redis")
+    backend = RedisBackend(REDIS_URL, prefix=f"test:{os.getpid()}:")
+    yield backend
+    keys = await backend.client.keys(f"{backend.prefix}*")
+    if keys:
+        await backend.client.delete(*keys)
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_counters_and_values_expire(backend):
+    assert await backend.incr("hits", ttl=0.2) == 1
+    assert await backend.incr("hits", 2, ttl=10) == 3   # ttl only set on create
+    await backend.set("name", "value", ttl=0.2)
+    assert await backend.get_many(["hits", "name", "missing"]) == ["3", "value", None]
+
+    await asyncio.sleep(0.3)
+    assert await backend.get("hits") is None
+    assert await backend.get("name") is None
+
+    await backend.set("kept", "1")
+    await backend.delete("kept")
+    assert await backend.get("kept") is None
+
+
+@pytest.mark.asyncio
+async def test_publish_reaches_subscribers(backend):
+    received = asyncio.Queue()
+    await backend.subscribe("invalidate", received.put_nowait)
+    await asyncio.sleep(0.05)
+    await backend.publish("invalidate", "42:")
+    assert await asyncio.wait_for(received.get(), timeout=2) == "42:"
+
+
+@pytest.mark.asyncio
+async def test_close_sends_pending_fire_and_forget_publishes():
+    backend = MemoryBackend()
+    received = []
+
+    async def slow(message):
+        await asyncio.sleep(0.05)
+        received.append(message)
+
+    await backend.subscribe("invalidate", slow)
+    backend.publish_soon("invalidate", "42:")
+    await backend.close()
+    assert received == ["42:"]
+
+
+@pytest.mark.asyncio
+async def test_replicas_share_rate_limit():
+    shared = MemoryBackend()
+    replicas = [RateLimitMiddleware(rate=3, per=60, backend=shared) for _ in range(2)]
+    bot = make_bot()
+    user = User(id=424243, is_bot=False, first_name="Спамер")
+
+    async def handler(event, data):
+        return "handled"
+
+    results = []
+    for i in range(4):
+        update = Update(update_id=i, message=make_message(bot, "привет", user.id))
+        results.append(await replicas[i % 2](handler, update, {"event_from_user": user}))
+
+    # Round-robin across replicas: 3 per minute in total, not 3 per replica
+    assert results == ["handled"] * 3 + [None]
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_identity_invalidation_from_other_replica():
+    shared = MemoryBackend()
+    await subscribe_invalidations(shared)
+    identity_cache.put(777, TenantIdentity(7, 777, "Пётр", True, "active"))
+
+    await shared.publish("identity", ":7")
+    assert identity_cache.get(777) == (False, None)
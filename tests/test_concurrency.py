@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from aiogram import Dispatcher, F
+from aiogram.types import CallbackQuery, Message, Update
+
+from bench.fake_bot import make_bot, make_callback, make_message
+from bot.middlewares.concurrency import (
+    PRIORITY_CALLBACK,
+    PRIORITY_MESSAGE,
+    PRIORITY_PAYMENT,
+    ConcurrencyMiddleware,
+    PrioritySlots,
+    UserEventIsolation,
+)
+
+
+def _dispatcher(limit=10):
+    isolation = UserEventIsolation()
+    dp = Dispatcher(events_isolation=isolation)
+    middleware = ConcurrencyMiddleware(limit=limit, dedup_window=2)
+    dp.update.outer_middleware(middleware)
+    return dp, isolation, middleware
+
+
+@pytest.mark.asyncio
+async def test_updates_of_one_user_run_one_at_a_time():
+    dp, isolation, _ = _dispatcher()
+    running = {}
+    overlaps = []
+
+    @dp.message(F.text == "/pay")
+    async def pay(message: Message):
+        user_id = message.from_user.id
+        running[user_id] = running.get(user_id, 0) + 1
+        overlaps.append(sum(running.values()))
+        await asyncio.sleep(0.05)
+        running[user_id] -= 1
+
+    bot = make_bot()
+    await asyncio.gather(*(
+        dp.feed_update(bot, Update(update_id=i, message=make_message(bot, "/pay", user_id)))
+        for i, user_id in enumerate([1, 1, 1, 2])
+    ))
+    assert max(running.values()) == 0
+    assert max(overlaps) == 2                  # user 2 alongside user 1, never two of user 1
+    assert isolation.get_stats() == {"users": 0, "queued": 0}   # idle locks are dropped
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_saturated_slots_serve_payments_then_callbacks_then_messages():
+    slots = PrioritySlots(1)
+    await slots.acquire()
+    order = []
+
+    async def wait(name, priority):
+        await slots.acquire(priority)
+        order.append(name)
+        slots.release()
+
+    tasks = [asyncio.create_task(wait(name, priority)) for name, priority in
+             [("text", PRIORITY_MESSAGE), ("button", PRIORITY_CALLBACK), ("pay_ok", PRIORITY_PAYMENT)]]
+    cancelled = asyncio.create_task(wait("gone", PRIORITY_PAYMENT))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+
+    assert slots.waiting == 3 and slots.max_waiting == 4
+    slots.release()
+    await asyncio.gather(*tasks)
+    assert order == ["pay_ok", "button", "text"]
+    assert slots.in_use == 0 and slots.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_double_tapped_callback_reaches_the_handler_once():
+    dp, _, middleware = _dispatcher()
+    approved = []
+
+    @dp.callback_query(F.data.startswith("pay_ok_"))
+    async def approve(call: CallbackQuery):
+        await asyncio.sleep(0.02)
+        approved.append(call.data)
+        await call.answer("ok")
+
+    bot = make_bot()
+    first = make_callback(bot, "pay_ok_5", 1)
+    second = first.model_copy(update={"id": "tap-2"})
+    other_payment = make_callback(bot, "pay_ok_6", 1)
+    await asyncio.gather(
+        dp.feed_update(bot, Update(update_id=1, callback_query=first)),
+        dp.feed_update(bot, Update(update_id=2, callback_query=second)),
+        dp.feed_update(bot, Update(update_id=3, callback_query=other_payment)),
+    )
+    assert approved == ["pay_ok_5", "pay_ok_6"]
+    assert middleware.get_stats()["duplicate_callbacks"] == 1
+    # The duplicate press is still answered, so the client stops its spinner
+    assert bot.session.methods().count("AnswerCallbackQuery") == 3
+    await bot.session.close()
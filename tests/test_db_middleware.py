@@ -0,0 +1,85 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.database.models import Base, Tenant
+from bot.middlewares.db import DbSessionMiddleware
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _run(middleware, handler):
+    data = {}
+    await middleware(handler, object(), data)
+    return data["db_stats"]
+
+
+@pytest.mark.asyncio
+async def test_untouched_session_is_never_opened(session_factory):
+    middleware = DbSessionMiddleware(session_factory)
+
+    async def handler(event, data):
+        return "help"
+
+    stats = await _run(middleware, handler)
+    assert (stats.used, stats.statements, stats.committed) == (False, 0, False)
+
+
+@pytest.mark.asyncio
+async def test_read_only_update_skips_commit(session_factory):
+    middleware = DbSessionMiddleware(session_factory)
+
+    async def handler(event, data):
+        await data["session"].execute(select(func.count(Tenant.id)))
+
+    stats = await _run(middleware, handler)
+    assert stats.used and stats.statements == 1
+    assert not stats.committed
+
+
+@pytest.mark.asyncio
+async def test_pending_changes_are_committed(session_factory):
+    middleware = DbSessionMiddleware(session_factory)
+
+    async def handler(event, data):
+        data["session"].add(Tenant(full_name="Lazy", phone="+1"))
+
+    stats = await _run(middleware, handler)
+    assert stats.committed and stats.writes == 1
+
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count(Tenant.id))) == 1
+    assert middleware.totals == {"updates": 1, "sessions": 1, "commits": 1, "statements": 1}
+
+
+@pytest.mark.asyncio
+async def test_core_update_is_committed_after_another_session_commits(session_factory):
+    from sqlalchemy import update
+
+    async with session_factory() as setup:
+        setup.add(Tenant(full_name="Before", phone="+1"))
+        await setup.commit()
+    middleware = DbSessionMiddleware(session_factory)
+
+    async def handler(event, data):
+        # Core UPDATE: nothing in session.new/dirty
+        await data["session"].execute(update(Tenant).values(full_name="After"))
+        # A helper session committing in the same update (other connection)
+        async with session_factory() as helper:
+            await helper.scalar(select(func.count(Tenant.id)))
+            await helper.commit()
+
+    stats = await _run(middleware, handler)
+    assert stats.committed
+
+    async with session_factory() as session:
+        names = set(await session.scalars(select(Tenant.full_name)))
+    assert names == {"After"}
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiogram import Dispatcher, F
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Message, Update
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bench.fake_bot import make_bot, make_message
+from bot.database.fsm_storage import DatabaseStorage, purge_expired
+from bot.database.models import Base, FSMRecord
+from bot.middlewares.fsm import FSMFlushMiddleware
+from bot.states import AddStayState
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'fsm.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _rows(factory) -> int:
+    async with factory() as session:
+        return await session.scalar(select(func.count()).select_from(FSMRecord))
+
+
+@pytest.mark.asyncio
+async def test_flow_survives_restart_and_writes_are_coalesced(session_factory):
+    storage = DatabaseStorage(session_factory, flush_delay=60)
+    await storage.set_state(KEY, AddStayState.waiting_for_rent_amount)
+    await storage.update_data(KEY, {"object_id": 5})
+    await storage.update_data(KEY, {"object_id": 5})     # unchanged: not written
+    assert await _rows(session_factory) == 0              # nothing written before flush
+
+    assert await storage.flush() == 1
+    assert await storage.flush() == 0
+    assert storage.get_stats()["skipped_writes"] == 1
+    await storage.close()
+
+    restarted = DatabaseStorage(session_factory)
+    assert await restarted.get_state(KEY) == AddStayState.waiting_for_rent_amount.state
+    assert await restarted.get_data(KEY) == {"object_id": 5}
+
+    # clear() removes the row instead of keeping an empty one
+    await restarted.set_state(KEY, None)
+    await restarted.set_data(KEY, {})
+    await restarted.close()
+    assert await _rows(session_factory) == 0
+
+
+@pytest.mark.asyncio
+async def test_idle_state_expires_and_is_purged(session_factory):
+    storage = DatabaseStorage(session_factory, state_ttl=0.2, cache_ttl=0)
+    await storage.set_state(KEY, "Some:state")
+    await storage.close()
+
+    await asyncio.sleep(0.3)
+    assert await storage.get_state(KEY) is None
+    async with session_factory() as session:
+        assert await purge_expired(session) == 1
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_flushes_after_update(session_factory):
+    storage = DatabaseStorage(session_factory, flush_delay=60)
+    dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware(FSMFlushMiddleware(storage))
+
+    @dp.message(F.text == "/add")
+    async def start_flow(message: Message, state: FSMContext):
+        await state.set_state(AddStayState.waiting_for_rent_amount)
+        await state.update_data(object_id=7)
+
+    bot = make_bot()
+    await dp.feed_update(bot, Update(update_id=1, message=make_message(bot, "/add", 10)))
+    assert await _rows(session_factory) == 1
+
+    restarted = DatabaseStorage(session_factory)
+    key = StorageKey(bot_id=bot.id, chat_id=10, user_id=10)
+    assert await restarted.get_data(key) == {"object_id": 7}
+    await storage.close()
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_write_by_another_process_is_seen(session_factory):
+    first = DatabaseStorage(session_factory)
+    second = DatabaseStorage(session_factory)
+    assert await first.get_state(KEY) is None
+
+    await second.set_state(KEY, AddStayState.waiting_for_rent_amount)
+    await second.flush()
+    assert await first.get_state(KEY) == AddStayState.waiting_for_rent_amount.state
+    await first.close()
+    await second.close()
+
+
+@pytest.mark.asyncio
+async def test_single_process_reads_are_cached(session_factory):
+    storage = DatabaseStorage(session_factory, cache_ttl=5)
+    await storage.set_state(KEY, AddStayState.waiting_for_rent_amount)
+    await storage.flush()
+    # FSMContextMiddleware's get_state, then the handler's get_data: one SELECT
+    assert await storage.get_state(KEY) == AddStayState.waiting_for_rent_amount.state
+    assert await storage.get_data(KEY) == {}
+    assert storage.get_stats()["reads"] == 1
+    await storage.close()
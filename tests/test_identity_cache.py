@@ -0,0 +1,119 @@
+import pytest
+import pytest_asyncio
+from aiogram.types import Update, User
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bench.fake_bot import make_bot, make_callback
+from bot.database.models import Base, Tenant, TenantStatus
+from bot.middlewares.consent import ConsentMiddleware
+from bot.middlewares.db import DbSessionMiddleware
+from bot.services.identity_cache import IdentityCache, TenantIdentity, identity_cache
+from bot.services.tenant_service import set_tenant_consent
+
+TG_ID = 555
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'identity.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        session.add(Tenant(full_name="Иван", phone="1", tg_id=TG_ID, personal_data_consent=True))
+        await session.commit()
+    identity_cache.clear()
+    yield factory
+    identity_cache.clear()
+    await engine.dispose()
+
+
+async def _update(factory, handler):
+    """DbSessionMiddleware -> ConsentMiddleware -> handler, as dispatched for one update"""
+    consent = ConsentMiddleware()
+
+    async def inner(event, data):
+        return await consent(handler, event, data)
+
+    update = Update(update_id=1, callback_query=make_callback(make_bot(), "my_charges", TG_ID))
+    data = {"event_from_user": User(id=TG_ID, is_bot=False, first_name="Иван")}
+    result = await DbSessionMiddleware(factory)(inner, update, data)
+    return result, data["db_stats"]
+
+
+@pytest.mark.asyncio
+async def test_repeated_updates_skip_tenant_query(session_factory):
+    async def handler(event, data):
+        return data["tenant"]
+
+    first, first_stats = await _update(session_factory, handler)
+    second, second_stats = await _update(session_factory, handler)
+
+    assert isinstance(first, TenantIdentity) and first.full_name == "Иван"
+    assert second == first
+    assert first_stats.statements == 1
+    assert not second_stats.used
+
+
+@pytest.mark.asyncio
+async def test_consent_and_ban_invalidate_entry(session_factory):
+    async def revoke(event, data):
+        await set_tenant_consent(data["session"], data["tenant"].id, False)
+
+    async def ban(event, data):
+        tenant = await data["tenant"].load(data["session"])
+        tenant.status = TenantStatus.banned.value
+
+    async def identity(event, data):
+        return data["tenant"]
+
+    await _update(session_factory, revoke)
+    # Consent now missing: the update is blocked before the handler
+    blocked, _ = await _update(session_factory, identity)
+    assert blocked is None
+    assert identity_cache.get(TG_ID)[1].personal_data_consent is False
+
+    async with session_factory() as session:
+        await set_tenant_consent(session, identity_cache.get(TG_ID)[1].id, True)
+        await session.commit()
+    await _update(session_factory, ban)
+
+    current, stats = await _update(session_factory, identity)
+    assert current.status == TenantStatus.banned.value
+    assert stats.statements == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_user_is_cached_until_linked(session_factory):
+    async with session_factory() as session:
+        tenant = await session.scalar(select(Tenant).where(Tenant.tg_id == TG_ID))
+        tenant.tg_id = -1
+        await session.commit()
+
+    async def identity(event, data):
+        return data["tenant"]
+
+    assert (await _update(session_factory, identity))[0] is None
+    assert identity_cache.get(TG_ID) == (True, None)
+
+    # Invite redemption relinks the profile (flush listener drops the negative entry)
+    async with session_factory() as session:
+        tenant = await session.scalar(select(Tenant).where(Tenant.tg_id == -1))
+        tenant.tg_id = TG_ID
+        await session.commit()
+    assert (await _update(session_factory, identity))[0].tg_id == TG_ID
+
+
+def test_lru_and_ttl():
+    cache = IdentityCache(ttl=60, negative_ttl=0, maxsize=2)
+    for tg_id in (1, 2, 3):
+        cache.put(tg_id, TenantIdentity(tg_id * 10, tg_id, "x", True, "active"))
+    assert cache.get(1) == (False, None)
+    assert cache.get(3)[0]
+
+    cache.put(4, None)          # negative_ttl=0: not cached
+    assert cache.get(4) == (False, None)
+
+    cache.invalidate(tenant_id=30)
+    assert cache.get(3) == (False, None)
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import date
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.database.leader import LeaderElector
+from bot.database.models import Base
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'leases.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_single_leader_and_failover_after_expiry(session_factory):
+    a = LeaderElector(session_factory, ttl=0.5, holder="a")
+    b = LeaderElector(session_factory, ttl=0.5, holder="b")
+
+    assert await a.try_acquire()
+    assert not await b.try_acquire()
+    assert await a.try_acquire()                # renewal keeps the lease
+    assert (await a.current()).holder == "a"
+
+    await a.mark_run(date(2026, 10, 18))
+    await asyncio.sleep(0.6)                    # "a" died without renewing
+    assert await b.try_acquire()
+    assert not await a.try_acquire()
+    lease = await b.current()
+    assert lease.holder == "b"
+    assert lease.last_run_on == date(2026, 10, 18)   # the new leader won't repeat today's run
+
+
+@pytest.mark.asyncio
+async def test_release_hands_over_and_cancels_leader_task(session_factory):
+    runs = []
+
+    async def leader_task(elector):
+        runs.append(elector.holder)
+        await asyncio.Event().wait()
+
+    a = LeaderElector(session_factory, ttl=30, renew_every=0.05, holder="a")
+    b = LeaderElector(session_factory, ttl=30, renew_every=0.05, holder="b")
+    campaign_a = asyncio.create_task(a.run(leader_task))
+    await asyncio.sleep(0.1)
+    campaign_b = asyncio.create_task(b.run(leader_task))
+    await asyncio.sleep(0.2)
+    assert runs == ["a"] and not b.is_leader
+
+    campaign_a.cancel()                          # graceful shutdown releases the lease
+    with pytest.raises(asyncio.CancelledError):
+        await campaign_a
+    await asyncio.sleep(0.2)
+    assert runs == ["a", "b"] and b.is_leader
+
+    campaign_b.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await campaign_b
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from bench.load_test import FakeTelegramAPI, parse_mix
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_mix_rejects_unknown_sessions():
+    assert parse_mix("menu=3,approve=1") == {"menu": 3.0, "approve": 1.0}
+    with pytest.raises(ValueError, match="dance"):
+        parse_mix("menu=1,dance=1")
+
+
+def test_fake_api_answers_messages_and_files():
+    api = FakeTelegramAPI()
+    sent = api._result("sendMessage", {"chat_id": "4242", "text": "hi"})
+    assert sent["chat"]["id"] == 4242 and sent["text"] == "hi"
+    assert api._result("answerCallbackQuery", {"callback_query_id": "1"}) is True
+    assert api._result("getFile", {"file_id": "abc"})["file_path"] == "photos/abc.png"
+
+
+def test_small_load_runs_end_to_end(tmp_path):
+    # A subprocess: the bot's engine is bound to DATABASE_URL at import time
+    report_path = tmp_path / "load.json"
+    subprocess.run(
+        [sys.executable, "-m", "bench.load_test", "--objects", "8", "--sessions", "60", "--concurrency", "8",
+         "--profile-sessions", "1", "--rate-429", "0.05", "--db-url", f"sqlite+aiosqlite:///{tmp_path / 'load.sqlite'}",
+         "--json", str(report_path)],
+        cwd=ROOT, env={**os.environ}, check=True, capture_output=True, timeout=300,
+    )
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+
+    assert report["updates"] >= 60
+    assert report["reached_handler"] > 0
+    assert {step["step"] for step in report["steps"]} <= {"menu", "status", "receipt.photo", "receipt.confirm", "approve"}
+    assert report["api_calls"]["sendMessage"] > 0
+    assert report["injected_429"] > 0
+    # Every injected 429 surfaces as a failed Bot API call; nothing else fails
+    assert sum(row["count"] for row in report["telegram_errors"]) == report["injected_429"]
+    assert {row["error"] for row in report["handler_errors"]} <= {"TelegramRetryAfter"}
@@ -0,0 +1,75 @@
+import pytest
+from aiogram import Dispatcher, F
+from aiogram.types import CallbackQuery, Update
+from aiohttp.test_utils import TestClient, TestServer
+
+from bench.fake_bot import make_bot, make_callback
+from bot import metrics
+from bot.metrics import Registry
+from bot.middlewares.metrics import HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from bot.webhook import WebhookServer
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry(prefix="t_")
+    requests = registry.counter("requests_total", "Requests", ["method"])
+    latency = registry.histogram("latency_seconds", "Latency", ["provider"], buckets=(0.1, 1.0))
+    registry.gauge("pool_checked_out", "Checked out", callback=lambda: 3)
+    registry.watch("fsm", lambda: {"dirty": 2, "upload": {"tracked": 1}, "name": "skipped"})
+
+    requests.inc("get")
+    requests.inc("get")
+    latency.observe(0.1, 'tess"ract')
+    latency.observe(5, 'tess"ract')
+
+    lines = registry.render().splitlines()
+    assert 't_requests_total{method="get"} 2.0' in lines
+    assert 't_latency_seconds_bucket{provider="tess\\"ract",le="0.1"} 1' in lines
+    assert 't_latency_seconds_bucket{provider="tess\\"ract",le="1.0"} 1' in lines
+    assert 't_latency_seconds_bucket{provider="tess\\"ract",le="+Inf"} 2' in lines
+    assert 't_latency_seconds_count{provider="tess\\"ract"} 2' in lines
+    assert "t_pool_checked_out 3" in lines
+    assert "t_fsm_dirty 2" in lines and "t_fsm_upload_tracked 1" in lines
+    assert not any(line.startswith("t_fsm_name") for line in lines)
+
+
+def test_worker_label_is_added_to_every_sample():
+    registry = Registry(prefix="t_")
+    registry.counter("requests_total", "Requests", ["method"]).inc("get")
+    registry.gauge("ocr_in_flight", "OCR running").set(1)
+    registry.watch("webhook", lambda: {"processed": 4})
+    registry.const_labels["worker"] = "2"
+
+    lines = registry.render().splitlines()
+    assert 't_requests_total{method="get",worker="2"} 1.0' in lines
+    assert 't_ocr_in_flight{worker="2"} 1' in lines
+    assert 't_webhook_processed{worker="2"} 4' in lines
+
+@pytest.mark.asyncio
+async def test_handler_latency_by_router_and_name_is_served():
+    dp = Dispatcher()
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+    @dp.callback_query(F.data == "list_payments")
+    async def list_payments(call: CallbackQuery):
+        await call.answer()
+
+    @dp.callback_query(F.data == "boom")
+    async def boom(call: CallbackQuery):
+        raise ValueError("broken")
+
+    bot = make_bot()
+    await dp.feed_update(bot, Update(update_id=1, callback_query=make_callback(bot, "list_payments", 1)))
+    with pytest.raises(ValueError):
+        await dp.feed_update(bot, Update(update_id=2, callback_query=make_callback(bot, "boom", 1)))
+
+    assert sum(metrics.handler_duration.values[("test_metrics", "list_payments")][0]) == 1
+    assert metrics.handler_errors.values[("test_metrics", "boom", "ValueError")] == 1
+
+    server = WebhookServer(dp, bot, secret="s3cr3t")
+    async with TestClient(TestServer(server.build_app())) as client:
+        text = await (await client.get("/metrics")).text()
+    assert 'rentbot_updates_total{type="callback_query"}' in text
+    assert 'rentbot_handler_duration_seconds_count{router="test_metrics",handler="list_payments"} 1' in text
+    await bot.session.close()
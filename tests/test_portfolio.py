@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bench.portfolio import PortfolioSpec, generate_portfolio, load_portfolio
+from bot.database.models import Base, ChargeStatus, PaymentReceipt, RentCharge, Tenant
+from bot.services.balance_service import get_stay_balance
+
+TODAY = date(2026, 3, 15)
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'portfolio.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_generated_charges_match_allocations(session_factory):
+    spec = PortfolioSpec(objects=30, months=6, seed=3, today=TODAY, receipt_share=0.5)
+    async with session_factory() as session:
+        portfolio = await generate_portfolio(session, spec, batch_objects=7)
+
+        assert portfolio.rows["payment_receipts"] > 0
+        assert portfolio.rows["support_messages"] > 0
+        assert portfolio.debtor_stay_ids
+
+        for stay_id in portfolio.stay_ids:
+            balance = await get_stay_balance(session, stay_id, as_of_date=TODAY)
+            pending = await session.scalar(
+                select(func.count(RentCharge.id))
+                .where(RentCharge.stay_id == stay_id, RentCharge.status == ChargeStatus.pending.value)
+            )
+            # Charge status agrees with allocations; there are no advances
+            assert balance.advances == 0
+            assert (stay_id in portfolio.debtor_stay_ids) == (balance.balance > 0.01)
+            assert len([c for c in balance.unpaid_charges if c.type == "rent"]) == pending
+
+        loaded = await load_portfolio(session)
+        assert loaded.stay_ids == portfolio.stay_ids
+        assert sorted(loaded.debtor_stay_ids) == sorted(portfolio.debtor_stay_ids)
+
+
+@pytest.mark.asyncio
+async def test_second_run_appends_after_existing_ids(session_factory):
+    spec = PortfolioSpec(objects=5, months=3, today=TODAY)
+    async with session_factory() as session:
+        first = await generate_portfolio(session, spec)
+        second = await generate_portfolio(session, spec)
+
+        assert min(second.stay_ids) > max(first.stay_ids)
+        tenants = await session.scalar(select(func.count(Tenant.id)))
+        assert tenants == first.rows["tenants"] + second.rows["tenants"]
+        receipts = await session.scalar(select(func.count(PaymentReceipt.id)))
+        assert receipts == first.rows["payment_receipts"] + second.rows["payment_receipts"]
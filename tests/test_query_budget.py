@@ -0,0 +1,51 @@
+import logging
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bench.portfolio import seed_portfolio
+from bench.query_budget import SCENARIOS, run_scenarios
+from bot.database.models import Base
+
+
+async def _seeded(path, objects):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        portfolio = await seed_portfolio(session, objects=objects, months=4, debtor_share=0.5)
+    return engine, factory, portfolio
+
+
+@pytest_asyncio.fixture
+async def small_and_large(tmp_path):
+    small = await _seeded(tmp_path / "small.sqlite", 4)
+    large = await _seeded(tmp_path / "large.sqlite", 16)
+    yield small[1:], large[1:]
+    await small[0].dispose()
+    await large[0].dispose()
+
+
+@pytest.mark.asyncio
+async def test_scenarios_stay_within_budget(small_and_large, caplog):
+    (factory, portfolio), _ = small_and_large
+    with caplog.at_level(logging.ERROR):
+        # Wall-time budgets are for benchmark machines; CI only guards statements
+        results = await run_scenarios(factory, portfolio, time_scale=100)
+
+    assert [r.name for r in results] == [s.name for s in SCENARIOS]
+    assert [r.name for r in results if not r.ok] == []
+    assert "Error processing billing" not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_constant_scenarios_do_not_grow_with_portfolio(small_and_large):
+    (small_factory, small), (large_factory, large) = small_and_large
+    small_results = {r.name: r.statements for r in await run_scenarios(small_factory, small, time_scale=100)}
+    large_results = {r.name: r.statements for r in await run_scenarios(large_factory, large, time_scale=100)}
+
+    for scenario in SCENARIOS:
+        if scenario.per_stay == 0:
+            assert large_results[scenario.name] == small_results[scenario.name], scenario.name
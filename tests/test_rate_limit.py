@@ -0,0 +1,55 @@
+import pytest
+from aiogram.types import Update, User
+
+from bench.fake_bot import make_bot, make_message
+from bot.middlewares.rate_limit import RateLimitMiddleware, RatePolicy, SlidingWindowLimiter
+
+
+def test_sliding_window_weights_previous_bucket():
+    limiter = SlidingWindowLimiter(RatePolicy("t", rate=4, per=10))
+    assert all(limiter.hit(1, now=5 + i * 0.1) for i in range(4))
+    assert not limiter.hit(1, now=9.9)
+
+    # Half of the previous window still overlaps: 4 * 0.5 = 2 used
+    assert limiter.usage(1, now=15) == pytest.approx(2)
+    assert limiter.hit(1, now=15) and limiter.hit(1, now=15)
+    assert not limiter.hit(1, now=15)
+
+    # Costs are weighted (e.g. OCR)
+    assert not limiter.hit(2, cost=5, now=0)
+    assert limiter.hit(2, cost=4, now=0)
+
+
+def test_idle_keys_evicted_and_memory_bounded():
+    limiter = SlidingWindowLimiter(RatePolicy("t", rate=10, per=60), max_keys=1000)
+    for user_id in range(5000):
+        limiter.hit(user_id, now=0)
+    assert len(limiter) == 1000
+    full = limiter.get_stats(now=1)["memory_bytes"]
+
+    limiter.hit(-1, now=100)
+    limiter.hit(-2, now=130)
+    stats = limiter.get_stats(now=130)
+    assert stats["tracked_keys"] == 2
+    assert stats["evicted"] == 4000 + 1000
+    assert stats["memory_bytes"] < full
+
+
+@pytest.mark.asyncio
+async def test_update_level_middleware_limits_users():
+    middleware = RateLimitMiddleware(rate=2, per=60)
+    bot = make_bot()
+    user = User(id=424242, is_bot=False, first_name="Спамер")
+
+    async def handler(event, data):
+        return "handled"
+
+    results = []
+    for i in range(3):
+        update = Update(update_id=i, message=make_message(bot, "привет", user.id))
+        results.append(await middleware(handler, update, {"event_from_user": user}))
+
+    assert results == ["handled", "handled", None]
+    assert bot.session.methods() == ["SendMessage"]
+    assert middleware.get_stats()["active_users"] == 1
+    await bot.session.close()
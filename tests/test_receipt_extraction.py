@@ -0,0 +1,60 @@
+from datetime import date
+
+from bot.services.ocr.extraction import (
+    extract_amount, extract_date, extract_fields, find_amount_candidates
+)
+
+
+def test_amount_ignores_inn_and_account_numbers():
+    text = (
+        "ООО \"УК Комфорт\"\n"
+        "ИНН 6501234567 КПП 650101001\n"
+        "р/с 40702810150340012345\n"
+        "Лицевой счет 1020304050\n"
+        "ИТОГО К ОПЛАТЕ: 4 123,10 руб.\n"
+    )
+    assert extract_amount(text) == 4123.10
+
+
+def test_amount_skips_commission():
+    text = "Комиссия банка: 50,00 руб.\nСумма платежа: 3 150,00 руб.\n"
+    assert extract_amount(text) == 3150.00
+
+
+def test_amount_on_line_below_total_keyword():
+    text = "ОПЛАТА\nИтого\n2 150\n15.03.2026 11:02\nТерминал 10234567\n"
+    assert extract_amount(text) == 2150.0
+
+
+def test_amount_plain_decimal_with_currency():
+    assert extract_amount("Сумма: 32000.00 RUB") == 32000.00
+
+
+def test_no_amount_without_signals():
+    assert extract_amount("Перевод выполнен\nКод 1234") is None
+    assert extract_amount("") is None
+
+
+def test_candidates_keep_positions_and_keyword():
+    text = "Сумма перевода 30 000,00 ₽\nКомиссия 0,00 ₽"
+    best = find_amount_candidates(text)[0]
+    assert best.value == 30000.0
+    assert best.keyword == "сумма перевода"
+    assert text[best.start:best.end] == "30 000,00"
+
+
+def test_date_formats():
+    assert extract_date("Дата 28.01.2026") == date(2026, 1, 28)
+    assert extract_date("проведён 2026-02-10") == date(2026, 2, 10)
+    assert extract_date("12 января 2026 14:32:05") == date(2026, 1, 12)
+    assert extract_date("22.01.26 10:41") == date(2026, 1, 22)
+
+
+def test_date_is_not_taken_as_amount():
+    fields = extract_fields("Оплачено 15.03.2026\nИтого 1 200,00 ₽")
+    assert fields.amount == 1200.0
+    assert fields.date == date(2026, 3, 15)
+
+
+def test_receiver_keeps_original_case():
+    assert extract_fields("Получатель: ТСЖ Победа\nСумма 100 руб.").receiver == "ТСЖ Победа"
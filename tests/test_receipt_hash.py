@@ -0,0 +1,59 @@
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from bot.services.receipt_hash_service import BKTree, HashEntry, _naive_utc, compute_phash, hamming
+
+
+def _receipt_image(seed: int, size=(600, 900)) -> Image.Image:
+    rnd = random.Random(seed)
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rnd.randrange(size[0]), rnd.randrange(size[1])
+        w, h = rnd.randrange(20, 250), rnd.randrange(8, 40)
+        draw.rectangle([x, y, x + w, y + h], fill=(rnd.randrange(256),) * 3)
+    return img
+
+
+def _jpeg(img: Image.Image, quality: int = 90) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def test_phash_survives_resize_and_recompression():
+    img = _receipt_image(1)
+    original = compute_phash(_jpeg(img))
+    smaller = compute_phash(_jpeg(img.resize((300, 450)), quality=40))
+    assert original is not None and smaller is not None
+    assert hamming(original, smaller) <= 6
+
+
+def test_phash_separates_different_receipts():
+    a = compute_phash(_jpeg(_receipt_image(1)))
+    b = compute_phash(_jpeg(_receipt_image(2)))
+    assert hamming(a, b) > 12
+
+
+def test_phash_of_non_image_is_none():
+    assert compute_phash(b"%PDF-1.4 not an image") is None
+
+
+def test_bktree_matches_brute_force():
+    rnd = random.Random(7)
+    now = _naive_utc(None)
+    entries = [HashEntry(i, rnd.getrandbits(64), now, True) for i in range(500)]
+    # a few near copies of entry 0
+    entries += [HashEntry(1000 + i, entries[0].phash ^ (1 << i), now, True) for i in range(5)]
+
+    tree = BKTree()
+    for e in entries:
+        tree.add(e)
+
+    for probe in (entries[0].phash, entries[42].phash, rnd.getrandbits(64)):
+        for radius in (0, 3, 20):
+            expected = sorted(e.receipt_id for e in entries if hamming(probe, e.phash) <= radius)
+            found = sorted(e.receipt_id for _, e in tree.search(probe, radius))
+            assert found == expected
@@ -0,0 +1,112 @@
+import io
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.database.models import Base, PaymentReceipt, RentalObject, Tenant, TenantStay
+from bot.services import receipt_storage
+from bot.services.receipt_storage import (
+    PREVIEW_SUFFIX, LocalBlobStore, ReceiptStorage, apply_retention, blob_key, file_extension
+)
+
+
+def _jpeg(size=(1600, 2400)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 180, 160)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = ReceiptStorage(LocalBlobStore(str(tmp_path)), preview_size=800)
+    monkeypatch.setattr(receipt_storage, "_storage", storage)
+    monkeypatch.setattr(receipt_storage, "_storage_ready", True)
+    return storage
+
+
+@pytest.mark.asyncio
+async def test_save_is_content_addressed_with_derivatives(storage, tmp_path):
+    data = _jpeg()
+    stored = await storage.save(data)
+
+    assert (tmp_path / blob_key(stored.sha256)).read_bytes() == data
+    assert blob_key(stored.sha256).startswith(f"{stored.sha256[:2]}/{stored.sha256[2:4]}/")
+    assert stored.has_preview
+
+    stored_files = sorted(str(p.relative_to(tmp_path)) for p in tmp_path.rglob("*") if p.is_file())
+    assert stored_files == [blob_key(stored.sha256), blob_key(stored.sha256, PREVIEW_SUFFIX)]
+    with Image.open(io.BytesIO(await storage.preview(stored.sha256))) as preview:
+        assert preview.format == "WEBP" and max(preview.size) == 800
+
+    # Same bytes -> same blob
+    assert (await storage.save(data)).sha256 == stored.sha256
+
+
+@pytest.mark.asyncio
+async def test_non_image_is_stored_without_preview(storage):
+    stored = await storage.save(b"%PDF-1.4 fake")
+    assert not stored.has_preview
+    assert await storage.original(stored.sha256) == b"%PDF-1.4 fake"
+    assert await storage.preview(stored.sha256) is None
+
+
+@pytest.mark.asyncio
+async def test_saving_again_restores_a_missing_preview(storage, tmp_path):
+    data = _jpeg()
+    stored = await storage.save(data)
+    (tmp_path / blob_key(stored.sha256, PREVIEW_SUFFIX)).unlink()
+
+    assert (await storage.save(data)).has_preview
+    assert await storage.preview(stored.sha256) is not None
+
+
+def test_file_extension_follows_content():
+    assert file_extension(_jpeg((10, 10))) == ".jpg"
+    assert file_extension(b"%PDF-1.4 fake") == ".pdf"
+    buf = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(buf, "PNG")
+    assert file_extension(buf.getvalue()) == ".png"
+    assert file_extension(b"plain text") == ".bin"
+
+
+@pytest_asyncio.fixture
+async def async_session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with async_session_maker() as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_retention_keeps_blobs_shared_with_newer_receipts(storage, async_session):
+    tenant = Tenant(full_name="Test Tenant", phone="+1234567890")
+    obj = RentalObject(owner_id=1, address="Test St 1")
+    async_session.add_all([tenant, obj])
+    await async_session.flush()
+    stay = TenantStay(tenant_id=tenant.id, object_id=obj.id, date_from=date(2026, 1, 1),
+                      rent_amount=30000, rent_day=5, comm_day=10)
+    async_session.add(stay)
+    await async_session.flush()
+
+    old_only = (await storage.save(b"old receipt")).sha256
+    shared = (await storage.save(b"shared receipt")).sha256
+    long_ago = datetime.now(timezone.utc) - timedelta(days=400)
+    for sha, created in ((old_only, long_ago), (shared, long_ago), (shared, datetime.now(timezone.utc))):
+        async_session.add(PaymentReceipt(stay_id=stay.id, file_id="f", file_type="photo",
+                                         blob_sha256=sha, decision="rejected", created_at=created))
+    await async_session.commit()
+
+    assert await apply_retention(async_session, 365) == 1
+    assert await storage.original(old_only) is None
+    assert await storage.original(shared) == b"shared receipt"
+
+    remaining = (await async_session.execute(select(PaymentReceipt.blob_sha256))).scalars().all()
+    assert sorted(remaining, key=str) == sorted([None, shared, shared], key=str)
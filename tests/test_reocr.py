@@ -0,0 +1,108 @@
+from datetime import date
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.database.models import Base, PaymentReceipt, RentalObject, Tenant, TenantStay
+from bot.reocr import Checkpoint, ReOCRBackfill
+from bot.services.ocr.base import OCRResult
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    # File DB with the default journal: one writer, no reader may hold a lock meanwhile
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'reocr.db'}")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with factory() as session:
+        tenant = Tenant(full_name="Test Tenant", phone="+1234567890")
+        obj = RentalObject(owner_id=1, address="Test St 1")
+        session.add_all([tenant, obj])
+        await session.flush()
+        stay = TenantStay(tenant_id=tenant.id, object_id=obj.id, date_from=date(2026, 1, 1),
+                          rent_amount=30000, rent_day=5, comm_day=10)
+        session.add(stay)
+        await session.flush()
+        for i in range(1, 8):
+            session.add(PaymentReceipt(stay_id=stay.id, file_id=f"file{i}", file_type="photo",
+                                       decision="accepted", ocr_text="old"))
+        await session.commit()
+
+    yield factory
+    await engine.dispose()
+
+
+def _job(factory, checkpoint, calls):
+    async def fetch(file_id, blob_sha256):
+        if file_id == "file5":
+            return None, None          # gone from Telegram
+        return file_id.encode(), "ab" * 32
+
+    async def ocr(data, is_pdf):
+        calls.append(data)
+        n = int(data.decode()[4:])
+        return OCRResult(text=f"new {n}", amount=100.0 * n, date=date(2026, 2, n),
+                         confidence=0.9, metadata={"provider": "fake", "receiver": "ИП Тест"})
+
+    return ReOCRBackfill(factory, fetch, ocr, batch_size=2, checkpoint_path=str(checkpoint))
+
+
+@pytest.mark.asyncio
+async def test_backfill_updates_in_batches_and_resumes(session_factory, tmp_path):
+    checkpoint = tmp_path / "cp.json"
+    calls = []
+
+    first = await _job(session_factory, checkpoint, calls).run(limit=3)
+    assert first.last_id == 3 and first.updated == 3
+    assert Checkpoint.load(str(checkpoint)).last_id == 3
+
+    second = await _job(session_factory, checkpoint, calls).run()
+    assert second.last_id == 7
+    assert (second.processed, second.updated, second.failed) == (7, 6, 1)
+    # Each receipt was fetched+OCR'd once across both runs
+    assert sorted(calls) == sorted(f"file{i}".encode() for i in (1, 2, 3, 4, 6, 7))
+
+    async with session_factory() as session:
+        rows = {r.id: r for r in (await session.execute(select(PaymentReceipt))).scalars()}
+    assert float(rows[4].parsed_amount) == 400.0
+    assert rows[4].parsed_date == date(2026, 2, 4)
+    assert rows[4].parsed_receiver == "ИП Тест"
+    assert rows[4].blob_sha256 == "ab" * 32
+    assert rows[5].ocr_text == "old"
+
+
+@pytest.mark.asyncio
+async def test_failed_receipts_are_retried_and_stored_json_is_kept(session_factory, tmp_path):
+    checkpoint = tmp_path / "cp.json"
+    async with session_factory() as session:
+        receipt = await session.get(PaymentReceipt, 1)
+        receipt.parsed_raw_json = {"provider": "ollama", "items": [1, 2]}
+        await session.commit()
+
+    calls = []
+    job = _job(session_factory, checkpoint, calls)
+    working_ocr = job.ocr
+
+    async def flaky_ocr(data, is_pdf):
+        if data == b"file2":
+            raise RuntimeError("provider timeout")
+        return await working_ocr(data, is_pdf)
+
+    job.ocr = flaky_ocr
+    first = await job.run(limit=3)
+    assert first.last_id == 3 and first.failed_ids == [2]
+
+    second = await _job(session_factory, checkpoint, calls).run()
+    assert second.last_id == 7
+    assert second.failed_ids == [5]             # file2 went through, file5 is gone from Telegram
+
+    async with session_factory() as session:
+        rows = {r.id: r for r in (await session.execute(select(PaymentReceipt))).scalars()}
+    assert rows[2].ocr_text == "new 2"
+    assert rows[1].parsed_raw_json["items"] == [1, 2]
+    assert rows[1].parsed_raw_json["reocr"]["provider"] == "fake"
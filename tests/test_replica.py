@@ -0,0 +1,82 @@
+import pytest
+import pytest_asyncio
+from aiogram.dispatcher.event.handler import HandlerObject
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.database.models import Base, Tenant
+from bot.database.replica import ReadOnlySessionError, ReplicaRouter
+from bot.middlewares.db import DbSessionMiddleware
+from bot.middlewares.replica import ReplicaRoutingMiddleware
+
+
+async def _make_db(path, tenants):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        session.add_all([Tenant(full_name=f"T{i}", phone=str(i)) for i in range(tenants)])
+        await session.commit()
+    return engine, factory
+
+
+@pytest_asyncio.fixture
+async def dbs(tmp_path):
+    # Two SQLite files stand in for primary and replica; replica has 2 tenants, primary 1
+    primary_engine, primary = await _make_db(tmp_path / "primary.sqlite", 1)
+    replica_engine, replica = await _make_db(tmp_path / "replica.sqlite", 2)
+    router = ReplicaRouter(replica_engine, replica, max_lag=10, check_interval=0)
+    yield primary, router
+    await primary_engine.dispose()
+    await replica_engine.dispose()
+
+
+async def _dispatch(primary, router, callback, flags):
+    """DbSessionMiddleware (update level) -> ReplicaRoutingMiddleware (event level) -> handler"""
+    replica_mw = ReplicaRoutingMiddleware(router)
+
+    async def event_level(event, data):
+        data["handler"] = HandlerObject(callback=callback, flags=flags)
+        return await replica_mw(lambda e, d: callback(d["session"]), event, data)
+
+    return await DbSessionMiddleware(primary)(event_level, object(), {})
+
+
+async def _count_tenants(session):
+    return await session.scalar(select(func.count(Tenant.id)))
+
+
+@pytest.mark.asyncio
+async def test_flagged_handler_reads_from_replica(dbs):
+    primary, router = dbs
+    assert await _dispatch(primary, router, _count_tenants, {"replica": True}) == 2
+    assert await _dispatch(primary, router, _count_tenants, {}) == 1
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_primary_when_replica_lags_or_is_down(dbs):
+    primary, router = dbs
+
+    async def lagging():
+        return 60.0
+    router.measure_lag = lagging
+    assert await _dispatch(primary, router, _count_tenants, {"replica": True}) == 1
+
+    async def down():
+        raise ConnectionError("replica down")
+    router.measure_lag = down
+    assert await _dispatch(primary, router, _count_tenants, {"replica": True}) == 1
+    assert router.fallbacks == 2
+
+
+@pytest.mark.asyncio
+async def test_replica_session_is_read_only(dbs):
+    primary, router = dbs
+
+    async def write(session):
+        session.add(Tenant(full_name="X", phone="x"))
+        await session.flush()
+
+    with pytest.raises(ReadOnlySessionError):
+        await _dispatch(primary, router, write, {"replica": True})
@@ -0,0 +1,97 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bench.fake_bot import make_bot, make_message
+from bot.config import config
+from bot.database.models import Base, UserRole
+from bot.handlers.admin import AdminFilter
+from bot.middlewares.rate_limit import RateLimitMiddleware
+from bot.services.role_registry import RoleRegistry, role_registry
+from bot.services.user_service import create_admin, deactivate_admin, reload_admin_cache
+
+ADMIN_ID = 7001
+MANAGER_ID = 7002
+
+
+@pytest_asyncio.fixture
+async def session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'roles.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    saved = role_registry.roles
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        yield session
+    role_registry.replace(saved.owners, saved.admins)
+    await engine.dispose()
+
+
+def test_admins_include_owners():
+    registry = RoleRegistry(owners=[1], admins=[2])
+    assert registry.is_owner(1) and registry.is_admin(1)
+    assert registry.is_admin(2) and not registry.is_owner(2)
+    assert not registry.is_admin(3)
+
+    before = registry.roles
+    registry.replace(owners=[1], admins=[])
+    assert before.admins == {1, 2}
+    assert registry.admin_ids == {1}
+
+
+@pytest.mark.asyncio
+async def test_reload_is_seen_by_filter_and_rate_limiter(session):
+    limiter = RateLimitMiddleware(rate=1, per=60)
+    bot = make_bot()
+    message = make_message(bot, "/start", ADMIN_ID)
+
+    async def handler(event, data):
+        return "handled"
+
+    assert not await AdminFilter()(message)
+    assert await limiter(handler, message, {}) == "handled"
+    assert await limiter(handler, message, {}) is None
+
+    # Admin invited after startup: no restart needed
+    await create_admin(session, ADMIN_ID, "Админ")
+    await create_admin(session, MANAGER_ID, "Владелец", role=UserRole.owner)
+    assert await reload_admin_cache(session) == 2
+
+    assert await AdminFilter()(message)
+    assert await limiter(handler, message, {}) == "handled"
+    assert role_registry.is_owner(MANAGER_ID)
+    assert config.OWNER_IDS is role_registry.owner_ids
+    assert set(config._env_owner_ids) <= role_registry.owner_ids
+
+    assert await deactivate_admin(session, ADMIN_ID)
+    assert not await deactivate_admin(session, MANAGER_ID)
+    await reload_admin_cache(session)
+    assert not await AdminFilter()(message)
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_other_replicas_are_told_to_reload_after_commit(session, monkeypatch):
+    from bot.services import user_service
+    from bot.services.cache_backend import MemoryBackend
+
+    class SharedBackend(MemoryBackend):
+        shared = True
+
+        def __init__(self):
+            super().__init__()
+            self.published = []
+
+        async def publish(self, channel, message):
+            self.published.append((channel, message))
+
+    backend = SharedBackend()
+    monkeypatch.setattr(user_service, "get_cache_backend", lambda: backend)
+
+    await create_admin(session, ADMIN_ID, "Админ")
+    await reload_admin_cache(session)
+    await backend.flush()
+    assert backend.published == []   # a replica reloading now would miss the new admin
+
+    await session.commit()
+    await backend.flush()
+    assert backend.published == [(user_service.ROLES_CHANNEL, "reload")]
@@ -0,0 +1,202 @@
+import asyncio
+
+import pytest
+from aiogram import Dispatcher, F
+from aiogram.types import Message, Update
+
+from bench.fake_bot import make_bot, make_message
+from bot import cron
+from bot.middlewares.concurrency import UserEventIsolation
+from bot.services.cache_backend import MemoryBackend
+from bot.shutdown import GracefulShutdown
+
+
+@pytest.fixture(autouse=True)
+def scheduler_not_stopping(monkeypatch):
+    monkeypatch.setattr(cron, "_stopping", False)
+    monkeypatch.setattr(cron, "_current_run", None)
+
+
+def _dispatcher(timeout):
+    dp = Dispatcher(events_isolation=UserEventIsolation())
+    shutdown = GracefulShutdown(timeout)
+    shutdown.install(dp)
+    return dp, shutdown
+
+
+@pytest.mark.asyncio
+async def test_in_flight_update_finishes_before_fsm_is_closed():
+    dp, shutdown = _dispatcher(timeout=2)
+    order = []
+
+    @dp.message(F.text == "/pay")
+    async def pay(message: Message):
+        await asyncio.sleep(0.1)
+        order.append("handled")
+
+    dp.shutdown.register(lambda: order.append("closed"))   # runs after aiogram's fsm.close
+    bot = make_bot()
+    update = asyncio.create_task(dp.feed_update(bot, Update(update_id=7, message=make_message(bot, "/pay", 1))))
+    await asyncio.sleep(0.01)
+    assert shutdown.in_flight.in_flight == 1
+
+    await dp.emit_shutdown(bot=bot)
+    assert order == ["handled", "closed"]
+    assert shutdown.drained is True
+    assert shutdown.in_flight.get_stats() == {"in_flight": 0, "handled": 1}
+    assert shutdown.in_flight.last_update_id == 7
+    await update
+
+
+@pytest.mark.asyncio
+async def test_drain_gives_up_at_the_deadline():
+    dp, shutdown = _dispatcher(timeout=0.05)
+
+    @dp.message(F.text == "/report")
+    async def report(message: Message):
+        await asyncio.sleep(5)
+
+    bot = make_bot()
+    update = asyncio.create_task(dp.feed_update(bot, Update(update_id=1, message=make_message(bot, "/report", 1))))
+    await asyncio.sleep(0.01)
+
+    assert await shutdown.drain() is False
+    assert shutdown.in_flight.in_flight == 1
+    update.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await update
+
+
+class FakeElector:
+    lease_valid = True
+    renew_every = 0.01
+
+    def __init__(self):
+        self.marked = []
+
+    async def current(self):
+        return None   # today's run missing: run at once
+
+    async def mark_run(self, day):
+        self.marked.append(day)
+
+
+@pytest.mark.asyncio
+async def test_scheduled_run_finishes_and_no_new_one_starts(monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda delay: real_sleep(min(delay, 0.01)))
+    started = asyncio.Event()
+    runs = []
+
+    async def jobs(day):
+        started.set()
+        await real_sleep(0.1)
+        runs.append("done")
+        return True
+
+    monkeypatch.setattr(cron, "run_daily_jobs", jobs)
+    elector = FakeElector()
+    loop = asyncio.create_task(cron.scheduler_loop(elector))
+    await started.wait()
+
+    assert await cron.finish_current_run(2) is True
+    assert runs == ["done"]
+    assert len(elector.marked) == 1
+    await asyncio.wait_for(loop, 1)   # returns instead of starting the next run
+    assert runs == ["done"]
+
+
+@pytest.mark.asyncio
+async def test_failed_run_is_not_marked_and_is_retried(monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda delay: real_sleep(min(delay, 0.01)))
+    retried = asyncio.Event()
+    calls = []
+
+    async def jobs(day):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            return False              # a job failed
+        retried.set()
+        return True
+
+    monkeypatch.setattr(cron, "run_daily_jobs", jobs)
+    elector = FakeElector()
+    loop = asyncio.create_task(cron.scheduler_loop(elector))
+    await asyncio.wait_for(retried.wait(), 1)
+
+    assert await cron.finish_current_run(1) is True
+    await asyncio.wait_for(loop, 1)
+    assert calls == [0, 1]
+    assert len(elector.marked) == 1   # only the run that finished
+
+@pytest.mark.asyncio
+async def test_failed_job_does_not_stop_the_others_and_only_it_is_retried(monkeypatch):
+    from datetime import date
+
+    monkeypatch.setattr(cron, "_done_day", None)
+    ran = []
+
+    def job(name, outcomes):
+        async def run(*args, **kwargs):
+            ran.append(name)
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return run
+
+    monkeypatch.setattr(cron, "daily_billing_job", job("billing", [RuntimeError("stays query failed"), True]))
+    monkeypatch.setattr(cron, "receipt_retention_job", job("retention", [True]))
+    monkeypatch.setattr(cron, "fsm_purge_job", job("fsm", [False, True]))
+    monkeypatch.setattr(cron, "update_log_purge_job", job("updates", [True]))
+
+    day = date(2026, 10, 18)
+    assert await cron.run_daily_jobs(day) is False
+    assert ran == ["billing", "retention", "fsm", "updates"]
+    assert await cron.run_daily_jobs(day) is True
+    assert ran[4:] == ["billing", "fsm"]
+
+
+@pytest.mark.asyncio
+async def test_close_confirms_polling_offset_after_full_drain():
+    dp, shutdown = _dispatcher(timeout=1)
+
+    @dp.message(F.text == "/start")
+    async def start(message: Message):
+        pass
+
+    bot = make_bot()
+    await dp.feed_update(bot, Update(update_id=41, message=make_message(bot, "/start", 1)))
+    await dp.emit_shutdown(bot=bot)
+    await shutdown.close(bot, MemoryBackend(), confirm_offset=True)
+
+    assert ("GetUpdates", {"offset": 42, "limit": 1, "timeout": 0}) in bot.session.calls
+
+
+@pytest.mark.asyncio
+async def test_update_waiting_for_user_lock_is_in_flight_and_not_confirmed():
+    dp, shutdown = _dispatcher(timeout=1)
+    release = asyncio.Event()
+
+    @dp.message(F.text == "/pay")
+    async def pay(message: Message):
+        await release.wait()
+
+    @dp.message(F.text == "/start")
+    async def start(message: Message):
+        pass
+
+    bot = make_bot()
+    first = asyncio.create_task(dp.feed_update(bot, Update(update_id=40, message=make_message(bot, "/pay", 1))))
+    # Same user: waits on the per-user lock inside aiogram's FSM middleware
+    second = asyncio.create_task(dp.feed_update(bot, Update(update_id=41, message=make_message(bot, "/pay", 1))))
+    await dp.feed_update(bot, Update(update_id=42, message=make_message(bot, "/start", 2)))
+    await asyncio.sleep(0.01)
+    assert shutdown.in_flight.in_flight == 2
+
+    # 42 finished, 40 and 41 did not: they must come back after a restart
+    await shutdown.close(bot, MemoryBackend(), confirm_offset=True)
+    assert ("GetUpdates", {"offset": 40, "limit": 1, "timeout": 0}) in bot.session.calls
+    release.set()
+    await asyncio.gather(first, second)
@@ -0,0 +1,58 @@
+import logging
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.database import instrumentation
+from bot.database.instrumentation import is_write_statement, statement_shape
+from bot.database.models import Base, Tenant
+from bot.middlewares.db import DbSessionMiddleware
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sql.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+def test_statement_shape_folds_in_lists_and_literals():
+    a = statement_shape("SELECT t.id FROM t\n WHERE t.id IN (?, ?, ?) LIMIT 10")
+    b = statement_shape("SELECT t.id FROM t WHERE t.id IN (?, ?) LIMIT 20")
+    assert a == b == "SELECT t.id FROM t WHERE t.id IN (?) LIMIT ?"
+
+
+def test_locking_reads_count_as_writes():
+    assert not is_write_statement("SELECT payments.id FROM payments WHERE payments.id = ?")
+    assert is_write_statement("SELECT payments.id FROM payments WHERE payments.id = $1 FOR UPDATE")
+    assert is_write_statement("select id from payments for no key update")
+    assert is_write_statement("UPDATE payments SET status=? WHERE payments.id = ?")
+
+
+@pytest.mark.asyncio
+async def test_per_row_queries_are_reported_as_n_plus_one(session_factory, caplog):
+    async def per_row(event, data):
+        for tg_id in range(8):
+            await data["session"].execute(select(Tenant).where(Tenant.tg_id == tg_id))
+
+    async def batched(event, data):
+        await data["session"].execute(select(Tenant).where(Tenant.tg_id.in_(list(range(8)))))
+
+    middleware = DbSessionMiddleware(session_factory)
+    before = instrumentation.totals["n_plus_one_updates"]
+
+    with caplog.at_level(logging.WARNING, logger="bot.sql"):
+        data = {}
+        await middleware(per_row, object(), data)
+        assert data["db_stats"].statements == 8
+        assert data["db_stats"].top_shape()[1] == 8
+        assert data["db_stats"].db_time > 0
+
+        await middleware(batched, object(), {})
+
+    assert instrumentation.totals["n_plus_one_updates"] == before + 1
+    assert len([r for r in caplog.records if "N+1 suspect" in r.getMessage()]) == 1
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from bot.config import config
+from bot.startup import StartupTimer, _open_connections, _timed, feature_modules, install_uvloop, startup_timer
+
+
+def test_summary_lists_phases_and_concurrent_warm_up_steps():
+    timer = StartupTimer()
+    timer.mark("imports")
+    timer.mark("imports")                   # bot.main imported again by the webhook worker
+    timer.warm_up = {"admins": 0.02, "ocr": 0.5}
+    timer.mark("warm_up")
+    summary = timer.summary()
+    assert summary.startswith("Started on asyncio in ")
+    assert summary.count("imports") == 1
+    assert "s [admins 0.02s, ocr 0.50s]" in summary
+
+
+@pytest.mark.asyncio
+async def test_failed_step_is_timed_and_does_not_stop_startup(caplog):
+    async def broken():
+        raise RuntimeError("db down")
+
+    assert await _timed("admins", broken()) is False
+    assert "Startup step admins failed: db down" in caplog.text
+    assert "admins" in startup_timer.warm_up
+
+
+@pytest.mark.asyncio
+async def test_warm_up_leaves_connections_open_in_the_pool(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'warm.sqlite'}")
+    await _open_connections(engine, 3)
+    assert engine.sync_engine.pool.checkedin() == 3
+    await engine.dispose()
+
+
+def test_only_enabled_features_are_preloaded(monkeypatch):
+    monkeypatch.setattr(config, "RECEIPT_STORAGE", "local")
+    assert "boto3" not in feature_modules()
+    monkeypatch.setattr(config, "RECEIPT_STORAGE", "s3")
+    assert "boto3" in feature_modules()
+
+
+def test_event_loop_setting(monkeypatch):
+    monkeypatch.setattr(config, "EVENT_LOOP", "asyncio")
+    assert install_uvloop() is False
+    pytest.importorskip("uvloop")
+    monkeypatch.setattr(config, "EVENT_LOOP", "uvloop")
+    try:
+        assert install_uvloop() is True
+        assert type(asyncio.get_event_loop_policy()).__module__.startswith("uvloop")
+    finally:
+        asyncio.set_event_loop_policy(None)
+        monkeypatch.setattr(startup_timer, "loop", "asyncio")
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+import sentry_sdk
+from aiogram import Dispatcher, F
+from aiogram.types import CallbackQuery, Update
+from sentry_sdk.transport import Transport
+
+from bench.fake_bot import make_bot, make_callback
+from bot import tracing
+from bot.middlewares.tracing import TracingMiddleware, TracingRequestMiddleware
+from bot.services.ocr.base import OCRProvider, OCRResult
+from bot.services.ocr.manager import OCRManager
+
+
+class CapturingTransport(Transport):
+    def __init__(self, options=None):
+        super().__init__(options)
+        self.transactions = []
+
+    def capture_envelope(self, envelope):
+        for item in envelope.items:
+            if item.type == "transaction":
+                self.transactions.append(item.payload.json)
+
+
+class ThreadedProvider(OCRProvider):
+    """Like pytesseract: the work runs in a worker thread"""
+
+    @property
+    def name(self) -> str:
+        return "threaded"
+
+    def is_available(self) -> bool:
+        return True
+
+    async def recognize_image(self, file_bytes: bytes) -> OCRResult:
+        def work():
+            with tracing.span("ocr.tesseract", "image_to_string"):
+                return OCRResult(text="", amount=100.0, date=None, confidence=1.0, metadata={})
+        return await asyncio.to_thread(work)
+
+    async def recognize_pdf(self, file_bytes: bytes) -> OCRResult:
+        return await self.recognize_image(file_bytes)
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    transport = CapturingTransport()
+    sentry_sdk.init(dsn="https://key@sentry.invalid/1", traces_sample_rate=1.0,
+                    transport=transport, default_integrations=False, before_send_transaction=tracing._before_send)
+    monkeypatch.setattr(tracing, "_enabled", True)
+    yield transport
+    sentry_sdk.get_client().close()
+    sentry_sdk.init()
+
+
+@pytest.mark.asyncio
+async def test_update_trace_has_handler_name_and_child_spans(transport):
+    dp = Dispatcher()
+    dp.update.outer_middleware(TracingMiddleware())
+    dp.callback_query.middleware(TracingMiddleware())
+    ocr = OCRManager(primary_provider=ThreadedProvider())
+
+    @dp.callback_query(F.data.startswith("approve_receipt:"))
+    async def approve_receipt(call: CallbackQuery):
+        await ocr.recognize(b"image")
+        await call.answer("ok")
+
+    bot = make_bot()
+    bot.session.middleware(TracingRequestMiddleware())
+    await dp.feed_update(bot, Update(update_id=1, callback_query=make_callback(bot, "approve_receipt:5", 1)))
+    sentry_sdk.flush()
+
+    [trace] = transport.transactions
+    assert trace["transaction"] == "test_tracing.approve_receipt"
+    assert trace["contexts"]["trace"]["op"] == "telegram.update"
+    spans = {span["op"]: span for span in trace["spans"]}
+    assert spans["http.client.telegram"]["description"] == "AnswerCallbackQuery"
+    # The span opened in the OCR worker thread hangs under the provider span
+    assert spans["ocr.tesseract"]["parent_span_id"] == spans["ocr"]["span_id"]
+    await bot.session.close()
+
+
+def test_bot_token_is_scrubbed_from_events():
+    event = {"spans": [{"description": "POST https://api.telegram.org/bot123:AA-b_c/sendMessage"}]}
+    assert tracing._scrub(event) == {"spans": [{"description": "POST https://api.telegram.org/bot<token>/sendMessage"}]}
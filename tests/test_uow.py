@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.database.models import Base, Payment, PaymentStatus, RentalObject, RentCharge, Tenant, TenantStay
+from bot.database.uow import StrayCommitError, forbid_commit, on_commit, transaction
+from bot.middlewares.db import DbSessionMiddleware
+from bot.services.billing_service import ensure_rent_charge
+from bot.services.payment_service import allocate_payment
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'uow.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _stay(session) -> TenantStay:
+    tenant = Tenant(full_name="Test Tenant", phone="+1234567890")
+    obj = RentalObject(owner_id=1, address="Test St 1")
+    session.add_all([tenant, obj])
+    await session.flush()
+    stay = TenantStay(tenant_id=tenant.id, object_id=obj.id, date_from=date(2026, 1, 1),
+                      rent_amount=30000, rent_day=5, comm_day=10, status="active")
+    session.add(stay)
+    await session.flush()
+    return stay
+
+
+@pytest.mark.asyncio
+async def test_services_only_flush(session_factory):
+    async with transaction(session_factory) as session:
+        stay = await _stay(session)
+        with forbid_commit(session):
+            await ensure_rent_charge(session, stay, date(2026, 1, 1))
+            payment = Payment(stay_id=stay.id, amount=30000, total_amount=30000,
+                              status=PaymentStatus.confirmed.value, type="rent")
+            session.add(payment)
+            await session.flush()
+            await allocate_payment(session, payment.id)
+
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count(RentCharge.id))) == 1
+
+
+@pytest.mark.asyncio
+async def test_stray_commit_raises_and_rolls_back(session_factory):
+    with pytest.raises(StrayCommitError):
+        async with transaction(session_factory, strict=True) as session:
+            await _stay(session)
+            await session.commit()
+
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count(TenantStay.id))) == 0
+
+
+@pytest.mark.asyncio
+async def test_strict_middleware_commits_once_and_runs_callbacks(session_factory):
+    middleware = DbSessionMiddleware(session_factory, strict=True)
+    committed = []
+
+    async def handler(event, data):
+        stay = await _stay(data["session"])
+        on_commit(data["session"], lambda: committed.append(stay.id))
+
+    data = {}
+    await middleware(handler, object(), data)
+    assert data["db_stats"].committed and committed == [1]
+
+    async def bad_handler(event, data):
+        data["session"].add(Tenant(full_name="X", phone="+2"))
+        on_commit(data["session"], lambda: committed.append("never"))
+        await data["session"].commit()
+
+    with pytest.raises(StrayCommitError):
+        await middleware(bad_handler, object(), {})
+    assert committed == [1]
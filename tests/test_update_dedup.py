@@ -0,0 +1,109 @@
+import pytest
+import pytest_asyncio
+from aiogram import Dispatcher, F
+from aiogram.types import Message, Update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bench.fake_bot import make_bot, make_message
+from bot.database.models import Base
+from bot.database.update_log import purge_processed
+from bot.middlewares.dedup import ClaimStore, UpdateDedupMiddleware, cache_claim_store, database_claim_store
+from bot.services.cache_backend import MemoryBackend
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'updates.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+def _replica(store=None, window=10000):
+    """Dispatcher of one bot process, recording the update_ids it handled"""
+    dp = Dispatcher()
+    dedup = UpdateDedupMiddleware(window, store)
+    dp.update.outer_middleware(dedup)
+    handled = []
+
+    @dp.message(F.text == "/pay")
+    async def pay(message: Message):
+        handled.append(message.message_id)
+
+    @dp.message(F.text == "/crash")
+    async def crash(message: Message):
+        raise ConnectionError("database went away")
+
+    return dp, dedup, handled
+
+
+@pytest.mark.asyncio
+async def test_redelivered_update_is_handled_once():
+    dp, dedup, handled = _replica(window=2)
+    bot = make_bot()
+    updates = [Update(update_id=i, message=make_message(bot, "/pay", 1)) for i in (1, 2, 3)]
+    for update in [updates[0], updates[0], updates[1], updates[2], updates[2]]:
+        await dp.feed_update(bot, update)
+    assert len(handled) == 3
+    assert dedup.get_stats() == {"window": 2, "duplicates": 2, "store_errors": 0}
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", ["db", "cache"])
+async def test_update_is_claimed_by_one_replica(kind, session_factory):
+    backend = MemoryBackend()
+    make_store = (lambda: database_claim_store(session_factory)) if kind == "db" else (lambda: cache_claim_store(backend, 60))
+    first, _, handled_first = _replica(make_store())
+    second, second_dedup, handled_second = _replica(make_store())
+
+    bot = make_bot()
+    update = Update(update_id=77, message=make_message(bot, "/pay", 1))
+    await first.feed_update(bot, update)
+    await second.feed_update(bot, update)        # redelivered to another worker
+    assert len(handled_first) == 1 and handled_second == []
+    assert second_dedup.duplicates == 1
+
+    if kind == "db":
+        async with session_factory() as session:
+            assert await purge_processed(session, ttl=3600) == 0
+            assert await purge_processed(session, ttl=-1) == 1
+            await session.commit()
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_store_failure_does_not_drop_updates():
+    class Broken(ClaimStore):
+        async def claim(self, bot_id, update_id):
+            raise ConnectionError("down")
+
+        async def release(self, bot_id, update_id):
+            raise ConnectionError("down")
+
+    dp, dedup, handled = _replica(Broken())
+    bot = make_bot()
+    await dp.feed_update(bot, Update(update_id=5, message=make_message(bot, "/pay", 1)))
+    assert len(handled) == 1 and dedup.store_errors == 1
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", ["db", "cache"])
+async def test_failed_update_releases_its_claim(kind, session_factory):
+    backend = MemoryBackend()
+    make_store = (lambda: database_claim_store(session_factory)) if kind == "db" else (lambda: cache_claim_store(backend, 60))
+    first, first_dedup, _ = _replica(make_store())
+    second, second_dedup, handled_second = _replica(make_store())
+
+    bot = make_bot()
+    with pytest.raises(ConnectionError):
+        await first.feed_update(bot, Update(update_id=78, message=make_message(bot, "/crash", 1)))
+    # Redelivered after the crash: handled instead of dropped as a duplicate
+    redelivered = Update(update_id=78, message=make_message(bot, "/pay", 1))
+    await second.feed_update(bot, redelivered)
+    assert len(handled_second) == 1
+    await first.feed_update(bot, redelivered)    # now it is claimed again
+    assert first_dedup.duplicates == 1 and second_dedup.duplicates == 0
+    await bot.session.close()
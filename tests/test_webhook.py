@@ -0,0 +1,89 @@
+import asyncio
+import sys
+
+import pytest
+from aiogram import Dispatcher, F
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from bench.fake_bot import make_bot
+from bot.config import config
+from bot.services import cache_backend
+from bot.webhook import SECRET_HEADER, WebhookServer, run_webhook
+
+SECRET = "s3cr3t"
+
+# As delivered by Telegram
+RECORDED_UPDATE = {
+    "update_id": 10001,
+    "message": {
+        "message_id": 7,
+        "date": 1760000000,
+        "chat": {"id": 4242, "type": "private", "first_name": "Анна"},
+        "from": {"id": 4242, "is_bot": False, "first_name": "Анна"},
+        "text": "/status",
+    },
+}
+
+
+@pytest.mark.asyncio
+async def test_recorded_update_is_processed_and_drained():
+    dp = Dispatcher()
+    release = asyncio.Event()
+    seen = []
+
+    @dp.message(F.text == "/status")
+    async def status(message: Message):
+        await release.wait()
+        seen.append(message.from_user.id)
+
+    bot = make_bot()
+    server = WebhookServer(dp, bot, "/telegram/webhook", SECRET)
+    async with TestClient(TestServer(server.build_app())) as client:
+        bad = await client.post("/telegram/webhook", json=RECORDED_UPDATE, headers={SECRET_HEADER: "wrong"})
+        assert bad.status == 401
+        junk = await client.post("/telegram/webhook", data=b"{", headers={SECRET_HEADER: SECRET})
+        assert junk.status == 400
+
+        ok = await client.post("/telegram/webhook", json=RECORDED_UPDATE, headers={SECRET_HEADER: SECRET})
+        assert ok.status == 200                         # acknowledged before processing
+        assert (await (await client.get("/healthz")).json())["in_flight"] == 1
+
+        drain = asyncio.create_task(server.drain(timeout=5))
+        await asyncio.sleep(0)
+        assert (await client.get("/readyz")).status == 503
+        late = await client.post("/telegram/webhook", json=RECORDED_UPDATE, headers={SECRET_HEADER: SECRET})
+        assert late.status == 503                       # Telegram redelivers it elsewhere
+
+        release.set()
+        assert await drain
+        assert seen == [4242]
+        health = await (await client.get("/healthz")).json()
+        assert health["processed"] == 1 and health["rejected"] == 1
+    await bot.session.close()
+
+
+def test_webhook_refuses_to_run_without_a_secret():
+    # An open endpoint would accept forged updates from anyone
+    with pytest.raises(ValueError):
+        WebhookServer(Dispatcher(), make_bot(), "/telegram/webhook", "")
+
+
+def test_several_workers_require_a_shared_cache_backend(monkeypatch):
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(config, "CACHE_BACKEND_URL", "")
+    monkeypatch.setattr(cache_backend, "_backend", None)
+    # Refused before the socket is bound or any worker forked
+    with pytest.raises(ValueError, match="CACHE_BACKEND_URL"):
+        run_webhook(workers=2)
+
+
+def test_cache_backend_url_without_redis_fails_at_startup(monkeypatch):
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(config, "CACHE_BACKEND_URL", "redis://localhost:6379/0")
+    monkeypatch.setattr(cache_backend, "_backend", None)
+    monkeypatch.setitem(sys.modules, "redis", None)          # package not installed
+    monkeypatch.setitem(sys.modules, "redis.asyncio", None)
+    # No silent fallback to a per-worker in-process backend
+    with pytest.raises(ImportError, match="redis"):
+        run_webhook(workers=2)